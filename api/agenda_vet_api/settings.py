@@ -43,6 +43,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'rest_framework',  # Adicione o Django REST Framework
     'rest_framework_simplejwt',  # JWT Authentication
     'corsheaders',     # Adicione o django-cors-headers
@@ -100,6 +101,19 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/4.2/topics/cache/
+# Memória local por padrão; com vários processos, um cache compartilhado (Redis, Memcached)
+# faz a invalidação das métricas do dashboard valer para todos imediatamente
+
+CACHES = {
+    'default': {
+        'BACKEND': os.environ.get('CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'),
+        'LOCATION': os.environ.get('CACHE_LOCATION', ''),
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/4.2/ref/settings/#auth-password-validators
 
@@ -175,6 +189,7 @@ CORS_ALLOW_HEADERS = [
     'x-csrftoken',
     'x-requested-with',
     'cache-control',
+    'last-event-id',  # Retomada do feed de eventos de agendamentos
 ]
 
 # Métodos permitidos
@@ -190,7 +205,7 @@ CORS_ALLOWED_METHODS = [
 # Configurações do Django REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'core.autenticacao.JWTRBACAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': (
         'rest_framework.permissions.IsAuthenticated',
@@ -232,5 +247,20 @@ SIMPLE_JWT = {
     'JTI_CLAIM': 'jti',
 }
 
+# Validade (em segundos) da reserva de horário durante a conclusão do agendamento
+RESERVA_HORARIO_TTL = int(os.environ.get('RESERVA_HORARIO_TTL', 300))
+
+# Validade (em segundos) do horário oferecido a um pedido da lista de espera
+LISTA_ESPERA_OFERTA_TTL = int(os.environ.get('LISTA_ESPERA_OFERTA_TTL', 1800))
+
+# Duração (em segundos) de cada conexão do feed de eventos de agendamentos antes da reconexão
+EVENTOS_DURACAO_CONEXAO = int(os.environ.get('EVENTOS_DURACAO_CONEXAO', 300))
+
+# Dias que as marcas de exclusão da sincronização incremental são mantidas
+SINCRONIZACAO_RETENCAO_DIAS = int(os.environ.get('SINCRONIZACAO_RETENCAO_DIAS', 90))
+
+# Validade (em segundos) das estatísticas dos dashboards em cache, como garantia além da invalidação por signals
+DASHBOARD_CACHE_TTL = int(os.environ.get('DASHBOARD_CACHE_TTL', 60))
+
 # Modelo de usuário customizado
 AUTH_USER_MODEL = 'usuarios.Usuario'
\ No newline at end of file
@@ -9,7 +9,16 @@ urlpatterns = [
     path('agendamentos/<int:agendamento_id>/', views.update_agendamento_admin, name='update_agendamento_admin'),
     path('agendamentos/<int:agendamento_id>/status/', views.update_agendamento_status_admin, name='update_agendamento_status_admin'),
     path('agendamentos/<int:agendamento_id>/delete/', views.delete_agendamento_admin, name='delete_agendamento_admin'),
+    path('agendamentos/verificar-conflitos/', views.verificar_conflitos_admin, name='verificar_conflitos_admin'),
+    path('agendamentos/exportar/', views.exportar_agendamentos_admin, name='exportar_agendamentos_admin'),
+    path('agendamentos/eventos/', views.eventos_agendamentos_admin, name='eventos_agendamentos_admin'),
     path('agendamentos/stats/', views.get_agendamento_stats_admin, name='get_agendamento_stats_admin'),
+    path('agendamentos/horarios-disponiveis/', views.get_horarios_disponiveis_admin, name='get_horarios_disponiveis_admin'),
+    path('agendamentos/horarios-disponiveis/periodo/', views.get_horarios_disponiveis_periodo_admin, name='get_horarios_disponiveis_periodo_admin'),
+    
+    # ===== URLs PARA RELATÓRIOS =====
+    path('relatorios/agendamentos/', views.relatorio_agendamentos_admin, name='relatorio_agendamentos_admin'),
+    path('relatorios/financeiro/', views.relatorio_financeiro_admin, name='relatorio_financeiro_admin'),
     
     # ===== URLs PARA ADMIN DE SERVIÇOS =====
     path('servicos/', views.get_servicos_admin, name='get_servicos_admin'),
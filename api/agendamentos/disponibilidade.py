@@ -0,0 +1,416 @@
+"""
+Motor de geração de horários disponíveis da agenda
+
+Cada dia é representado por um mapa de células de INTERVALO_SLOT minutos
+(True = livre). O expediente define quais células abrem e cada agendamento
+ativo fecha as células que seu intervalo [início, início + duração) toca.
+
+Os expedientes vêm das linhas ativas de DisponibilidadeProfissional,
+compiladas uma única vez em mapas por profissional e dia da semana. A
+compilação fica em memória e só é refeita quando a versão guardada no cache
+muda (ver signals.py).
+
+Reservas temporárias ainda válidas (ver reservas.py) também fecham células,
+exceto as do próprio cliente que está consultando.
+
+Cada profissional tem a sua própria agenda, exatamente como na constraint
+de sobreposição do banco. Enquanto nenhum profissional tiver disponibilidade
+cadastrada, a clínica inteira funciona como uma única agenda (profissional
+None) com o EXPEDIENTE_PADRAO.
+
+Agendamentos sem profissional gravados antes do cadastro das
+disponibilidades continuam ocupando a clínica: cada um fecha as células da
+agenda consultada que estiver mais livre no seu horário, como se um dos
+profissionais fosse atendê-lo.
+"""
+import heapq
+import uuid
+from collections import Counter, defaultdict
+from datetime import datetime, time, timedelta
+from django.core.cache import cache
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+from django.db.models import DateTimeField, DurationField, ExpressionWrapper, F, Q
+from django.utils import timezone
+from usuarios.models import DisponibilidadeProfissional
+from .models import Agendamento, ReservaHorario
+
+# Intervalo entre horários de início, em minutos
+INTERVALO_SLOT = 30
+
+# Número de células do mapa de um dia
+SLOTS_POR_DIA = 24 * 60 // INTERVALO_SLOT
+
+# Maior período aceito por consulta de disponibilidade (6 semanas)
+MAX_DIAS_PERIODO = 42
+
+# Busca de próximos horários: primeira janela e limite de dias à frente
+JANELA_INICIAL_DIAS = 7
+HORIZONTE_MAX_DIAS = 90
+
+# Chave do cache com a versão atual dos expedientes compilados
+CHAVE_VERSAO_EXPEDIENTES = 'agendamentos:expedientes:versao'
+
+# Expediente padrão por dia da semana (0 = segunda), em minutos desde a meia-noite.
+# Usado enquanto nenhum profissional tiver disponibilidade cadastrada.
+EXPEDIENTE_PADRAO = {
+    0: [(8 * 60, 12 * 60), (14 * 60, 18 * 60)],
+    1: [(8 * 60, 12 * 60), (14 * 60, 18 * 60)],
+    2: [(8 * 60, 12 * 60), (14 * 60, 18 * 60)],
+    3: [(8 * 60, 12 * 60), (14 * 60, 18 * 60)],
+    4: [(8 * 60, 12 * 60), (14 * 60, 18 * 60)],
+    5: [(8 * 60, 12 * 60)],  # Sábado apenas pela manhã
+    6: [],  # Domingo fechado
+}
+
+
+def minutos_para_horario(minutos):
+    """
+    Converte minutos desde a meia-noite para o formato 'HH:MM'
+    """
+    return f'{minutos // 60:02d}:{minutos % 60:02d}'
+
+
+def horario_para_minutos(horario):
+    """
+    Converte um datetime.time em minutos desde a meia-noite
+    """
+    return horario.hour * 60 + horario.minute
+
+
+def compilar_expediente(intervalos):
+    """
+    Converte uma lista de intervalos (início, fim) em minutos no mapa de células livres de um dia
+    """
+    mapa = [False] * SLOTS_POR_DIA
+    for inicio, fim in intervalos:
+        for i in range(-(-inicio // INTERVALO_SLOT), fim // INTERVALO_SLOT):
+            mapa[i] = True
+    return tuple(mapa)
+
+
+_MAPAS_PADRAO = {
+    dia_semana: compilar_expediente(intervalos)
+    for dia_semana, intervalos in EXPEDIENTE_PADRAO.items()
+}
+
+_MAPAS_FECHADO = {dia_semana: compilar_expediente([]) for dia_semana in range(7)}
+
+_expedientes = {'versao': None, 'profissionais': {}}
+
+
+class HorarioIndisponivel(Exception):
+    """
+    Nenhum profissional consegue atender no horário solicitado
+    """
+
+
+def invalidar_expedientes():
+    """
+    Publica uma nova versão dos expedientes, forçando a recompilação em todos os processos
+    """
+    cache.set(CHAVE_VERSAO_EXPEDIENTES, uuid.uuid4().hex, None)
+
+
+def _compilar_expedientes():
+    """
+    Compila as disponibilidades ativas em mapas por profissional e dia da semana
+    """
+    intervalos = defaultdict(lambda: defaultdict(list))
+    linhas = DisponibilidadeProfissional.objects.filter(ativo=True).values_list(
+        'profissional_id', 'dia_semana', 'hora_inicio', 'hora_fim'
+    )
+    for profissional_id, dia_semana, hora_inicio, hora_fim in linhas:
+        intervalos[profissional_id][dia_semana].append(
+            (horario_para_minutos(hora_inicio), horario_para_minutos(hora_fim))
+        )
+
+    return {
+        profissional_id: {
+            dia_semana: compilar_expediente(dias[dia_semana]) for dia_semana in range(7)
+        }
+        for profissional_id, dias in intervalos.items()
+    }
+
+
+def obter_expedientes():
+    """
+    Retorna os expedientes compilados por profissional, recompilando apenas se a versão mudou
+    """
+    versao = cache.get(CHAVE_VERSAO_EXPEDIENTES)
+    if versao is None:
+        cache.add(CHAVE_VERSAO_EXPEDIENTES, uuid.uuid4().hex, None)
+        versao = cache.get(CHAVE_VERSAO_EXPEDIENTES)
+
+    if _expedientes['versao'] != versao:
+        _expedientes.update(versao=versao, profissionais=_compilar_expedientes())
+    return _expedientes['profissionais']
+
+
+def agendas_semanais(profissional_id=None):
+    """
+    Retorna {profissional_id: mapas por dia da semana} das agendas consultadas
+
+    Sem profissional_id, retorna todas as agendas da clínica.
+    """
+    profissionais = obter_expedientes()
+    if profissional_id is not None:
+        profissional_id = int(profissional_id)
+        return {profissional_id: profissionais.get(profissional_id, _MAPAS_FECHADO)}
+    if not profissionais:
+        return {None: _MAPAS_PADRAO}
+    return profissionais
+
+
+def marcar_ocupado(mapa, inicio, fim):
+    """
+    Fecha no mapa as células tocadas pelo intervalo [inicio, fim), em minutos desde o início do mapa
+    """
+    primeira = max(inicio // INTERVALO_SLOT, 0)
+    ultima = min(-(-fim // INTERVALO_SLOT), len(mapa))
+    for i in range(primeira, ultima):
+        mapa[i] = False
+
+
+def horarios_livres(mapa, duracao):
+    """
+    Retorna os horários de início do mapa de um dia em que cabe um serviço de `duracao` minutos
+
+    Percorre o mapa uma única vez de trás para frente contando quantas
+    células livres consecutivas existem a partir de cada posição.
+    """
+    necessarias = max(-(-duracao // INTERVALO_SLOT), 1)
+    livres = []
+    sequencia = 0
+    for i in range(len(mapa) - 1, -1, -1):
+        sequencia = sequencia + 1 if mapa[i] else 0
+        if sequencia >= necessarias:
+            livres.append(minutos_para_horario(i * INTERVALO_SLOT))
+    livres.reverse()
+    return livres
+
+
+def buscar_agendamentos_periodo(inicio, fim):
+    """
+    Busca os agendamentos ativos entre as datas (inclusive) em uma única consulta por intervalo
+    """
+    return Agendamento.objects.no_intervalo(inicio, fim).exclude(status='cancelado')
+
+
+def buscar_reservas_periodo(inicio, fim, cliente_id=None):
+    """
+    Busca as reservas ainda válidas entre as datas (inclusive), ignorando as do cliente informado
+    """
+    reservas = ReservaHorario.objects.no_intervalo(inicio, fim).filter(expira_em__gt=timezone.now())
+    if cliente_id is not None:
+        reservas = reservas.exclude(cliente_id=cliente_id)
+    return reservas
+
+
+def _filtrar_agendas(queryset, agendas):
+    """
+    Restringe o queryset às agendas consultadas e aos agendamentos sem profissional
+    """
+    if None in agendas:
+        return queryset.filter(profissional__isnull=True)
+    return queryset.filter(Q(profissional_id__in=list(agendas)) | Q(profissional__isnull=True))
+
+
+def agenda_mais_livre(mapas, carga, inicio, fim):
+    """
+    Retorna a agenda com mais células livres em [inicio, fim), desempatando pela menor carga
+    """
+    celulas = range(max(inicio // INTERVALO_SLOT, 0), -(-fim // INTERVALO_SLOT))
+
+    def ocupadas(agenda):
+        mapa = mapas[agenda]
+        return sum(1 for i in celulas if i >= len(mapa) or not mapa[i])
+
+    return min(mapas, key=lambda agenda: (ocupadas(agenda), carga[agenda], agenda or 0))
+
+
+def montar_mapas_periodo(inicio, fim, profissional_id=None, cliente_id=None, ignorar_id=None):
+    """
+    Monta, para cada agenda consultada, o mapa de células livres do período (dias concatenados)
+
+    Retorna também os minutos já agendados de cada agenda no período. As
+    reservas de outros clientes ocupam o mapa, mas não contam como carga.
+    O agendamento ignorar_id (o que está sendo remarcado) não ocupa o mapa.
+    Agendamentos e reservas sem profissional, quando há agendas por
+    profissional, são distribuídos depois dos demais com agenda_mais_livre.
+    """
+    agendas = agendas_semanais(profissional_id)
+    mapas = {}
+    for agenda, expediente in agendas.items():
+        mapa = []
+        dia = inicio
+        while dia <= fim:
+            mapa.extend(expediente[dia.weekday()])
+            dia += timedelta(days=1)
+        mapas[agenda] = mapa
+
+    agendamentos = _filtrar_agendas(buscar_agendamentos_periodo(inicio, fim), agendas)
+    if ignorar_id is not None:
+        agendamentos = agendamentos.exclude(pk=ignorar_id)
+    reservas = _filtrar_agendas(buscar_reservas_periodo(inicio, fim, cliente_id), agendas)
+
+    origem = datetime.combine(inicio, time.min)
+    carga = Counter()
+    sem_agenda = []
+    for queryset, conta_carga in ((agendamentos, True), (reservas, False)):
+        for agenda, data_hora, duracao in queryset.values_list('profissional_id', 'data_hora', 'servico__duracao'):
+            duracao = duracao or INTERVALO_SLOT
+            local = timezone.localtime(data_hora).replace(tzinfo=None)
+            comeco = int((local - origem).total_seconds() // 60)
+            if agenda not in mapas:
+                sem_agenda.append((comeco, duracao, conta_carga))
+                continue
+            marcar_ocupado(mapas[agenda], comeco, comeco + duracao)
+            if conta_carga:
+                carga[agenda] += duracao
+
+    for comeco, duracao, conta_carga in sorted(sem_agenda):
+        agenda = agenda_mais_livre(mapas, carga, comeco, comeco + duracao)
+        marcar_ocupado(mapas[agenda], comeco, comeco + duracao)
+        if conta_carga:
+            carga[agenda] += duracao
+    return mapas, carga
+
+
+def horarios_disponiveis_periodo(inicio, fim, duracao=INTERVALO_SLOT, profissional_id=None, cliente_id=None):
+    """
+    Retorna os horários livres de cada dia do período, agrupados por data ('YYYY-MM-DD')
+
+    Um horário está livre se ao menos uma das agendas consultadas comporta o serviço.
+    """
+    mapas, _ = montar_mapas_periodo(inicio, fim, profissional_id, cliente_id)
+
+    resultado = {}
+    for n in range((fim - inicio).days + 1):
+        dia = inicio + timedelta(days=n)
+        livres = set()
+        for mapa in mapas.values():
+            livres.update(horarios_livres(mapa[n * SLOTS_POR_DIA:(n + 1) * SLOTS_POR_DIA], duracao))
+        resultado[dia.isoformat()] = sorted(livres)
+    return resultado
+
+
+def horarios_disponiveis_dia(dia, duracao=INTERVALO_SLOT, profissional_id=None, cliente_id=None):
+    """
+    Retorna os horários livres de um único dia
+    """
+    return horarios_disponiveis_periodo(dia, dia, duracao, profissional_id, cliente_id)[dia.isoformat()]
+
+
+def escolher_profissional(data_hora, duracao, profissional_id=None, cliente_id=None, ignorar_id=None):
+    """
+    Retorna o profissional que atenderá o agendamento em data_hora
+
+    Com profissional_id, apenas confirma que ele comporta o horário. Sem ele,
+    escolhe o profissional disponível com menos minutos agendados no dia.
+    Retorna None quando a clínica funciona como agenda única e levanta
+    HorarioIndisponivel quando ninguém comporta o horário. As reservas do
+    cliente_id e o agendamento ignorar_id não bloqueiam o horário.
+    """
+    local = timezone.localtime(data_hora)
+    mapas, carga = montar_mapas_periodo(local.date(), local.date(), profissional_id, cliente_id, ignorar_id)
+
+    comeco = horario_para_minutos(local.time())
+    celulas = range(comeco // INTERVALO_SLOT, -(-(comeco + duracao) // INTERVALO_SLOT))
+    if celulas.stop > SLOTS_POR_DIA:
+        raise HorarioIndisponivel()
+
+    candidatos = [
+        agenda for agenda, mapa in mapas.items()
+        if all(mapa[i] for i in celulas)
+    ]
+    if not candidatos:
+        raise HorarioIndisponivel()
+    return min(candidatos, key=lambda agenda: (carga[agenda], agenda or 0))
+
+
+def verificar_conflitos(candidatos):
+    """
+    Retorna, para cada candidato (inicio, fim, profissional_id), o id do agendamento
+    que o bloqueia ou None se o horário estiver livre
+
+    Segue a mesma regra da constraint do banco: só conflitam intervalos da
+    mesma agenda (mesmo profissional, ou ambos sem profissional). Os
+    agendamentos de toda a janela coberta são carregados em uma única
+    consulta e cada agenda é resolvida com uma varredura dos intervalos
+    ordenados pelo início.
+
+    Os conflitos legados que ficaram sem período (migração 0005) entram
+    com o intervalo calculado a partir de data_hora e da duração do serviço.
+    """
+    if not candidatos:
+        return []
+
+    janela = DateTimeTZRange(min(c[0] for c in candidatos), max(c[1] for c in candidatos), '[)')
+    ocupados = defaultdict(list)
+    fim_servico = ExpressionWrapper(
+        F('data_hora') + ExpressionWrapper(F('servico__duracao') * timedelta(minutes=1), output_field=DurationField()),
+        output_field=DateTimeField()
+    )
+    linhas = Agendamento.objects.annotate(fim_servico=fim_servico).filter(
+        Q(periodo__overlap=janela)
+        | Q(periodo__isnull=True, data_hora__lt=janela.upper, fim_servico__gt=janela.lower)
+    ).exclude(
+        status='cancelado'
+    ).values_list('id', 'profissional_id', 'periodo', 'data_hora', 'fim_servico')
+    for agendamento_id, agenda, periodo, data_hora, fim in linhas:
+        if periodo is None:
+            ocupados[agenda].append((data_hora, fim, agendamento_id))
+        else:
+            ocupados[agenda].append((periodo.lower, periodo.upper, agendamento_id))
+
+    por_agenda = defaultdict(list)
+    for indice, (inicio, fim, agenda) in enumerate(candidatos):
+        por_agenda[agenda].append((inicio, fim, indice))
+
+    resultado = [None] * len(candidatos)
+    for agenda, pendentes in por_agenda.items():
+        existentes = sorted(ocupados.get(agenda, []))
+        ativos = []  # heap por fim dos agendamentos já iniciados
+        proximo = 0
+        for inicio, fim, indice in sorted(pendentes):
+            # Entram os agendamentos que começam antes do fim do candidato
+            while proximo < len(existentes) and existentes[proximo][0] < fim:
+                comeco, termino, agendamento_id = existentes[proximo]
+                heapq.heappush(ativos, (termino, comeco, agendamento_id))
+                proximo += 1
+            # Saem os que terminam até o início (os candidatos seguintes começam depois)
+            while ativos and ativos[0][0] <= inicio:
+                heapq.heappop(ativos)
+            bloqueios = [(comeco, agendamento_id) for _, comeco, agendamento_id in ativos if comeco < fim]
+            if bloqueios:
+                resultado[indice] = min(bloqueios)[1]
+    return resultado
+
+
+def proximos_horarios(inicio, quantidade, duracao=INTERVALO_SLOT, profissional_id=None, cliente_id=None):
+    """
+    Retorna os primeiros `quantidade` horários livres a partir de `inicio`
+
+    Avança em janelas que dobram de tamanho (uma consulta por janela) e para
+    assim que encontra horários suficientes ou atinge HORIZONTE_MAX_DIAS.
+    """
+    agora = timezone.localtime()
+    hoje, hora_atual = agora.date().isoformat(), agora.strftime('%H:%M')
+    limite = inicio + timedelta(days=HORIZONTE_MAX_DIAS - 1)
+    janela = JANELA_INICIAL_DIAS
+    encontrados = []
+
+    while inicio <= limite:
+        fim = min(inicio + timedelta(days=janela - 1), limite)
+        periodo = horarios_disponiveis_periodo(inicio, fim, duracao, profissional_id, cliente_id)
+        for data, horarios in periodo.items():
+            for horario in horarios:
+                # Horários de hoje que já passaram não podem ser agendados
+                if data < hoje or (data == hoje and horario <= hora_atual):
+                    continue
+                encontrados.append({'data': data, 'horario': horario})
+                if len(encontrados) >= quantidade:
+                    return encontrados
+        inicio = fim + timedelta(days=1)
+        janela *= 2
+    return encontrados
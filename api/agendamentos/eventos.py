@@ -0,0 +1,297 @@
+"""
+Feed de alterações de agendamentos (Server-Sent Events)
+
+Cada criação, alteração, cancelamento ou exclusão de agendamento gera um
+evento compacto ({tipo, id, data_hora, status}) que é publicado com
+pg_notify depois do commit da transação (ver signals.py). Como o aviso
+passa pelo PostgreSQL, ele chega a todos os processos do servidor, não
+só ao que gravou o agendamento.
+
+Em cada processo ASGI um único Ouvinte mantém uma conexão com LISTEN,
+lida pelo próprio event loop, e repassa cada evento para as filas das
+conexões SSE abertas cuja janela de datas contém o agendamento. Assim o
+calendário recebe apenas o que mudou na semana exibida, em vez de
+consultar a semana inteira periodicamente.
+
+Cada evento recebe, no próprio pg_notify, um número de uma sequência do
+banco, enviado como `id:` do SSE; por ser global, vale em qualquer
+processo. O Ouvinte guarda os últimos eventos recebidos e, quando o
+navegador reconecta com Last-Event-ID, reenvia os que ele perdeu. Se o
+processo não acompanhou todo o intervalo desde esse id (acabou de abrir a
+conexão LISTEN ou o histórico já descartou os eventos), o feed envia
+`recarregar` e o cliente busca o período de novo. A conexão LISTEN fica
+aberta por ESPERA_DESCONEXAO segundos depois que a última conexão SSE
+sai, para cobrir a reconexão periódica do navegador.
+"""
+import asyncio
+import json
+import logging
+from collections import deque
+import psycopg2
+from django.conf import settings
+from django.db import DatabaseError, connection, connections, transaction
+from django.utils.dateparse import parse_datetime
+from .models import como_datetime
+
+logger = logging.getLogger(__name__)
+
+# Canal do PostgreSQL usado para os avisos
+CANAL = 'agendamentos_eventos'
+
+# Sequência do PostgreSQL que numera os eventos (migração 0013)
+SEQUENCIA = 'agendamentos_eventos_seq'
+
+# Eventos recentes guardados por processo para a retomada com Last-Event-ID
+TAMANHO_HISTORICO = 1000
+
+# Segundos em que a conexão LISTEN continua aberta sem nenhuma conexão SSE
+ESPERA_DESCONEXAO = 60
+
+# Eventos pendentes por conexão SSE antes de ela ser considerada atrasada
+TAMANHO_FILA = 100
+
+# Intervalo, em segundos, dos comentários que mantêm a conexão SSE aberta
+HEARTBEAT = 15
+
+# Duração padrão, em segundos, de uma conexão SSE antes de o navegador reconectar
+DURACAO_CONEXAO_PADRAO = 300
+
+# Espera, em milissegundos, antes de o navegador reconectar
+RECONEXAO = 3000
+
+
+def duracao_conexao():
+    """
+    Retorna por quanto tempo uma conexão SSE fica aberta
+    """
+    return getattr(settings, 'EVENTOS_DURACAO_CONEXAO', DURACAO_CONEXAO_PADRAO)
+
+
+def tipo_evento(agendamento, criado):
+    """
+    Classifica a gravação do agendamento em criado, cancelado ou atualizado
+    """
+    if criado:
+        return 'criado'
+    if agendamento.status == 'cancelado':
+        return 'cancelado'
+    return 'atualizado'
+
+
+def publicar(agendamento, tipo, data_hora_anterior=None):
+    """
+    Publica o evento do agendamento quando a transação atual for confirmada
+    """
+    data_hora = como_datetime(agendamento.data_hora)
+    evento = {
+        'tipo': tipo,
+        'id': agendamento.id,
+        'data_hora': data_hora.isoformat(),
+        'status': agendamento.status,
+    }
+    if data_hora_anterior is not None and data_hora_anterior != data_hora:
+        evento['data_hora_anterior'] = data_hora_anterior.isoformat()
+    transaction.on_commit(lambda: _notificar(evento))
+
+
+def _notificar(evento):
+    try:
+        with connection.cursor() as cursor:
+            # O número do evento é gerado na mesma instrução que o publica
+            cursor.execute(
+                "SELECT pg_notify(%s, jsonb_set(%s::jsonb, '{seq}', to_jsonb(nextval(%s)))::text)",
+                [CANAL, json.dumps(evento), SEQUENCIA]
+            )
+    except DatabaseError:
+        # O agendamento já foi gravado; perder o aviso não deve falhar a requisição
+        logger.warning('Não foi possível publicar o evento do agendamento %s', evento['id'], exc_info=True)
+
+
+class Assinatura:
+    """
+    Conexão SSE aberta, com a janela de datas [inicio, fim) que ela acompanha
+    """
+    def __init__(self, inicio=None, fim=None):
+        self.inicio = inicio
+        self.fim = fim
+        self.fila = asyncio.Queue(maxsize=TAMANHO_FILA)
+
+    def acompanha(self, *datas):
+        """
+        Verifica se alguma das datas está na janela da conexão
+        """
+        return any(
+            (self.inicio is None or data >= self.inicio) and (self.fim is None or data < self.fim)
+            for data in datas
+        )
+
+    def entregar(self, evento):
+        """
+        Enfileira o evento; se a conexão estiver atrasada, descarta a fila e sinaliza com None
+        """
+        try:
+            self.fila.put_nowait(evento)
+            return True
+        except asyncio.QueueFull:
+            while not self.fila.empty():
+                self.fila.get_nowait()
+            self.fila.put_nowait(None)
+            return False
+
+
+class Ouvinte:
+    """
+    Conexão LISTEN compartilhada pelas conexões SSE do processo
+    """
+    def __init__(self):
+        self.conexao = None
+        self.assinaturas = set()
+        # Eventos recentes e o número a partir do qual o processo recebeu todos os eventos
+        self.historico = deque(maxlen=TAMANHO_HISTORICO)
+        self.cobertura = None
+        self.posicao = None
+        self._fechamento = None
+        self._loop = None
+        self._lock = None
+
+    async def assinar(self, inicio=None, fim=None, ultimo_id=None):
+        """
+        Registra uma nova conexão SSE, abrindo a conexão LISTEN se for a primeira
+
+        Retorna a assinatura e as mensagens a enviar antes dos eventos novos:
+        os eventos perdidos desde ultimo_id (ou `recarregar`, se não for
+        possível reenviá-los) e o id da posição atual.
+        """
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            if self._fechamento is not None:
+                self._fechamento.cancel()
+                self._fechamento = None
+            if self.conexao is None:
+                self._loop = asyncio.get_running_loop()
+                self.conexao, self.posicao = await self._loop.run_in_executor(None, self._conectar)
+                self.cobertura = self.posicao
+                self._loop.add_reader(self.conexao.fileno(), self._ler)
+            assinatura = Assinatura(inicio, fim)
+            self.assinaturas.add(assinatura)
+            return assinatura, self._retomada(assinatura, ultimo_id)
+
+    def _retomada(self, assinatura, ultimo_id):
+        if ultimo_id is None:
+            return [f'id: {self.posicao}\n\n']
+        descartados_ate = self.historico[0]['seq'] - 1 if len(self.historico) == self.historico.maxlen else None
+        if ultimo_id < self.cobertura or (descartados_ate is not None and ultimo_id < descartados_ate):
+            return [f'id: {self.posicao}\nevent: recarregar\ndata: {{}}\n\n']
+        perdidos = [
+            formatar(evento) for evento in self.historico
+            if evento['seq'] > ultimo_id and assinatura.acompanha(*datas_evento(evento))
+        ]
+        return perdidos + [f'id: {self.posicao}\n\n']
+
+    def cancelar(self, assinatura):
+        """
+        Remove a conexão SSE; sem nenhuma restante, a conexão LISTEN fecha depois de ESPERA_DESCONEXAO
+        """
+        self.assinaturas.discard(assinatura)
+        if not self.assinaturas and self.conexao is not None and self._fechamento is None:
+            self._fechamento = self._loop.call_later(ESPERA_DESCONEXAO, self._desconectar_ocioso)
+
+    def _conectar(self):
+        conexao = psycopg2.connect(**connections['default'].get_connection_params())
+        conexao.set_session(autocommit=True)
+        with conexao.cursor() as cursor:
+            cursor.execute(f'LISTEN {CANAL}')
+            # Depois do LISTEN: todo evento numerado após esta leitura chega a esta conexão
+            cursor.execute(f'SELECT last_value, is_called FROM {SEQUENCIA}')
+            ultimo, usado = cursor.fetchone()
+        return conexao, ultimo if usado else ultimo - 1
+
+    def _desconectar_ocioso(self):
+        self._fechamento = None
+        if not self.assinaturas:
+            self._desconectar()
+
+    def _desconectar(self):
+        if self._fechamento is not None:
+            self._fechamento.cancel()
+            self._fechamento = None
+        if self.conexao is None:
+            return
+        self._loop.remove_reader(self.conexao.fileno())
+        self.conexao.close()
+        self.conexao = None
+        self.historico.clear()
+        self.cobertura = None
+
+    def _ler(self):
+        try:
+            self.conexao.poll()
+        except psycopg2.Error:
+            # Conexão perdida: encerrar as conexões SSE, que reconectam sozinhas
+            for assinatura in list(self.assinaturas):
+                assinatura.entregar(None)
+            self.assinaturas.clear()
+            self._desconectar()
+            return
+
+        while self.conexao.notifies:
+            aviso = self.conexao.notifies.pop(0)
+            evento = json.loads(aviso.payload)
+            self.historico.append(evento)
+            self.posicao = max(self.posicao, evento['seq'])
+
+            for assinatura in list(self.assinaturas):
+                if assinatura.acompanha(*datas_evento(evento)) and not assinatura.entregar(evento):
+                    # Conexão atrasada: sai do feed e o cliente recarrega a semana ao reconectar
+                    self.assinaturas.discard(assinatura)
+
+
+ouvinte = Ouvinte()
+
+
+def datas_evento(evento):
+    """
+    Retorna as datas do agendamento do evento (a atual e, na remarcação, a anterior)
+    """
+    datas = [parse_datetime(evento['data_hora'])]
+    if 'data_hora_anterior' in evento:
+        datas.append(parse_datetime(evento['data_hora_anterior']))
+    return datas
+
+
+def formatar(evento):
+    """
+    Formata o evento no protocolo SSE
+    """
+    return f"id: {evento['seq']}\nevent: {evento['tipo']}\ndata: {json.dumps(evento)}\n\n"
+
+
+async def fluxo(assinatura, iniciais=()):
+    """
+    Gera as mensagens SSE da conexão até o tempo limite, enviando heartbeats nos intervalos
+
+    As mensagens iniciais (retomada, ver Ouvinte.assinar) são enviadas antes dos eventos novos.
+    """
+    loop = asyncio.get_running_loop()
+    limite = loop.time() + duracao_conexao()
+    try:
+        yield f'retry: {RECONEXAO}\n\n'
+        for mensagem in iniciais:
+            yield mensagem
+        while True:
+            restante = limite - loop.time()
+            if restante <= 0:
+                break
+            try:
+                evento = await asyncio.wait_for(assinatura.fila.get(), timeout=min(HEARTBEAT, restante))
+            except asyncio.TimeoutError:
+                yield ': ping\n\n'
+                continue
+            if evento is None:
+                # Eventos perdidos: o cliente deve recarregar o período antes de continuar
+                yield 'event: recarregar\ndata: {}\n\n'
+                break
+            yield formatar(evento)
+    finally:
+        ouvinte.cancelar(assinatura)
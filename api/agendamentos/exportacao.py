@@ -0,0 +1,153 @@
+"""
+Exportação de agendamentos em CSV ou NDJSON, em streaming
+
+As linhas são lidas com QuerySet.iterator(chunk_size=...), que no
+PostgreSQL usa um cursor do lado do servidor, e cada linha é formatada e
+enviada assim que lida. Nenhum ponto guarda a exportação inteira em
+memória, então o consumo é o mesmo para mil ou milhões de linhas. A
+compressão gzip opcional também é feita por blocos.
+
+Sob ASGI o Django converte um iterador síncrono em lista antes de enviar
+a resposta, então nesse caso os blocos são entregues por um iterador
+assíncrono (percorrer_async) que lê um bloco de cada vez.
+"""
+import csv
+import json
+import zlib
+from datetime import timedelta
+from asgiref.sync import sync_to_async
+from django.utils import timezone
+from .models import Agendamento, inicio_do_dia
+
+# Linhas buscadas do cursor do banco por vez
+TAMANHO_LOTE = 2000
+
+# Tamanho aproximado dos blocos enviados ao cliente
+TAMANHO_BLOCO = 64 * 1024
+
+FORMATOS = {
+    'csv': 'text/csv',
+    'ndjson': 'application/x-ndjson',
+}
+
+# Nome da coluna exportada e caminho correspondente no queryset
+COLUNAS = [
+    ('id', 'id'),
+    ('data_hora', 'data_hora'),
+    ('status', 'status'),
+    ('cliente', 'cliente__nome'),
+    ('pet', 'animal__nome'),
+    ('especie', 'animal__especie'),
+    ('servico', 'servico__nome'),
+    ('preco', 'servico__preco'),
+    ('profissional', 'profissional__nome'),
+    ('observacoes', 'observacoes'),
+]
+
+
+def filtrar_agendamentos(data_inicio=None, data_fim=None, status=None, servico_id=None):
+    """
+    Retorna as tuplas dos agendamentos a exportar, em ordem cronológica
+    """
+    agendamentos = Agendamento.objects.all()
+    if data_inicio:
+        agendamentos = agendamentos.filter(data_hora__gte=inicio_do_dia(data_inicio))
+    if data_fim:
+        agendamentos = agendamentos.filter(data_hora__lt=inicio_do_dia(data_fim + timedelta(days=1)))
+    if status:
+        agendamentos = agendamentos.filter(status=status)
+    if servico_id:
+        agendamentos = agendamentos.filter(servico_id=servico_id)
+    return agendamentos.order_by('data_hora', 'id').values_list(*[caminho for _, caminho in COLUNAS])
+
+
+def _valores(linha):
+    """
+    Converte uma tupla do queryset nos valores exportados
+    """
+    valores = dict(zip([nome for nome, _ in COLUNAS], linha))
+    valores['data_hora'] = timezone.localtime(valores['data_hora']).isoformat()
+    if valores['preco'] is not None:
+        valores['preco'] = str(valores['preco'])
+    return valores
+
+
+class _Eco:
+    """
+    Buffer de escrita que apenas devolve o texto escrito, para usar csv.writer linha a linha
+    """
+    def write(self, valor):
+        return valor
+
+
+def linhas_csv(linhas):
+    """
+    Gera o cabeçalho e uma linha CSV por agendamento
+    """
+    escritor = csv.writer(_Eco())
+    yield escritor.writerow([nome for nome, _ in COLUNAS])
+    for linha in linhas:
+        yield escritor.writerow(_valores(linha).values())
+
+
+def linhas_ndjson(linhas):
+    """
+    Gera um objeto JSON por linha para cada agendamento
+    """
+    for linha in linhas:
+        yield json.dumps(_valores(linha), ensure_ascii=False) + '\n'
+
+
+def em_blocos(textos, tamanho=TAMANHO_BLOCO):
+    """
+    Agrupa os textos gerados em blocos de bytes de aproximadamente `tamanho`
+    """
+    bloco = []
+    acumulado = 0
+    for texto in textos:
+        dados = texto.encode('utf-8')
+        bloco.append(dados)
+        acumulado += len(dados)
+        if acumulado >= tamanho:
+            yield b''.join(bloco)
+            bloco = []
+            acumulado = 0
+    if bloco:
+        yield b''.join(bloco)
+
+
+def comprimir_gzip(blocos):
+    """
+    Comprime os blocos em formato gzip sem acumular a saída inteira
+    """
+    compressor = zlib.compressobj(wbits=31)  # 16 + 15: cabeçalho e rodapé gzip
+    for bloco in blocos:
+        comprimido = compressor.compress(bloco)
+        if comprimido:
+            yield comprimido
+    yield compressor.flush()
+
+
+def exportar(queryset, formato='csv', gzip=False):
+    """
+    Retorna o gerador de bytes da exportação do queryset no formato pedido
+    """
+    linhas = queryset.iterator(chunk_size=TAMANHO_LOTE)
+    textos = linhas_ndjson(linhas) if formato == 'ndjson' else linhas_csv(linhas)
+    blocos = em_blocos(textos)
+    return comprimir_gzip(blocos) if gzip else blocos
+
+
+async def percorrer_async(blocos):
+    """
+    Entrega os blocos de um gerador síncrono a partir do event loop, um de cada vez
+
+    Cada bloco é lido na thread das views síncronas (thread_sensitive), a
+    mesma em que a view abriu a conexão com o banco e o cursor do servidor.
+    """
+    proximo = sync_to_async(next)
+    while True:
+        bloco = await proximo(blocos, None)
+        if bloco is None:
+            return
+        yield bloco
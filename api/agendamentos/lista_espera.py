@@ -0,0 +1,102 @@
+"""
+Encaixe de pedidos da lista de espera em horários liberados
+
+Quando um agendamento futuro é cancelado ou excluído, os pedidos cuja
+janela de datas contém o dia liberado são buscados pelo índice GiST
+parcial da janela (daterange @> dia, apenas pedidos em aberto), do
+profissional daquele horário primeiro e depois por ordem de chegada. O primeiro pedido que couber é
+agendado automaticamente ou recebe uma reserva do horário, tudo na mesma
+transação do cancelamento. Assim o cliente não precisa ficar consultando
+a disponibilidade à espera de uma vaga.
+"""
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from .models import Agendamento, ListaEspera, ReservaHorario, janela_lista_espera
+from .reservas import limpar_reservas_expiradas
+
+# Validade padrão, em segundos, do horário oferecido a um pedido sem encaixe automático
+OFERTA_TTL_PADRAO = 1800
+
+# Quantidade de pedidos avaliados por vaga liberada
+MAX_PEDIDOS_VAGA = 10
+
+
+def tempo_oferta():
+    """
+    Retorna a validade configurada para as ofertas da lista de espera
+    """
+    return timedelta(seconds=getattr(settings, 'LISTA_ESPERA_OFERTA_TTL', OFERTA_TTL_PADRAO))
+
+
+def pedidos_compativeis(agendamento):
+    """
+    Retorna os pedidos em aberto que cabem no horário do agendamento, na ordem de prioridade
+    """
+    dia = timezone.localtime(agendamento.data_hora).date()
+    return ListaEspera.objects.annotate(janela=janela_lista_espera()).filter(
+        Q(status='aguardando') | Q(status='oferecido', oferta_expira_em__lte=timezone.now()),
+        Q(profissional__isnull=True) | Q(profissional_id=agendamento.profissional_id),
+        status__in=['aguardando', 'oferecido'],
+        janela__contains=dia,
+        servico__duracao__lte=agendamento.servico.duracao,
+    ).order_by(F('profissional').asc(nulls_last=True), 'criado_em')
+
+
+def preencher_vaga(agendamento):
+    """
+    Encaixa o primeiro pedido compatível no horário liberado pelo agendamento
+
+    Deve ser chamada dentro da transação que cancela ou exclui o agendamento.
+    Retorna o pedido atendido, ou None se nenhum couber.
+    """
+    if agendamento.data_hora <= timezone.now():
+        return None
+
+    # Uma reserva vencida no horário liberado ainda ocupa a constraint e faria toda oferta falhar
+    limpar_reservas_expiradas()
+
+    pedidos = pedidos_compativeis(agendamento).select_related('servico').select_for_update(
+        skip_locked=True, of=('self',)
+    )[:MAX_PEDIDOS_VAGA]
+
+    for pedido in pedidos:
+        try:
+            # Cada tentativa em um savepoint: um conflito não desfaz o cancelamento
+            with transaction.atomic():
+                if pedido.agendar_automaticamente:
+                    pedido.agendamento = Agendamento.objects.create(
+                        empresa_id=pedido.empresa_id,
+                        cliente_id=pedido.cliente_id,
+                        animal_id=pedido.animal_id,
+                        servico=pedido.servico,
+                        profissional_id=agendamento.profissional_id,
+                        data_hora=agendamento.data_hora,
+                        observacoes=pedido.observacoes
+                    )
+                    pedido.status = 'agendado'
+                else:
+                    reserva = ReservaHorario.objects.create(
+                        cliente_id=pedido.cliente_id,
+                        servico=pedido.servico,
+                        profissional_id=agendamento.profissional_id,
+                        data_hora=agendamento.data_hora,
+                        expira_em=timezone.now() + tempo_oferta()
+                    )
+                    pedido.status = 'oferecido'
+                    pedido.reserva_token = reserva.token
+                    pedido.oferta_expira_em = reserva.expira_em
+                pedido.save(update_fields=['status', 'agendamento', 'reserva_token', 'oferta_expira_em'])
+            return pedido
+        except IntegrityError:
+            continue
+    return None
+
+
+def confirmar_oferta(token, agendamento):
+    """
+    Marca como agendado o pedido cuja oferta foi usada para criar o agendamento
+    """
+    ListaEspera.objects.filter(reserva_token=token).update(status='agendado', agendamento=agendamento)
@@ -0,0 +1,201 @@
+import json
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from agendamentos import disponibilidade
+from agendamentos.models import Agendamento, calcular_intervalo
+from animais.models import Animal
+from core.models import Empresa
+from servicos.models import Servico
+from usuarios.models import Usuario
+
+# Índices criados na migração 0010_indices_consulta
+INDICES_CONSULTA = [
+    'agendamento_data_idx',
+    'agendamento_cliente_data_idx',
+    'agendamento_animal_data_idx',
+    'agendamento_ativo_data_idx',
+]
+
+# Índices simples das FKs que existiam antes da migração
+INDICES_ANTERIORES = {
+    'benchmark_cliente_id_idx': 'cliente_id',
+    'benchmark_animal_id_idx': 'animal_id',
+}
+
+STATUS_CICLO = ['pendente', 'confirmado', 'realizado', 'realizado', 'cancelado']
+
+
+class Command(BaseCommand):
+    help = (
+        'Mede planos e latências das consultas de agendamentos antes e depois dos índices de consulta. '
+        'ATENÇÃO: remove e recria índices da tabela de agendamentos dentro de uma transação, o que mantém '
+        'um lock ACCESS EXCLUSIVE na tabela até o fim da medição e bloqueia leituras e escritas da API. '
+        'Só roda com DEBUG ativo ou com --force.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--agendamentos',
+            type=int,
+            default=200000,
+            help='Quantidade de agendamentos gerados para a medição',
+        )
+        parser.add_argument(
+            '--clientes',
+            type=int,
+            default=500,
+            help='Quantidade de clientes (um animal por cliente) gerados',
+        )
+        parser.add_argument(
+            '--repeticoes',
+            type=int,
+            default=5,
+            help='Execuções de cada consulta; o relatório usa a mediana',
+        )
+        parser.add_argument(
+            '--force',
+            action='store_true',
+            help='Roda mesmo sem DEBUG, aceitando bloquear a tabela de agendamentos durante a medição',
+        )
+
+    def handle(self, *args, **options):
+        # O DROP INDEX segura um lock ACCESS EXCLUSIVE até o rollback: não rodar em produção por engano
+        if not settings.DEBUG and not options['force']:
+            raise CommandError(
+                'benchmark_indices bloqueia a tabela de agendamentos (ACCESS EXCLUSIVE) enquanto mede. '
+                'Rode com DEBUG ativo ou use --force em um banco sem tráfego.'
+            )
+
+        # Tudo roda em uma transação desfeita no final: o banco não é alterado
+        with transaction.atomic():
+            consultas = self.popular(options['agendamentos'], options['clientes'])
+
+            depois = self.medir(consultas, options['repeticoes'])
+            self.trocar_indices()
+            antes = self.medir(consultas, options['repeticoes'])
+
+            transaction.set_rollback(True)
+
+        self.relatorio(consultas, antes, depois)
+
+    def popular(self, quantidade, clientes):
+        """
+        Gera clientes, animais e agendamentos sequenciais e retorna as consultas medidas
+        """
+        self.stdout.write(f'Gerando {quantidade} agendamentos para {clientes} clientes...')
+        empresa = Empresa.objects.first() or Empresa.objects.create(nome='Benchmark')
+        servico = Servico.objects.filter(duracao=disponibilidade.INTERVALO_SLOT).first() or Servico.objects.create(
+            nome='Benchmark', preco=0, empresa=empresa
+        )
+
+        usuarios = Usuario.objects.bulk_create([
+            Usuario(username=f'benchmark-{i}', nome=f'Cliente {i}', tipo='cliente', password='!')
+            for i in range(clientes)
+        ])
+        animais = Animal.objects.bulk_create([
+            Animal(dono=usuario, empresa=empresa, nome=f'Animal {i}', especie='Cão')
+            for i, usuario in enumerate(usuarios)
+        ])
+
+        # Começar depois do último agendamento existente para não violar a constraint de sobreposição
+        ultimo = Agendamento.objects.order_by('-data_hora').values_list('data_hora', flat=True).first()
+        inicio = max(timezone.now(), ultimo or timezone.now()).replace(minute=0, second=0, microsecond=0)
+        inicio += timedelta(days=1)
+        passo = timedelta(minutes=disponibilidade.INTERVALO_SLOT)
+
+        lote = []
+        for i in range(quantidade):
+            data_hora = inicio + i * passo
+            n = i % clientes
+            lote.append(Agendamento(
+                empresa=empresa,
+                cliente_id=usuarios[n].id,
+                animal_id=animais[n].id,
+                servico=servico,
+                data_hora=data_hora,
+                status=STATUS_CICLO[i % len(STATUS_CICLO)],
+                periodo=calcular_intervalo(data_hora, servico.duracao),
+            ))
+            if len(lote) == 5000:
+                Agendamento.objects.bulk_create(lote)
+                lote = []
+        Agendamento.objects.bulk_create(lote)
+
+        with connection.cursor() as cursor:
+            # As FKs são DEFERRABLE: validar agora para permitir DDL na mesma transação
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+            cursor.execute(f'ANALYZE {Agendamento._meta.db_table}')
+
+        meio = timezone.localtime(inicio + (quantidade // 2) * passo).date()
+        return {
+            'listagem geral (-data_hora)': Agendamento.objects.order_by('-data_hora')[:20],
+            'agendamentos do cliente': Agendamento.objects.filter(cliente_id=usuarios[0].id).order_by('-data_hora')[:20],
+            'histórico do animal': Agendamento.objects.filter(animal_id=animais[-1].id).order_by('-data_hora')[:20],
+            'disponibilidade da semana': disponibilidade.buscar_agendamentos_periodo(meio, meio + timedelta(days=6)).values_list(
+                'profissional_id', 'data_hora', 'servico__duracao'
+            ),
+            'ativos do dia (contagem)': Agendamento.objects.no_dia(meio).exclude(status='cancelado').values('id'),
+        }
+
+    def trocar_indices(self):
+        """
+        Volta ao esquema anterior: remove os índices de consulta e recria os índices simples das FKs.
+        O DROP INDEX trava a tabela (ACCESS EXCLUSIVE) até o fim da transação de handle
+        """
+        tabela = Agendamento._meta.db_table
+        with connection.cursor() as cursor:
+            for nome in INDICES_CONSULTA:
+                cursor.execute(f'DROP INDEX IF EXISTS {nome}')
+            for nome, coluna in INDICES_ANTERIORES.items():
+                cursor.execute(f'CREATE INDEX {nome} ON {tabela} ({coluna})')
+            cursor.execute(f'ANALYZE {tabela}')
+
+    def medir(self, consultas, repeticoes):
+        """
+        Executa EXPLAIN ANALYZE de cada consulta e retorna {nome: (plano, mediana em ms)}
+        """
+        resultados = {}
+        for nome, queryset in consultas.items():
+            sql, params = queryset.query.sql_with_params()
+            tempos = []
+            with connection.cursor() as cursor:
+                for _ in range(repeticoes):
+                    cursor.execute(f'EXPLAIN (ANALYZE, FORMAT JSON) {sql}', params)
+                    plano = cursor.fetchone()[0]
+                    if isinstance(plano, str):
+                        plano = json.loads(plano)
+                    tempos.append(plano[0]['Execution Time'])
+            tempos.sort()
+            resultados[nome] = (self.resumir_plano(plano[0]['Plan']), tempos[len(tempos) // 2])
+        return resultados
+
+    def resumir_plano(self, no):
+        """
+        Resume o plano nos tipos de nó e índices usados, do topo para as folhas
+        """
+        partes = []
+        pendentes = [no]
+        while pendentes:
+            atual = pendentes.pop(0)
+            descricao = atual['Node Type']
+            if 'Index Name' in atual:
+                descricao += f" ({atual['Index Name']})"
+            partes.append(descricao)
+            pendentes.extend(atual.get('Plans', []))
+        return ' > '.join(partes)
+
+    def relatorio(self, consultas, antes, depois):
+        """
+        Imprime o comparativo antes/depois de cada consulta
+        """
+        for nome in consultas:
+            plano_antes, tempo_antes = antes[nome]
+            plano_depois, tempo_depois = depois[nome]
+            ganho = tempo_antes / tempo_depois if tempo_depois else 0
+            self.stdout.write(self.style.MIGRATE_HEADING(nome))
+            self.stdout.write(f'  antes:  {tempo_antes:9.3f} ms  {plano_antes}')
+            self.stdout.write(f'  depois: {tempo_depois:9.3f} ms  {plano_depois}')
+            self.stdout.write(self.style.SUCCESS(f'  {ganho:.1f}x'))
@@ -0,0 +1,52 @@
+import argparse
+import sys
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from agendamentos import exportacao
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Data inválida: {valor}. Use YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Exporta agendamentos em CSV ou NDJSON, em streaming, para um arquivo ou para a saída padrão'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--formato',
+            choices=list(exportacao.FORMATOS),
+            default='csv',
+            help='Formato da exportação',
+        )
+        parser.add_argument('--data-inicio', type=_data, help='Primeiro dia exportado (YYYY-MM-DD)')
+        parser.add_argument('--data-fim', type=_data, help='Último dia exportado (YYYY-MM-DD)')
+        parser.add_argument('--status', help='Exportar apenas agendamentos com este status')
+        parser.add_argument('--servico-id', type=int, help='Exportar apenas agendamentos deste serviço')
+        parser.add_argument('--gzip', action='store_true', help='Comprimir a saída em gzip')
+        parser.add_argument('--saida', help='Arquivo de destino; sem ele, escreve na saída padrão')
+
+    def handle(self, *args, **options):
+        agendamentos = exportacao.filtrar_agendamentos(
+            options['data_inicio'],
+            options['data_fim'],
+            options['status'],
+            options['servico_id'],
+        )
+        blocos = exportacao.exportar(agendamentos, options['formato'], options['gzip'])
+
+        if not options['saida']:
+            for bloco in blocos:
+                sys.stdout.buffer.write(bloco)
+            sys.stdout.buffer.flush()
+            return
+
+        total = 0
+        with open(options['saida'], 'wb') as arquivo:
+            for bloco in blocos:
+                arquivo.write(bloco)
+                total += len(bloco)
+        self.stderr.write(self.style.SUCCESS(f'{total} bytes gravados em {options["saida"]}'))
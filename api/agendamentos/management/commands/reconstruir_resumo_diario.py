@@ -0,0 +1,23 @@
+import argparse
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from agendamentos import resumo_diario
+
+
+def _data(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d').date()
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'Data inválida: {valor}. Use YYYY-MM-DD')
+
+
+class Command(BaseCommand):
+    help = 'Refaz o resumo diário de agendamentos (AgendamentoDiario) de um período a partir dos agendamentos'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--data-inicio', type=_data, help='Primeiro dia reconstruído (YYYY-MM-DD)')
+        parser.add_argument('--data-fim', type=_data, help='Último dia reconstruído (YYYY-MM-DD)')
+
+    def handle(self, *args, **options):
+        linhas = resumo_diario.reconstruir(options['data_inicio'], options['data_fim'])
+        self.stdout.write(self.style.SUCCESS(f'Resumo diário reconstruído: {linhas} linhas'))
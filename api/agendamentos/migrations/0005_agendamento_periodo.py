@@ -0,0 +1,48 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:25
+
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from datetime import timedelta
+
+from django.db import migrations, models
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
+
+
+def preencher_periodos(apps, schema_editor):
+    """
+    Calcula o período dos agendamentos existentes em ordem cronológica.
+
+    Agendamentos ativos que já se sobrepunham a um anterior (conflitos
+    legados) ficam sem período para que a constraint possa ser criada.
+    """
+    Agendamento = apps.get_model('agendamentos', 'Agendamento')
+    fim_ocupado = None
+    for agendamento in Agendamento.objects.select_related('servico').order_by('data_hora', 'id'):
+        inicio = agendamento.data_hora
+        fim = inicio + timedelta(minutes=agendamento.servico.duracao)
+        if agendamento.status != 'cancelado':
+            if fim_ocupado is not None and inicio < fim_ocupado:
+                continue
+            fim_ocupado = fim
+        agendamento.periodo = DateTimeTZRange(inicio, fim, '[)')
+        agendamento.save(update_fields=['periodo'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0004_remove_disponibilidade_agenda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agendamento',
+            name='periodo',
+            field=django.contrib.postgres.fields.ranges.DateTimeRangeField(blank=True, editable=False, null=True),
+        ),
+        migrations.RunPython(preencher_periodos, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='agendamento',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status', 'cancelado'), _negated=True), expressions=[('periodo', '&&')], name='agendamento_sem_sobreposicao'),
+        ),
+    ]
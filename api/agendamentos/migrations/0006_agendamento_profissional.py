@@ -0,0 +1,38 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:28
+
+from django.conf import settings
+import django.contrib.postgres.constraints
+from django.contrib.postgres.operations import BtreeGistExtension
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('agendamentos', '0005_agendamento_periodo'),
+    ]
+
+    operations = [
+        # Necessária para comparar o profissional (=) dentro da exclusion constraint
+        BtreeGistExtension(),
+        migrations.RemoveConstraint(
+            model_name='agendamento',
+            name='agendamento_sem_sobreposicao',
+        ),
+        migrations.AddField(
+            model_name='agendamento',
+            name='profissional',
+            field=models.ForeignKey(blank=True, limit_choices_to={'tipo': 'profissional'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='agendamentos_profissional', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddIndex(
+            model_name='agendamento',
+            index=models.Index(fields=['profissional', 'data_hora'], name='agendamento_prof_data_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='agendamento',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(condition=models.Q(('status', 'cancelado'), _negated=True), expressions=[(django.db.models.functions.comparison.Coalesce(django.db.models.functions.comparison.Cast('profissional', models.BigIntegerField()), models.Value(0)), '='), ('periodo', '&&')], name='agendamento_sem_sobreposicao'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:33
+
+from django.conf import settings
+import django.contrib.postgres.constraints
+import django.contrib.postgres.fields.ranges
+from django.db import migrations, models
+import django.db.models.deletion
+import django.db.models.functions.comparison
+import uuid
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('servicos', '0002_servico_duracao'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('agendamentos', '0006_agendamento_profissional'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ReservaHorario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('data_hora', models.DateTimeField()),
+                ('periodo', django.contrib.postgres.fields.ranges.DateTimeRangeField(editable=False)),
+                ('expira_em', models.DateTimeField(db_index=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='reservahorario',
+            name='cliente',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_horario', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='reservahorario',
+            name='profissional',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='reservas_profissional', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='reservahorario',
+            name='servico',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='reservas_horario', to='servicos.servico'),
+        ),
+        migrations.AddConstraint(
+            model_name='reservahorario',
+            constraint=django.contrib.postgres.constraints.ExclusionConstraint(expressions=[(django.db.models.functions.comparison.Coalesce(django.db.models.functions.comparison.Cast('profissional', models.BigIntegerField()), models.Value(0)), '='), ('periodo', '&&')], name='reserva_sem_sobreposicao'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:36
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('servicos', '0002_servico_duracao'),
+        ('core', '0006_add_brand_colors'),
+        ('animais', '0003_animal_observacoes_animal_peso'),
+        ('agendamentos', '0007_reservahorario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SerieAgendamento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('inicio', models.DateTimeField()),
+                ('frequencia', models.CharField(choices=[('diaria', 'Diária'), ('semanal', 'Semanal'), ('mensal', 'Mensal')], default='semanal', max_length=10)),
+                ('intervalo', models.PositiveSmallIntegerField(default=1)),
+                ('quantidade', models.PositiveIntegerField(blank=True, null=True)),
+                ('ate', models.DateField(blank=True, null=True)),
+                ('observacoes', models.TextField(blank=True, null=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_agendamento', to='animais.animal')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_agendamento', to=settings.AUTH_USER_MODEL)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_agendamento', to='core.empresa')),
+                ('profissional', models.ForeignKey(blank=True, limit_choices_to={'tipo': 'profissional'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='series_profissional', to=settings.AUTH_USER_MODEL)),
+                ('servico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='series_agendamento', to='servicos.servico')),
+            ],
+        ),
+        migrations.AddField(
+            model_name='agendamento',
+            name='serie',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='agendamentos', to='agendamentos.serieagendamento'),
+        ),
+    ]
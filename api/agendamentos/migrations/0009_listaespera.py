@@ -0,0 +1,42 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:38
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0006_add_brand_colors'),
+        ('servicos', '0002_servico_duracao'),
+        ('animais', '0003_animal_observacoes_animal_peso'),
+        ('agendamentos', '0008_serieagendamento'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ListaEspera',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data_inicio', models.DateField()),
+                ('data_fim', models.DateField()),
+                ('agendar_automaticamente', models.BooleanField(default=True)),
+                ('observacoes', models.TextField(blank=True, null=True)),
+                ('status', models.CharField(choices=[('aguardando', 'Aguardando'), ('oferecido', 'Oferecido'), ('agendado', 'Agendado')], default='aguardando', max_length=20)),
+                ('reserva_token', models.UUIDField(blank=True, editable=False, null=True)),
+                ('oferta_expira_em', models.DateTimeField(blank=True, editable=False, null=True)),
+                ('criado_em', models.DateTimeField(auto_now_add=True)),
+                ('agendamento', models.ForeignKey(blank=True, editable=False, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lista_espera', to='agendamentos.agendamento')),
+                ('animal', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='animais.animal')),
+                ('cliente', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to=settings.AUTH_USER_MODEL)),
+                ('empresa', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='core.empresa')),
+                ('profissional', models.ForeignKey(blank=True, limit_choices_to={'tipo': 'profissional'}, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='lista_espera_profissional', to=settings.AUTH_USER_MODEL)),
+                ('servico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lista_espera', to='servicos.servico')),
+            ],
+            options={
+                'indexes': [models.Index(condition=models.Q(('status__in', ['aguardando', 'oferecido'])), fields=['data_inicio', 'data_fim'], name='lista_espera_janela_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,48 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:39
+
+from django.conf import settings
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('animais', '0003_animal_observacoes_animal_peso'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('agendamentos', '0009_listaespera'),
+    ]
+
+    operations = [
+        # Os índices são criados sem bloquear escritas na tabela de agendamentos
+        AddIndexConcurrently(
+            model_name='agendamento',
+            index=models.Index(fields=['data_hora'], name='agendamento_data_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='agendamento',
+            index=models.Index(fields=['cliente', '-data_hora'], name='agendamento_cliente_data_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='agendamento',
+            index=models.Index(fields=['animal', '-data_hora'], name='agendamento_animal_data_idx'),
+        ),
+        AddIndexConcurrently(
+            model_name='agendamento',
+            index=models.Index(condition=models.Q(('status', 'cancelado'), _negated=True), fields=['data_hora', 'status'], name='agendamento_ativo_data_idx'),
+        ),
+        # Os índices simples das FKs ficam redundantes com os compostos acima
+        migrations.AlterField(
+            model_name='agendamento',
+            name='animal',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos', to='animais.animal'),
+        ),
+        migrations.AlterField(
+            model_name='agendamento',
+            name='cliente',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos_cliente', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
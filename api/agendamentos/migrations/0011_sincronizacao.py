@@ -0,0 +1,25 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:49
+
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # CREATE INDEX CONCURRENTLY não pode rodar dentro de uma transação
+    atomic = False
+
+    dependencies = [
+        ('agendamentos', '0010_indices_consulta'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='agendamento',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        AddIndexConcurrently(
+            model_name='agendamento',
+            index=models.Index(fields=['cliente', 'atualizado_em'], name='agendamento_cliente_sync_idx'),
+        ),
+    ]
@@ -0,0 +1,53 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:54
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def popular_resumo(apps, schema_editor):
+    """
+    Gera o resumo diário dos agendamentos já existentes
+    """
+    Agendamento = apps.get_model('agendamentos', 'Agendamento')
+    AgendamentoDiario = apps.get_model('agendamentos', 'AgendamentoDiario')
+    linhas = Agendamento.objects.annotate(data=TruncDate('data_hora')).values(
+        'empresa_id', 'data', 'servico_id', 'status'
+    ).annotate(quantidade=Count('id'), receita=Sum('servico__preco')).order_by()
+    AgendamentoDiario.objects.bulk_create(
+        (AgendamentoDiario(**linha) for linha in linhas.iterator()),
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_registroexclusao'),
+        ('servicos', '0002_servico_duracao'),
+        ('agendamentos', '0011_sincronizacao'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AgendamentoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('data', models.DateField()),
+                ('status', models.CharField(choices=[('pendente', 'Pendente'), ('confirmado', 'Confirmado'), ('realizado', 'Realizado'), ('cancelado', 'Cancelado')], max_length=20)),
+                ('quantidade', models.IntegerField(default=0)),
+                ('receita', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('empresa', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos_diarios', to='core.empresa')),
+                ('servico', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='agendamentos_diarios', to='servicos.servico')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['data'], name='agendamento_diario_data_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='agendamentodiario',
+            constraint=models.UniqueConstraint(fields=('empresa', 'data', 'servico', 'status'), name='agendamento_diario_chave'),
+        ),
+        migrations.RunPython(popular_resumo, migrations.RunPython.noop),
+    ]
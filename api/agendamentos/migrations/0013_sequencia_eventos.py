@@ -0,0 +1,18 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0012_agendamentodiario'),
+    ]
+
+    operations = [
+        # Numeração global dos eventos do feed SSE, usada como id dos eventos (ver eventos.py)
+        migrations.RunSQL(
+            'CREATE SEQUENCE agendamentos_eventos_seq',
+            'DROP SEQUENCE agendamentos_eventos_seq',
+        ),
+    ]
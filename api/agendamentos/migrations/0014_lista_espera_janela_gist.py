@@ -0,0 +1,23 @@
+# Generated by Django 4.2.11 on 2026-10-18 16:40
+
+import django.contrib.postgres.fields.ranges
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('agendamentos', '0013_sequencia_eventos'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='listaespera',
+            name='lista_espera_janela_idx',
+        ),
+        migrations.AddIndex(
+            model_name='listaespera',
+            index=django.contrib.postgres.indexes.GistIndex(models.Func(models.F('data_inicio'), models.F('data_fim'), models.Value('[]'), function='daterange', output_field=django.contrib.postgres.fields.ranges.DateRangeField()), condition=models.Q(('status__in', ['aguardando', 'oferecido'])), name='lista_espera_janela_idx'),
+        ),
+    ]
@@ -1,8 +1,90 @@
+import calendar
+import uuid
+from datetime import datetime, time, timedelta
 from django.db import models
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Cast, Coalesce
+from django.db.backends.postgresql.psycopg_any import DateTimeTZRange
 from django.conf import settings
+from django.contrib.postgres.constraints import ExclusionConstraint
+from django.contrib.postgres.fields import DateRangeField, DateTimeRangeField, RangeOperators
+from django.contrib.postgres.indexes import GistIndex
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from servicos.models import Servico
 from animais.models import Animal
 
+# Nome da exclusion constraint que impede agendamentos ativos sobrepostos
+CONSTRAINT_SOBREPOSICAO = 'agendamento_sem_sobreposicao'
+
+# Nome da exclusion constraint que impede duas reservas no mesmo horário
+CONSTRAINT_RESERVA = 'reserva_sem_sobreposicao'
+
+def inicio_do_dia(dia):
+  """
+  Retorna a meia-noite (no fuso local) do dia informado
+  """
+  return timezone.make_aware(datetime.combine(dia, time.min))
+
+def entre_datas(inicio, fim):
+  """
+  Condição de data_hora entre as datas inicio e fim, inclusive, para filtros e agregações
+  """
+  return Q(
+    data_hora__gte=inicio_do_dia(inicio),
+    data_hora__lt=inicio_do_dia(fim + timedelta(days=1))
+  )
+
+class DataHoraQuerySet(models.QuerySet):
+  """
+  Filtros por dia sobre data_hora que aproveitam os índices da coluna
+
+  Os limites dos dias são calculados uma vez no fuso local e viram
+  predicados semiabertos (>= início, < fim) sobre a coluna original, em vez
+  de data_hora__date, que converte cada linha e impede o uso do índice.
+  """
+
+  def no_intervalo(self, inicio, fim):
+    """
+    Registros entre as datas inicio e fim, inclusive
+    """
+    return self.filter(entre_datas(inicio, fim))
+
+  def no_dia(self, dia):
+    """
+    Registros de um único dia
+    """
+    return self.no_intervalo(dia, dia)
+
+def agenda_profissional():
+  """
+  Expressão que identifica a agenda nas exclusion constraints: o profissional, ou 0 para a clínica
+  """
+  return Coalesce(Cast('profissional', models.BigIntegerField()), Value(0))
+
+def janela_lista_espera():
+  """
+  Expressão da janela de datas de um pedido da lista de espera: daterange(data_inicio, data_fim, '[]')
+  """
+  return Func(F('data_inicio'), F('data_fim'), Value('[]'), function='daterange', output_field=DateRangeField())
+
+def como_datetime(valor):
+  """
+  Normaliza data_hora para datetime com fuso; algumas views ainda a atribuem como string ISO
+  """
+  if isinstance(valor, str):
+    valor = parse_datetime(valor)
+  if timezone.is_naive(valor):
+    valor = timezone.make_aware(valor)
+  return valor
+
+def calcular_intervalo(inicio, duracao):
+  """
+  Retorna o intervalo [inicio, inicio + duracao minutos) usado nas exclusion constraints
+  """
+  inicio = como_datetime(inicio)
+  return DateTimeTZRange(inicio, inicio + timedelta(minutes=duracao), '[)')
+
 class Agendamento(models.Model):
   STATUS_CHOICES = [
     ('pendente', 'Pendente'),
@@ -12,12 +94,296 @@ class Agendamento(models.Model):
   ]
   
   empresa = models.ForeignKey('core.Empresa', on_delete=models.CASCADE, related_name='agendamentos')
-  animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='agendamentos')
+  # cliente e animal são indexados pelos índices compostos com data_hora (ver Meta)
+  animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='agendamentos', db_index=False)
   servico = models.ForeignKey(Servico, on_delete=models.CASCADE, related_name='agendamentos')
   data_hora = models.DateTimeField()
   observacoes = models.TextField(blank=True, null=True)
-  cliente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='agendamentos_cliente')
+  cliente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='agendamentos_cliente', db_index=False)
   status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pendente')
+  profissional = models.ForeignKey(
+    settings.AUTH_USER_MODEL,
+    on_delete=models.SET_NULL,
+    null=True,
+    blank=True,
+    related_name='agendamentos_profissional',
+    limit_choices_to={'tipo': 'profissional'},
+  )
+  # Intervalo [data_hora, data_hora + duração do serviço), calculado no save()
+  periodo = DateTimeRangeField(blank=True, null=True, editable=False)
+  serie = models.ForeignKey(
+    'SerieAgendamento',
+    on_delete=models.SET_NULL,
+    null=True,
+    blank=True,
+    related_name='agendamentos',
+  )
+  atualizado_em = models.DateTimeField(auto_now=True)
+
+  class Meta:
+    indexes = [
+      models.Index(fields=['profissional', 'data_hora'], name='agendamento_prof_data_idx'),
+      # Listagens ordenadas por data e consultas por intervalo
+      models.Index(fields=['data_hora'], name='agendamento_data_idx'),
+      # Histórico do cliente e do animal, mais recentes primeiro
+      models.Index(fields=['cliente', '-data_hora'], name='agendamento_cliente_data_idx'),
+      models.Index(fields=['animal', '-data_hora'], name='agendamento_animal_data_idx'),
+      # Disponibilidade e contagens só olham agendamentos ativos
+      models.Index(fields=['data_hora', 'status'], name='agendamento_ativo_data_idx', condition=~Q(status='cancelado')),
+      # Sincronização incremental dos agendamentos do cliente
+      models.Index(fields=['cliente', 'atualizado_em'], name='agendamento_cliente_sync_idx'),
+    ]
+    constraints = [
+      # Cada profissional tem sua própria agenda; sem profissional, a agenda é a da clínica
+      ExclusionConstraint(
+        name=CONSTRAINT_SOBREPOSICAO,
+        expressions=[
+          (agenda_profissional(), RangeOperators.EQUAL),
+          ('periodo', RangeOperators.OVERLAPS),
+        ],
+        condition=~Q(status='cancelado'),
+      ),
+    ]
+
+  objects = DataHoraQuerySet.as_manager()
+
+  def __str__(self):
+    return f"Agendamento de {self.animal.nome} para {self.servico.nome} em {self.data_hora}"
+
+  def calcular_periodo(self):
+    """
+    Retorna o intervalo ocupado pelo agendamento de acordo com a duração do serviço
+    """
+    return calcular_intervalo(self.data_hora, self.servico.duracao)
+
+  def save(self, *args, **kwargs):
+    self.periodo = self.calcular_periodo()
+    update_fields = kwargs.get('update_fields')
+    if update_fields is not None:
+      # Gravações parciais também precisam marcar a alteração para a sincronização
+      update_fields = set(update_fields) | {'atualizado_em'}
+      if {'data_hora', 'servico'} & update_fields:
+        update_fields.add('periodo')
+      kwargs['update_fields'] = update_fields
+    super().save(*args, **kwargs)
+
+
+class SerieAgendamento(models.Model):
+  """
+  Série de agendamentos recorrentes (ex.: fisioterapia semanal, vacina mensal)
+
+  As ocorrências não são gravadas na criação da série: são geradas sob
+  demanda para a janela consultada e materializadas em lote (ver series.py).
+  A série termina após `quantidade` ocorrências ou na data `ate`, o que vier
+  primeiro; sem nenhum dos dois ela não tem fim.
+  """
+  FREQUENCIA_CHOICES = [
+    ('diaria', 'Diária'),
+    ('semanal', 'Semanal'),
+    ('mensal', 'Mensal'),
+  ]
+
+  empresa = models.ForeignKey('core.Empresa', on_delete=models.CASCADE, related_name='series_agendamento')
+  cliente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='series_agendamento')
+  animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='series_agendamento')
+  servico = models.ForeignKey(Servico, on_delete=models.CASCADE, related_name='series_agendamento')
+  profissional = models.ForeignKey(
+    settings.AUTH_USER_MODEL,
+    on_delete=models.SET_NULL,
+    null=True,
+    blank=True,
+    related_name='series_profissional',
+    limit_choices_to={'tipo': 'profissional'},
+  )
+  inicio = models.DateTimeField()  # Primeira ocorrência
+  frequencia = models.CharField(max_length=10, choices=FREQUENCIA_CHOICES, default='semanal')
+  intervalo = models.PositiveSmallIntegerField(default=1)
+  quantidade = models.PositiveIntegerField(null=True, blank=True)
+  ate = models.DateField(null=True, blank=True)
+  observacoes = models.TextField(blank=True, null=True)
+  criado_em = models.DateTimeField(auto_now_add=True)
+
+  def __str__(self):
+    return f"Série {self.get_frequencia_display().lower()} de {self.animal.nome} para {self.servico.nome}"
+
+  def ocorrencia(self, n):
+    """
+    Retorna a n-ésima ocorrência da série (0 = início), mantendo o horário local
+    """
+    inicio = timezone.localtime(self.inicio).replace(tzinfo=None)
+    if self.frequencia == 'mensal':
+      meses = inicio.month - 1 + n * self.intervalo
+      ano, mes = inicio.year + meses // 12, meses % 12 + 1
+      # Dias 29 a 31 caem no último dia dos meses mais curtos
+      dia = min(inicio.day, calendar.monthrange(ano, mes)[1])
+      local = inicio.replace(year=ano, month=mes, day=dia)
+    else:
+      dias = 7 if self.frequencia == 'semanal' else 1
+      local = inicio + timedelta(days=n * self.intervalo * dias)
+    return timezone.make_aware(local)
+
+  def _primeiro_indice(self, inicio):
+    """
+    Estima o índice da primeira ocorrência a partir de `inicio` sem percorrer as anteriores
+    """
+    if inicio is None or inicio <= self.inicio:
+      return 0
+    if self.frequencia == 'mensal':
+      meses = (inicio.year - self.inicio.year) * 12 + inicio.month - self.inicio.month
+      return max(meses // self.intervalo - 1, 0)
+    dias = 7 if self.frequencia == 'semanal' else 1
+    return max((inicio - self.inicio) // timedelta(days=self.intervalo * dias) - 1, 0)
+
+  def ocorrencias(self, inicio=None, fim=None):
+    """
+    Gera sob demanda as ocorrências da série no intervalo [inicio, fim)
+    """
+    n = self._primeiro_indice(inicio)
+    while self.quantidade is None or n < self.quantidade:
+      data_hora = self.ocorrencia(n)
+      if self.ate and timezone.localtime(data_hora).date() > self.ate:
+        return
+      if fim is not None and data_hora >= fim:
+        return
+      if inicio is None or data_hora >= inicio:
+        yield data_hora
+      n += 1
+
+
+class ReservaHorario(models.Model):
+  """
+  Reserva temporária de um horário enquanto o cliente conclui o agendamento
+
+  Reservas vencidas são ignoradas nas consultas e removidas sob demanda,
+  na criação da próxima reserva.
+  """
+  token = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+  cliente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='reservas_horario')
+  servico = models.ForeignKey(Servico, on_delete=models.CASCADE, related_name='reservas_horario')
+  profissional = models.ForeignKey(
+    settings.AUTH_USER_MODEL,
+    on_delete=models.CASCADE,
+    null=True,
+    blank=True,
+    related_name='reservas_profissional',
+  )
+  data_hora = models.DateTimeField()
+  periodo = DateTimeRangeField(editable=False)
+  expira_em = models.DateTimeField(db_index=True)
+  criado_em = models.DateTimeField(auto_now_add=True)
+
+  objects = DataHoraQuerySet.as_manager()
+
+  class Meta:
+    constraints = [
+      # Mesma regra de agenda por profissional usada nos agendamentos
+      ExclusionConstraint(
+        name=CONSTRAINT_RESERVA,
+        expressions=[
+          (agenda_profissional(), RangeOperators.EQUAL),
+          ('periodo', RangeOperators.OVERLAPS),
+        ],
+      ),
+    ]
+
+  def __str__(self):
+    return f"Reserva de {self.cliente} em {self.data_hora} até {self.expira_em}"
+
+  @property
+  def expirada(self):
+    return self.expira_em <= timezone.now()
+
+  def save(self, *args, **kwargs):
+    self.periodo = calcular_intervalo(self.data_hora, self.servico.duracao)
+    super().save(*args, **kwargs)
+
+
+class ListaEspera(models.Model):
+  """
+  Pedido de encaixe de um cliente para um serviço dentro de uma janela de datas
+
+  Quando um agendamento é cancelado, o primeiro pedido compatível com o
+  horário liberado é agendado automaticamente ou recebe uma reserva
+  temporária do horário (ver lista_espera.py).
+  """
+  STATUS_CHOICES = [
+    ('aguardando', 'Aguardando'),
+    ('oferecido', 'Oferecido'),
+    ('agendado', 'Agendado'),
+  ]
+
+  empresa = models.ForeignKey('core.Empresa', on_delete=models.CASCADE, related_name='lista_espera')
+  cliente = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='lista_espera')
+  animal = models.ForeignKey(Animal, on_delete=models.CASCADE, related_name='lista_espera')
+  servico = models.ForeignKey(Servico, on_delete=models.CASCADE, related_name='lista_espera')
+  profissional = models.ForeignKey(
+    settings.AUTH_USER_MODEL,
+    on_delete=models.SET_NULL,
+    null=True,
+    blank=True,
+    related_name='lista_espera_profissional',
+    limit_choices_to={'tipo': 'profissional'},
+  )
+  data_inicio = models.DateField()
+  data_fim = models.DateField()
+  agendar_automaticamente = models.BooleanField(default=True)
+  observacoes = models.TextField(blank=True, null=True)
+  status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='aguardando')
+  # Reserva oferecida ao cliente quando o encaixe não é automático
+  reserva_token = models.UUIDField(null=True, blank=True, editable=False)
+  oferta_expira_em = models.DateTimeField(null=True, blank=True, editable=False)
+  agendamento = models.ForeignKey(
+    Agendamento,
+    on_delete=models.SET_NULL,
+    null=True,
+    blank=True,
+    editable=False,
+    related_name='lista_espera',
+  )
+  criado_em = models.DateTimeField(auto_now_add=True)
+
+  class Meta:
+    indexes = [
+      # Busca dos pedidos cuja janela contém o dia liberado (apenas pedidos em aberto).
+      # Uma btree em (data_inicio, data_fim) só aproveita um dos limites de
+      # data_inicio <= dia AND data_fim >= dia; o GiST do daterange atende o @> inteiro.
+      GistIndex(
+        janela_lista_espera(),
+        name='lista_espera_janela_idx',
+        condition=Q(status__in=['aguardando', 'oferecido']),
+      ),
+    ]
+
+  def __str__(self):
+    return f"{self.animal.nome} aguardando {self.servico.nome} entre {self.data_inicio} e {self.data_fim}"
+
+
+class AgendamentoDiario(models.Model):
+  """
+  Resumo diário dos agendamentos por empresa, dia, serviço e status
+
+  Mantido incrementalmente na mesma transação das gravações de
+  agendamentos (ver resumo_diario.py), para que dashboards e relatórios
+  leiam uma linha por dia em vez de agregar todos os agendamentos. A
+  receita é a quantidade pelo preço atual do serviço.
+  """
+  # empresa é indexada pela chave única (ver Meta)
+  empresa = models.ForeignKey('core.Empresa', on_delete=models.CASCADE, related_name='agendamentos_diarios', db_index=False)
+  data = models.DateField()
+  servico = models.ForeignKey(Servico, on_delete=models.CASCADE, related_name='agendamentos_diarios')
+  status = models.CharField(max_length=20, choices=Agendamento.STATUS_CHOICES)
+  quantidade = models.IntegerField(default=0)
+  receita = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+
+  class Meta:
+    constraints = [
+      # Chave do resumo, usada pelo INSERT ... ON CONFLICT das atualizações incrementais
+      models.UniqueConstraint(fields=['empresa', 'data', 'servico', 'status'], name='agendamento_diario_chave'),
+    ]
+    indexes = [
+      # Dashboards e relatórios filtram por período
+      models.Index(fields=['data'], name='agendamento_diario_data_idx'),
+    ]
 
   def __str__(self):
-    return f"Agendamento de {self.animal.nome} para {self.servico.nome} em {self.data_hora}"
\ No newline at end of file
+    return f"{self.data} - {self.servico.nome} ({self.status}): {self.quantidade}"
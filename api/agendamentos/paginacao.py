@@ -0,0 +1,83 @@
+"""
+Paginação por cursor (keyset) das listagens de agendamentos
+
+As listagens são ordenadas por (data_hora, id) decrescentes e cada página
+começa logo após o último item da anterior, identificado por um cursor
+opaco. Diferente de OFFSET, o custo de buscar uma página não cresce com a
+profundidade: o limite data_hora <= cursor vira condição dos índices de
+data_hora e o banco lê apenas os itens da página.
+
+A paginação é opcional: só é aplicada quando a requisição traz `cursor`
+(vazio na primeira página) ou `limite`.
+"""
+import base64
+import json
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+# Itens por página quando `limite` não é informado
+TAMANHO_PADRAO = 20
+
+# Maior página aceita
+TAMANHO_MAXIMO = 100
+
+
+class CursorInvalido(ValueError):
+    """
+    O cursor ou o limite recebido não é válido
+    """
+
+
+def paginacao_solicitada(request):
+    """
+    Verifica se o cliente optou pela paginação por cursor
+    """
+    return 'cursor' in request.GET or 'limite' in request.GET
+
+
+def codificar_cursor(agendamento):
+    """
+    Gera o cursor opaco que aponta para logo após o agendamento
+    """
+    chave = json.dumps([agendamento.data_hora.isoformat(), agendamento.id])
+    return base64.urlsafe_b64encode(chave.encode()).decode().rstrip('=')
+
+
+def decodificar_cursor(token):
+    """
+    Retorna (data_hora, id) do cursor, levantando CursorInvalido se ele foi adulterado
+    """
+    try:
+        chave = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4))
+        data_hora, agendamento_id = json.loads(chave)
+        data_hora = parse_datetime(data_hora)
+    except (ValueError, TypeError):
+        raise CursorInvalido('Cursor inválido')
+    if data_hora is None or not isinstance(agendamento_id, int):
+        raise CursorInvalido('Cursor inválido')
+    return data_hora, agendamento_id
+
+
+def paginar(queryset, request):
+    """
+    Retorna (página, próximo cursor) da listagem; o próximo cursor é None na última página
+    """
+    try:
+        limite = int(request.GET.get('limite', TAMANHO_PADRAO))
+    except ValueError:
+        raise CursorInvalido('Limite inválido')
+    if not 1 <= limite <= TAMANHO_MAXIMO:
+        raise CursorInvalido(f'Limite deve estar entre 1 e {TAMANHO_MAXIMO}')
+
+    queryset = queryset.order_by('-data_hora', '-id')
+    token = request.GET.get('cursor')
+    if token:
+        data_hora, agendamento_id = decodificar_cursor(token)
+        # O limite em data_hora usa o índice; o desempate por id só filtra o mesmo instante
+        queryset = queryset.filter(data_hora__lte=data_hora).filter(
+            Q(data_hora__lt=data_hora) | Q(id__lt=agendamento_id)
+        )
+
+    pagina = list(queryset[:limite + 1])
+    proximo = codificar_cursor(pagina[limite - 1]) if len(pagina) > limite else None
+    return pagina[:limite], proximo
@@ -0,0 +1,220 @@
+"""
+Relatórios administrativos de agendamentos e financeiro
+
+Os relatórios são calculados sobre o resumo diário (AgendamentoDiario),
+não sobre os agendamentos: cada período é uma única agregação com
+GROUP BY pela chave escolhida (dia, semana, mês, serviço ou status),
+cujo custo depende do número de dias e serviços do período, e não da
+quantidade de agendamentos. Um relatório anual com comparação são duas
+consultas.
+
+Os totais são a soma dos grupos, que particionam o período, e os
+períodos sem movimento aparecem com zero para que a série temporal
+tenha todos os pontos.
+"""
+from datetime import date, timedelta
+from django.db.models import DateField, F, Q, Sum
+from django.db.models.functions import Trunc
+from .models import Agendamento, AgendamentoDiario
+
+# Maior intervalo, em dias, aceito em um relatório
+LIMITE_DIAS = 731
+
+AGRUPAMENTOS = ('dia', 'semana', 'mes', 'servico', 'status')
+
+COMPARACOES = ('periodo_anterior', 'ano_anterior')
+
+STATUS = [valor for valor, _ in Agendamento.STATUS_CHOICES]
+
+NAO_CANCELADO = ~Q(status='cancelado')
+
+# Colunas de cada relatório e a agregação correspondente sobre o resumo diário
+RELATORIOS = {
+    'agendamentos': {
+        'total': Sum('quantidade'),
+        **{status: Sum('quantidade', filter=Q(status=status)) for status in STATUS},
+    },
+    'financeiro': {
+        'agendamentos': Sum('quantidade', filter=NAO_CANCELADO),
+        'receita_prevista': Sum('receita', filter=NAO_CANCELADO),
+        'receita_realizada': Sum('receita', filter=Q(status='realizado')),
+        'receita_cancelada': Sum('receita', filter=Q(status='cancelado')),
+    },
+}
+
+
+class ParametroInvalido(ValueError):
+    """
+    Parâmetro do relatório fora dos valores aceitos
+    """
+
+
+def validar(data_inicio, data_fim, agrupar_por, comparar):
+    """
+    Valida os parâmetros do relatório, levantando ParametroInvalido
+    """
+    if data_fim < data_inicio:
+        raise ParametroInvalido('data_fim deve ser posterior a data_inicio')
+    if (data_fim - data_inicio).days >= LIMITE_DIAS:
+        raise ParametroInvalido(f'O período do relatório deve ter no máximo {LIMITE_DIAS} dias')
+    if agrupar_por not in AGRUPAMENTOS:
+        raise ParametroInvalido(f"agrupar_por deve ser um de: {', '.join(AGRUPAMENTOS)}")
+    if comparar and comparar not in COMPARACOES:
+        raise ParametroInvalido(f"comparar deve ser um de: {', '.join(COMPARACOES)}")
+
+
+def _ano_anterior(data):
+    try:
+        return data.replace(year=data.year - 1)
+    except ValueError:
+        # 29 de fevereiro
+        return data.replace(year=data.year - 1, day=28)
+
+
+def periodo_comparacao(data_inicio, data_fim, comparar):
+    """
+    Retorna (inicio, fim) do período comparado: o imediatamente anterior, de mesma duração, ou o do ano anterior
+    """
+    if comparar == 'ano_anterior':
+        return _ano_anterior(data_inicio), _ano_anterior(data_fim)
+    dias = (data_fim - data_inicio).days + 1
+    return data_inicio - timedelta(days=dias), data_inicio - timedelta(days=1)
+
+
+def _inicio_grupo(data, agrupar_por):
+    if agrupar_por == 'semana':
+        return data - timedelta(days=data.weekday())
+    if agrupar_por == 'mes':
+        return data.replace(day=1)
+    return data
+
+
+def _proximo_grupo(data, agrupar_por):
+    if agrupar_por == 'semana':
+        return data + timedelta(days=7)
+    if agrupar_por == 'mes':
+        return (data + timedelta(days=32)).replace(day=1)
+    return data + timedelta(days=1)
+
+
+def _chaves_periodo(inicio, fim, agrupar_por):
+    """
+    Retorna o início de cada dia, semana ou mês entre as datas
+    """
+    chave = _inicio_grupo(inicio, agrupar_por)
+    while chave <= fim:
+        yield chave
+        chave = _proximo_grupo(chave, agrupar_por)
+
+
+def _derivar(relatorio, valores):
+    """
+    Acrescenta as colunas calculadas a partir das agregadas
+    """
+    if relatorio == 'financeiro':
+        agendamentos = valores['agendamentos']
+        valores['ticket_medio'] = round(valores['receita_prevista'] / agendamentos, 2) if agendamentos else 0
+    return valores
+
+
+def _zeros(relatorio):
+    return {coluna: 0 for coluna in RELATORIOS[relatorio]}
+
+
+def _agregar(relatorio, inicio, fim, agrupar_por, filtros):
+    """
+    Retorna os grupos do relatório no período, em uma única consulta ao resumo diário
+    """
+    resumo = AgendamentoDiario.objects.filter(data__range=(inicio, fim), **filtros)
+    campos = ['chave']
+    if agrupar_por == 'dia':
+        resumo = resumo.annotate(chave=F('data'))
+    elif agrupar_por in ('semana', 'mes'):
+        kind = 'week' if agrupar_por == 'semana' else 'month'
+        resumo = resumo.annotate(chave=Trunc('data', kind, output_field=DateField()))
+    elif agrupar_por == 'servico':
+        resumo = resumo.annotate(chave=F('servico_id'), rotulo=F('servico__nome'))
+        campos.append('rotulo')
+    else:
+        resumo = resumo.annotate(chave=F('status'))
+
+    linhas = resumo.values(*campos).annotate(**RELATORIOS[relatorio]).order_by('chave')
+
+    grupos = {}
+    for linha in linhas:
+        grupo = {'chave': linha.pop('chave')}
+        if 'rotulo' in linha:
+            grupo['rotulo'] = linha.pop('rotulo')
+        grupo.update({coluna: valor or 0 for coluna, valor in linha.items()})
+        grupos[grupo['chave']] = grupo
+
+    # Completar com zero os grupos sem movimento
+    if agrupar_por in ('dia', 'semana', 'mes'):
+        chaves = list(_chaves_periodo(inicio, fim, agrupar_por))
+    elif agrupar_por == 'status':
+        chaves = STATUS
+    else:
+        chaves = list(grupos)
+    return [grupos.get(chave) or {'chave': chave, **_zeros(relatorio)} for chave in chaves]
+
+
+def _totalizar(relatorio, grupos):
+    totais = _zeros(relatorio)
+    for grupo in grupos:
+        for coluna in totais:
+            totais[coluna] += grupo[coluna]
+    return _derivar(relatorio, totais)
+
+
+def _variacao(atual, anterior):
+    """
+    Variação percentual de cada coluna em relação ao período comparado (None quando ele é zero)
+    """
+    return {
+        coluna: round(float((valor - anterior[coluna]) / anterior[coluna] * 100), 1) if anterior[coluna] else None
+        for coluna, valor in atual.items()
+    }
+
+
+def _formatar(valores):
+    return {
+        chave: float(valor) if not isinstance(valor, (int, str, date)) else valor
+        for chave, valor in valores.items()
+    }
+
+
+def gerar(relatorio, data_inicio, data_fim, agrupar_por='dia', comparar=None, servico_id=None, status=None):
+    """
+    Gera o relatório do período, agrupado e, opcionalmente, comparado com outro período
+    """
+    validar(data_inicio, data_fim, agrupar_por, comparar)
+
+    filtros = {}
+    if servico_id:
+        filtros['servico_id'] = servico_id
+    if status:
+        filtros['status'] = status
+
+    grupos = _agregar(relatorio, data_inicio, data_fim, agrupar_por, filtros)
+    totais = _totalizar(relatorio, grupos)
+    resultado = {
+        'data_inicio': data_inicio,
+        'data_fim': data_fim,
+        'agrupar_por': agrupar_por,
+        'totais': _formatar(totais),
+        'grupos': [_formatar(_derivar(relatorio, grupo)) for grupo in grupos],
+    }
+
+    if comparar:
+        inicio_anterior, fim_anterior = periodo_comparacao(data_inicio, data_fim, comparar)
+        grupos_anteriores = _agregar(relatorio, inicio_anterior, fim_anterior, agrupar_por, filtros)
+        totais_anteriores = _totalizar(relatorio, grupos_anteriores)
+        resultado['comparacao'] = {
+            'tipo': comparar,
+            'data_inicio': inicio_anterior,
+            'data_fim': fim_anterior,
+            'totais': _formatar(totais_anteriores),
+            'grupos': [_formatar(_derivar(relatorio, grupo)) for grupo in grupos_anteriores],
+            'variacao': _variacao(totais, totais_anteriores),
+        }
+    return resultado
@@ -0,0 +1,118 @@
+"""
+Reservas temporárias de horários durante a conclusão do agendamento
+
+Ao escolher um horário o cliente recebe uma reserva válida por
+RESERVA_HORARIO_TTL segundos. Enquanto válida, a reserva fecha o horário
+para os demais clientes e é consumida na mesma transação que cria o
+agendamento. Reservas vencidas não são apagadas por nenhum processo em
+segundo plano: as consultas as ignoram e elas são removidas sob demanda.
+"""
+import uuid
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+from . import disponibilidade
+from .models import ReservaHorario, CONSTRAINT_RESERVA
+
+# Validade padrão de uma reserva, em segundos
+RESERVA_TTL_PADRAO = 300
+
+
+class ReservaInvalida(Exception):
+    """
+    A reserva não existe, pertence a outro cliente ou já expirou
+    """
+
+
+def tempo_reserva():
+    """
+    Retorna a validade configurada para as reservas
+    """
+    return timedelta(seconds=getattr(settings, 'RESERVA_HORARIO_TTL', RESERVA_TTL_PADRAO))
+
+
+def limpar_reservas_expiradas():
+    """
+    Remove as reservas vencidas e retorna quantas foram apagadas
+    """
+    apagadas, _ = ReservaHorario.objects.filter(expira_em__lte=timezone.now()).delete()
+    return apagadas
+
+
+def criar_reserva(cliente, servico, data_hora, profissional_id=None):
+    """
+    Reserva o horário para o cliente, atribuindo o profissional como em um agendamento
+
+    Uma reserva anterior do mesmo cliente é substituída. Levanta
+    HorarioIndisponivel se o horário estiver ocupado ou reservado por outro cliente.
+    """
+    try:
+        with transaction.atomic():
+            limpar_reservas_expiradas()
+            ReservaHorario.objects.filter(cliente=cliente).delete()
+
+            profissional_id = disponibilidade.escolher_profissional(
+                data_hora, servico.duracao, profissional_id, cliente.id
+            )
+            return ReservaHorario.objects.create(
+                cliente=cliente,
+                servico=servico,
+                profissional_id=profissional_id,
+                data_hora=data_hora,
+                expira_em=timezone.now() + tempo_reserva()
+            )
+    except IntegrityError as e:
+        # Outro cliente reservou o mesmo horário ao mesmo tempo
+        if CONSTRAINT_RESERVA in str(e):
+            raise disponibilidade.HorarioIndisponivel()
+        raise
+
+
+def consumir_reserva(token, cliente):
+    """
+    Bloqueia e remove a reserva válida do cliente, retornando-a
+
+    Deve ser chamada dentro da transação que cria o agendamento, para que a
+    reserva só desapareça se o agendamento for gravado.
+    """
+    try:
+        token = uuid.UUID(str(token))
+    except ValueError:
+        raise ReservaInvalida()
+
+    reserva = ReservaHorario.objects.select_for_update().select_related('servico').filter(
+        token=token,
+        cliente=cliente,
+        expira_em__gt=timezone.now()
+    ).first()
+    if reserva is None:
+        raise ReservaInvalida()
+    reserva.delete()
+    return reserva
+
+
+def liberar_reservas_do_agendamento(cliente, agendamento):
+    """
+    Remove as reservas do cliente sobrepostas a um agendamento criado sem o token, retornando os tokens removidos
+
+    Sem isso a reserva do próprio cliente continuaria fechando o horário
+    para os demais até vencer.
+    """
+    reservas = ReservaHorario.objects.filter(cliente=cliente, periodo__overlap=agendamento.periodo)
+    tokens = list(reservas.values_list('token', flat=True))
+    if tokens:
+        reservas.delete()
+    return tokens
+
+
+def liberar_reserva(token, cliente):
+    """
+    Remove a reserva do cliente antes do vencimento e retorna se ela existia
+    """
+    try:
+        token = uuid.UUID(str(token))
+    except ValueError:
+        return False
+    apagadas, _ = ReservaHorario.objects.filter(token=token, cliente=cliente).delete()
+    return apagadas > 0
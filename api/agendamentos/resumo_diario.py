@@ -0,0 +1,148 @@
+"""
+Manutenção incremental do resumo diário de agendamentos (AgendamentoDiario)
+
+Cada gravação de agendamento vira deltas de quantidade nas chaves
+(empresa, dia, serviço, status) afetadas: +1 na chave nova e -1 na
+anterior. Os deltas são aplicados com um único INSERT ... ON CONFLICT DO
+UPDATE, na mesma transação da gravação, e a receita é calculada no
+próprio SQL a partir do preço do serviço. Quando o preço de um serviço
+muda, a receita das linhas dele é recalculada (ver signals.py). As
+alterações feitas fora dos signals de Agendamento também invalidam as
+métricas em cache que leem o resumo.
+
+reconstruir() refaz o resumo de um período a partir dos agendamentos,
+para corrigir divergências ou preencher dados importados em massa.
+"""
+from collections import Counter
+from datetime import timedelta
+from django.db import connection, transaction
+from django.db.models import Count, F, QuerySet, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from core import metricas
+from core.models import Empresa
+from servicos.models import Servico
+from .models import Agendamento, AgendamentoDiario, como_datetime, inicio_do_dia
+
+
+def chave(agendamento):
+    """
+    Retorna a chave (empresa, dia local, serviço, status) do agendamento
+    """
+    return (
+        agendamento.empresa_id,
+        timezone.localtime(como_datetime(agendamento.data_hora)).date(),
+        agendamento.servico_id,
+        agendamento.status,
+    )
+
+
+def chave_anterior(estado):
+    """
+    Retorna a chave do estado anterior guardado no pre_save do agendamento
+    """
+    return (
+        estado['empresa_id'],
+        timezone.localtime(estado['data_hora']).date(),
+        estado['servico_id'],
+        estado['status'],
+    )
+
+
+def aplicar(deltas):
+    """
+    Soma os deltas {chave: quantidade} às linhas do resumo em uma única instrução
+    """
+    deltas = {chave: delta for chave, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    tabela = AgendamentoDiario._meta.db_table
+    valores = ', '.join(['(%s::bigint, %s::date, %s::bigint, %s::varchar, %s::integer)'] * len(deltas))
+    parametros = []
+    for (empresa_id, data, servico_id, status), delta in deltas.items():
+        parametros.extend([empresa_id, data, servico_id, status, delta])
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'''
+            INSERT INTO {tabela} AS resumo (empresa_id, data, servico_id, status, quantidade, receita)
+            SELECT v.empresa_id, v.data, v.servico_id, v.status, v.delta, v.delta * s.preco
+            FROM (VALUES {valores}) AS v (empresa_id, data, servico_id, status, delta)
+            JOIN {Servico._meta.db_table} s ON s.id = v.servico_id
+            ON CONFLICT (empresa_id, data, servico_id, status) DO UPDATE
+            SET quantidade = resumo.quantidade + EXCLUDED.quantidade,
+                receita = resumo.receita + EXCLUDED.receita
+            ''',
+            parametros
+        )
+
+
+def registrar_gravacao(agendamento, estado_anterior=None):
+    """
+    Atualiza o resumo com a criação ou alteração de um agendamento
+    """
+    deltas = Counter({chave(agendamento): 1})
+    if estado_anterior is not None:
+        deltas[chave_anterior(estado_anterior)] -= 1
+    aplicar(deltas)
+
+
+def registrar_criados(agendamentos):
+    """
+    Atualiza o resumo com agendamentos criados em lote (bulk_create não dispara signals)
+    """
+    aplicar(Counter(chave(agendamento) for agendamento in agendamentos))
+    metricas.invalidar('agendamentos')
+
+
+def registrar_exclusao(agendamento, origem=None):
+    """
+    Atualiza o resumo com a exclusão de um agendamento
+    """
+    # Excluindo o serviço ou a empresa, as linhas do resumo são removidas em cascata
+    modelo = origem.model if isinstance(origem, QuerySet) else type(origem)
+    if issubclass(modelo, (Servico, Empresa)):
+        return
+    aplicar({chave(agendamento): -1})
+
+
+def atualizar_receita(servico):
+    """
+    Recalcula a receita das linhas do serviço com o preço atual
+    """
+    AgendamentoDiario.objects.filter(servico=servico).update(receita=F('quantidade') * servico.preco)
+    metricas.invalidar('agendamentos')
+
+
+def reconstruir(inicio=None, fim=None):
+    """
+    Refaz o resumo entre as datas inicio e fim (inclusive; sem datas, todo o histórico)
+
+    Retorna a quantidade de linhas geradas. As gravações de agendamentos
+    ficam bloqueadas até o fim da reconstrução, para que nenhuma delta se
+    perca entre a remoção e a recontagem.
+    """
+    with transaction.atomic():
+        with connection.cursor() as cursor:
+            cursor.execute(f'LOCK TABLE {Agendamento._meta.db_table} IN SHARE MODE')
+
+        agendamentos = Agendamento.objects.all()
+        resumo = AgendamentoDiario.objects.all()
+        if inicio is not None:
+            agendamentos = agendamentos.filter(data_hora__gte=inicio_do_dia(inicio))
+            resumo = resumo.filter(data__gte=inicio)
+        if fim is not None:
+            agendamentos = agendamentos.filter(data_hora__lt=inicio_do_dia(fim + timedelta(days=1)))
+            resumo = resumo.filter(data__lte=fim)
+        resumo.delete()
+
+        linhas = agendamentos.annotate(data=TruncDate('data_hora')).values(
+            'empresa_id', 'data', 'servico_id', 'status'
+        ).annotate(quantidade=Count('id'), receita=Sum('servico__preco')).order_by()
+        criadas = AgendamentoDiario.objects.bulk_create(
+            (AgendamentoDiario(**linha) for linha in linhas.iterator()),
+            batch_size=1000
+        )
+        metricas.invalidar('agendamentos')
+        return len(criadas)
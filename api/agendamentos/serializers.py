@@ -1,5 +1,6 @@
 from rest_framework import serializers
-from .models import Agendamento
+from django.utils import timezone
+from .models import Agendamento, ListaEspera, SerieAgendamento
 
 class AgendamentoSerializer(serializers.ModelSerializer):
     # Campos relacionados para o formato padronizado
@@ -8,12 +9,14 @@ class AgendamentoSerializer(serializers.ModelSerializer):
     pet_nome = serializers.CharField(source='animal.nome', read_only=True)
     pet_especie = serializers.CharField(source='animal.especie', read_only=True)
     cliente_nome = serializers.CharField(source='cliente.nome', read_only=True)
+    profissional_nome = serializers.CharField(source='profissional.nome', read_only=True, default=None)
     
     class Meta:
         model = Agendamento
         fields = [
             'id', 'empresa', 'animal', 'servico', 'data_hora', 'observacoes', 'cliente', 'status',
-            'servico_nome', 'servico_preco', 'pet_nome', 'pet_especie', 'cliente_nome'
+            'profissional', 'servico_nome', 'servico_preco', 'pet_nome', 'pet_especie', 'cliente_nome',
+            'profissional_nome'
         ]
         read_only_fields = ['id']
     
@@ -32,6 +35,63 @@ class AgendamentoSerializer(serializers.ModelSerializer):
             'pet_nome': data['pet_nome'],
             'pet_especie': data['pet_especie'],
             'cliente': data['cliente_nome'],
+            'profissional_id': data['profissional'],
+            'profissional': data.get('profissional_nome') or '',
             'observacoes': data['observacoes'] or '',
             'status': data['status']
-        } 
\ No newline at end of file
+        }
+
+
+class SerieAgendamentoSerializer(serializers.ModelSerializer):
+    servico_nome = serializers.CharField(source='servico.nome', read_only=True)
+    pet_nome = serializers.CharField(source='animal.nome', read_only=True)
+    profissional_nome = serializers.CharField(source='profissional.nome', read_only=True, default=None)
+    
+    class Meta:
+        model = SerieAgendamento
+        fields = [
+            'id', 'empresa', 'cliente', 'animal', 'servico', 'profissional', 'inicio', 'frequencia',
+            'intervalo', 'quantidade', 'ate', 'observacoes', 'criado_em', 'servico_nome', 'pet_nome',
+            'profissional_nome'
+        ]
+        read_only_fields = ['id', 'criado_em']
+    
+    def validate(self, attrs):
+        """
+        Valida os limites da recorrência
+        """
+        if attrs.get('intervalo', 1) < 1:
+            raise serializers.ValidationError({'intervalo': 'O intervalo deve ser de pelo menos 1'})
+        if 'quantidade' in attrs and attrs['quantidade'] is not None and attrs['quantidade'] < 1:
+            raise serializers.ValidationError({'quantidade': 'A quantidade deve ser de pelo menos 1'})
+        if attrs['inicio'] <= timezone.now():
+            raise serializers.ValidationError({'inicio': 'A série deve começar no futuro'})
+        if attrs.get('ate') and attrs['ate'] < timezone.localtime(attrs['inicio']).date():
+            raise serializers.ValidationError({'ate': 'A data final deve ser posterior ao início'})
+        return attrs
+
+
+class ListaEsperaSerializer(serializers.ModelSerializer):
+    servico_nome = serializers.CharField(source='servico.nome', read_only=True)
+    pet_nome = serializers.CharField(source='animal.nome', read_only=True)
+    data_hora = serializers.DateTimeField(source='agendamento.data_hora', read_only=True, default=None)
+    
+    class Meta:
+        model = ListaEspera
+        fields = [
+            'id', 'empresa', 'cliente', 'animal', 'servico', 'profissional', 'data_inicio', 'data_fim',
+            'agendar_automaticamente', 'observacoes', 'status', 'reserva_token', 'oferta_expira_em',
+            'agendamento', 'data_hora', 'criado_em', 'servico_nome', 'pet_nome'
+        ]
+        read_only_fields = ['id', 'status', 'reserva_token', 'oferta_expira_em', 'agendamento', 'criado_em']
+    
+    def validate(self, attrs):
+        """
+        Valida a janela de datas do pedido
+        """
+        if attrs['data_fim'] < attrs['data_inicio']:
+            raise serializers.ValidationError({'data_fim': 'Data de fim deve ser maior ou igual à data de início'})
+        if attrs['data_fim'] < timezone.localdate():
+            raise serializers.ValidationError({'data_fim': 'A janela deve incluir datas futuras'})
+        return attrs
+
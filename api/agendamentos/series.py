@@ -0,0 +1,119 @@
+"""
+Materialização de séries de agendamentos recorrentes
+
+As próximas ocorrências de uma série são verificadas de uma só vez contra
+a agenda do profissional (uma consulta por intervalo, via
+disponibilidade.montar_mapas_periodo) e gravadas com um único bulk_create
+na mesma transação. A exclusion constraint continua sendo a garantia final
+contra agendamentos concorrentes.
+"""
+from itertools import islice
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+from . import disponibilidade, eventos, resumo_diario
+from .models import Agendamento, calcular_intervalo, inicio_do_dia
+
+# Maior número de ocorrências materializadas por operação
+MAX_OCORRENCIAS_LOTE = 100
+
+# Ocorrências materializadas na criação de uma série sem quantidade definida
+LOTE_PADRAO = 12
+
+
+class ConflitoSerie(Exception):
+    """
+    Uma ou mais ocorrências da série não cabem na agenda
+    """
+    def __init__(self, conflitos):
+        super().__init__('Ocorrências da série em conflito com a agenda')
+        self.conflitos = conflitos
+
+
+def proximas_ocorrencias(serie, quantidade):
+    """
+    Retorna as próximas `quantidade` ocorrências da série após o último agendamento já materializado
+    """
+    ultima = serie.agendamentos.aggregate(ultima=Max('data_hora'))['ultima']
+    ocorrencias = serie.ocorrencias(inicio=ultima)
+    if ultima is not None:
+        ocorrencias = (data_hora for data_hora in ocorrencias if data_hora > ultima)
+    return list(islice(ocorrencias, quantidade))
+
+
+def verificar_ocorrencias(serie, ocorrencias):
+    """
+    Retorna as ocorrências (em ordem) que não cabem na agenda do profissional da série
+
+    Todo o período é carregado de uma vez; cada ocorrência aceita fecha suas
+    células para que ocorrências da própria série também não se sobreponham.
+    Séries sem profissional são verificadas contra a clínica inteira: a
+    ocorrência cabe se alguma agenda comporta o horário.
+    """
+    if not ocorrencias:
+        return []
+
+    inicio = timezone.localtime(ocorrencias[0]).date()
+    fim = timezone.localtime(ocorrencias[-1]).date()
+    mapas, carga = disponibilidade.montar_mapas_periodo(inicio, fim, serie.profissional_id, serie.cliente_id)
+
+    origem = inicio_do_dia(inicio)
+    duracao = serie.servico.duracao
+    conflitos = []
+    for data_hora in ocorrencias:
+        comeco = int((data_hora - origem).total_seconds() // 60)
+        celulas = range(
+            comeco // disponibilidade.INTERVALO_SLOT,
+            -(-(comeco + duracao) // disponibilidade.INTERVALO_SLOT)
+        )
+        livres = [
+            agenda for agenda, mapa in mapas.items()
+            if celulas.stop <= len(mapa) and all(mapa[i] for i in celulas)
+        ]
+        if not livres:
+            conflitos.append(data_hora)
+            continue
+        agenda = min(livres, key=lambda agenda: (carga[agenda], agenda or 0))
+        disponibilidade.marcar_ocupado(mapas[agenda], comeco, comeco + duracao)
+        carga[agenda] += duracao
+    return conflitos
+
+
+def materializar_serie(serie, quantidade, ignorar_conflitos=False):
+    """
+    Grava as próximas `quantidade` ocorrências da série e retorna (criados, conflitos)
+
+    Por padrão é tudo ou nada: havendo conflito, levanta ConflitoSerie e nada
+    é gravado. Com ignorar_conflitos, grava apenas as ocorrências livres.
+    """
+    quantidade = min(quantidade, MAX_OCORRENCIAS_LOTE)
+    with transaction.atomic():
+        ocorrencias = proximas_ocorrencias(serie, quantidade)
+        conflitos = verificar_ocorrencias(serie, ocorrencias)
+        if conflitos and not ignorar_conflitos:
+            raise ConflitoSerie(conflitos)
+
+        bloqueadas = set(conflitos)
+        duracao = serie.servico.duracao
+        agendamentos = [
+            Agendamento(
+                empresa_id=serie.empresa_id,
+                animal=serie.animal,
+                servico=serie.servico,
+                cliente=serie.cliente,
+                profissional=serie.profissional,
+                observacoes=serie.observacoes,
+                serie=serie,
+                data_hora=data_hora,
+                # bulk_create não chama save(), então o período é calculado aqui
+                periodo=calcular_intervalo(data_hora, duracao),
+            )
+            for data_hora in ocorrencias
+            if data_hora not in bloqueadas
+        ]
+        criados = Agendamento.objects.bulk_create(agendamentos)
+        # bulk_create também não dispara os signals do feed de eventos e do resumo diário
+        for agendamento in criados:
+            eventos.publicar(agendamento, 'criado')
+        resumo_diario.registrar_criados(criados)
+        return criados, conflitos
@@ -0,0 +1,119 @@
+from decimal import Decimal
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from usuarios.models import DisponibilidadeProfissional
+from servicos.models import Servico
+from core import sincronizacao
+from . import disponibilidade, eventos, resumo_diario
+from .models import Agendamento
+
+# Campos cujo valor anterior os receivers de gravação de agendamentos precisam conhecer
+CAMPOS_ESTADO_ANTERIOR = ['data_hora', 'cliente_id', 'empresa_id', 'servico_id', 'status']
+
+
+@receiver([post_save, post_delete], sender=DisponibilidadeProfissional)
+def invalidar_expedientes_compilados(sender, **kwargs):
+    """
+    Recompila os expedientes quando uma disponibilidade é criada, alterada ou removida
+    """
+    disponibilidade.invalidar_expedientes()
+
+
+@receiver(pre_save, sender=Agendamento)
+def guardar_estado_anterior(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda os valores anteriores do agendamento alterado
+
+    O horário faz o evento de remarcação chegar também a quem acompanha o
+    dia antigo; o cliente permite marcar a exclusão para quem o perdeu; e
+    empresa, dia, serviço e status identificam a linha do resumo diário a
+    descontar.
+
+    Custa um SELECT por gravação, inclusive nas que mudam só o status
+    (_salvar_status): o status anterior decide de qual linha do resumo o
+    agendamento sai, e lê-lo do banco evita confiar em uma instância
+    carregada antes de outra requisição alterá-la. Gravações com
+    update_fields que não tocam nesses campos não fazem a consulta.
+    """
+    instance._estado_anterior = None
+    campos = {'data_hora', 'cliente', 'cliente_id', 'empresa', 'empresa_id', 'servico', 'servico_id', 'status'}
+    if instance.pk and (update_fields is None or campos & set(update_fields)):
+        instance._estado_anterior = Agendamento.objects.filter(pk=instance.pk).values(*CAMPOS_ESTADO_ANTERIOR).first()
+
+
+@receiver(post_save, sender=Agendamento)
+def publicar_gravacao_agendamento(sender, instance, created, **kwargs):
+    """
+    Publica no feed de eventos a criação ou alteração do agendamento
+    """
+    anterior = getattr(instance, '_estado_anterior', None)
+    eventos.publicar(
+        instance,
+        eventos.tipo_evento(instance, created),
+        anterior['data_hora'] if anterior else None
+    )
+
+
+@receiver(post_save, sender=Agendamento)
+def registrar_troca_cliente_agendamento(sender, instance, **kwargs):
+    """
+    Marca a exclusão para o cliente anterior quando o agendamento passa para outro cliente
+    """
+    anterior = getattr(instance, '_estado_anterior', None)
+    if anterior and anterior['cliente_id'] != instance.cliente_id:
+        sincronizacao.registrar_exclusao('agendamento', instance.pk, anterior['cliente_id'])
+
+
+@receiver(post_save, sender=Agendamento)
+def atualizar_resumo_gravacao(sender, instance, created, **kwargs):
+    """
+    Soma o agendamento criado ou alterado ao resumo diário, descontando o estado anterior
+    """
+    anterior = getattr(instance, '_estado_anterior', None)
+    if created or anterior is not None:
+        resumo_diario.registrar_gravacao(instance, anterior)
+
+
+@receiver(post_delete, sender=Agendamento)
+def publicar_exclusao_agendamento(sender, instance, **kwargs):
+    """
+    Publica no feed de eventos a exclusão do agendamento
+    """
+    eventos.publicar(instance, 'excluido')
+
+
+@receiver(post_delete, sender=Agendamento)
+def registrar_exclusao_agendamento(sender, instance, origin=None, **kwargs):
+    """
+    Marca a exclusão do agendamento para a sincronização do cliente
+    """
+    if not sincronizacao.excluido_com_usuario(origin):
+        sincronizacao.registrar_exclusao('agendamento', instance.pk, instance.cliente_id)
+
+
+@receiver(post_delete, sender=Agendamento)
+def atualizar_resumo_exclusao(sender, instance, origin=None, **kwargs):
+    """
+    Desconta o agendamento excluído do resumo diário
+    """
+    resumo_diario.registrar_exclusao(instance, origin)
+
+
+@receiver(pre_save, sender=Servico)
+def guardar_preco_anterior(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda o preço anterior do serviço alterado
+    """
+    instance._preco_anterior = None
+    if instance.pk and (update_fields is None or 'preco' in update_fields):
+        instance._preco_anterior = Servico.objects.filter(pk=instance.pk).values_list('preco', flat=True).first()
+
+
+@receiver(post_save, sender=Servico)
+def atualizar_receita_resumo(sender, instance, created, **kwargs):
+    """
+    Recalcula a receita do resumo diário quando o preço do serviço muda
+    """
+    anterior = getattr(instance, '_preco_anterior', None)
+    if not created and anterior is not None and Decimal(str(instance.preco)) != anterior:
+        resumo_diario.atualizar_receita(instance)
@@ -1,3 +1,1272 @@
-from django.test import TestCase
+import asyncio
+import base64
+import csv
+import gzip
+import io
+import json
+import os
+import select
+import tempfile
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+from django.db.models import Sum
+import psycopg2
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+import threading
+from django.db import connection, connections, transaction
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from animais.models import Animal
+from core.models import Empresa, Permission, Role, RolePermission, UserRole
+from servicos.models import Servico
+from usuarios.models import DisponibilidadeProfissional, Usuario
+from . import disponibilidade, eventos, exportacao, lista_espera, paginacao, relatorios, reservas, series
+from .disponibilidade import (
+    compilar_expediente, horarios_livres, marcar_ocupado, proximos_horarios, verificar_conflitos
+)
+from .models import Agendamento, AgendamentoDiario, ListaEspera, ReservaHorario, SerieAgendamento
+
+# Segunda-feira distante, para que nenhum horário seja descartado por já ter passado
+SEGUNDA = date(2030, 3, 4)
+
+
+def momento(dia, horario):
+    """
+    Retorna o datetime local do dia no horário 'HH:MM'
+    """
+    return timezone.make_aware(datetime.combine(dia, datetime.strptime(horario, '%H:%M').time()))
+
+
+class AgendaTestCase(TestCase):
+    """
+    Base com empresa, cliente, animal e serviços usados pelos testes da agenda
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Clínica Teste')
+        cls.cliente = Usuario.objects.create(username='cliente', tipo='cliente')
+        cls.outro_cliente = Usuario.objects.create(username='outro', tipo='cliente')
+        cls.animal = Animal.objects.create(nome='Rex', especie='Cão', dono=cls.cliente, empresa=cls.empresa)
+        cls.consulta = Servico.objects.create(nome='Consulta', preco=80, duracao=30, empresa=cls.empresa)
+        cls.cirurgia = Servico.objects.create(nome='Cirurgia', preco=500, duracao=90, empresa=cls.empresa)
+
+    def setUp(self):
+        # O rollback dos testes não dispara os signals, então os expedientes compilados podem estar velhos
+        # e o cache pode guardar permissões e métricas de outro teste
+        disponibilidade.invalidar_expedientes()
+        cache.clear()
+
+    @classmethod
+    def funcionario(cls, *acoes):
+        """
+        Cria um usuário com um role que concede as ações informadas sobre agendamentos
+        """
+        usuario = Usuario.objects.create(username=f"funcionario-{'-'.join(acoes)}", tipo='profissional')
+        role = Role.objects.create(name=f"role-{'-'.join(acoes)}", display_name='Recepção')
+        for acao in acoes:
+            permissao, _ = Permission.objects.get_or_create(resource='agendamentos', action=acao)
+            RolePermission.objects.create(role=role, permission=permissao)
+        UserRole.objects.create(user=usuario, role=role)
+        return usuario
+
+    def api(self, usuario):
+        """
+        Cliente da API autenticado como o usuário, recarregado do banco como em uma nova requisição
+        """
+        cliente = APIClient()
+        cliente.force_authenticate(Usuario.objects.get(pk=usuario.pk))
+        return cliente
+
+    def agendar(self, inicio, servico=None, **campos):
+        campos.setdefault('status', 'confirmado')
+        campos.setdefault('cliente', self.cliente)
+        return Agendamento.objects.create(
+            empresa=self.empresa,
+            animal=self.animal,
+            servico=servico or self.consulta,
+            data_hora=inicio,
+            **campos
+        )
+
+
+class HorariosLivresTests(SimpleTestCase):
+    """
+    Varredura do mapa de células de um dia
+    """
+
+    def setUp(self):
+        self.mapa = list(compilar_expediente([(8 * 60, 10 * 60)]))
+
+    def test_servico_de_um_slot(self):
+        self.assertEqual(horarios_livres(self.mapa, 30), ['08:00', '08:30', '09:00', '09:30'])
+
+    def test_servico_longo_precisa_de_celulas_consecutivas(self):
+        self.assertEqual(horarios_livres(self.mapa, 60), ['08:00', '08:30', '09:00'])
+        self.assertEqual(horarios_livres(self.mapa, 120), ['08:00'])
+        self.assertEqual(horarios_livres(self.mapa, 150), [])
+
+    def test_duracao_quebrada_arredonda_para_cima(self):
+        self.assertEqual(horarios_livres(self.mapa, 45), horarios_livres(self.mapa, 60))
+
+    def test_duracao_zero_ocupa_um_slot(self):
+        self.assertEqual(horarios_livres(self.mapa, 0), horarios_livres(self.mapa, 30))
+
+    def test_celula_ocupada_parte_a_sequencia(self):
+        # 09:00-09:15 toca apenas a célula das 09:00
+        marcar_ocupado(self.mapa, 9 * 60, 9 * 60 + 15)
+        self.assertEqual(horarios_livres(self.mapa, 30), ['08:00', '08:30', '09:30'])
+        self.assertEqual(horarios_livres(self.mapa, 60), ['08:00'])
+
+    def test_expediente_fracionado(self):
+        mapa = compilar_expediente([(8 * 60 + 15, 9 * 60 + 45)])
+        self.assertEqual(horarios_livres(mapa, 30), ['08:30', '09:00'])
+
+
+class ProximosHorariosTests(AgendaTestCase):
+    """
+    Busca dos próximos horários livres em janelas crescentes
+    """
+
+    def test_expediente_padrao(self):
+        self.assertEqual(proximos_horarios(SEGUNDA, 3), [
+            {'data': '2030-03-04', 'horario': '08:00'},
+            {'data': '2030-03-04', 'horario': '08:30'},
+            {'data': '2030-03-04', 'horario': '09:00'},
+        ])
+
+    def test_agendamento_ocupa_a_duracao_do_servico(self):
+        self.agendar(momento(SEGUNDA, '08:00'), self.cirurgia)
+        horarios = [h['horario'] for h in proximos_horarios(SEGUNDA, 2)]
+        self.assertEqual(horarios, ['09:30', '10:00'])
+
+    def test_agendamento_cancelado_nao_ocupa(self):
+        self.agendar(momento(SEGUNDA, '08:00'), self.cirurgia, status='cancelado')
+        self.assertEqual(proximos_horarios(SEGUNDA, 1)[0]['horario'], '08:00')
+
+    def test_servico_longo_nao_atravessa_intervalo_do_almoco(self):
+        horarios = [h['horario'] for h in proximos_horarios(SEGUNDA, 6, duracao=90)]
+        self.assertEqual(horarios, ['08:00', '08:30', '09:00', '09:30', '10:00', '10:30'])
+        horarios = [h['horario'] for h in proximos_horarios(SEGUNDA, 7, duracao=90)]
+        self.assertEqual(horarios[-1], '14:00')
+
+    def test_reserva_bloqueia_apenas_os_outros_clientes(self):
+        ReservaHorario.objects.create(
+            cliente=self.cliente,
+            servico=self.consulta,
+            data_hora=momento(SEGUNDA, '08:00'),
+            expira_em=timezone.now() + timedelta(minutes=10),
+        )
+        livre_para_outro = proximos_horarios(SEGUNDA, 1, cliente_id=self.outro_cliente.pk)
+        livre_para_dono = proximos_horarios(SEGUNDA, 1, cliente_id=self.cliente.pk)
+        self.assertEqual(livre_para_outro[0]['horario'], '08:30')
+        self.assertEqual(livre_para_dono[0]['horario'], '08:00')
+
+    def test_reserva_expirada_nao_bloqueia(self):
+        ReservaHorario.objects.create(
+            cliente=self.cliente,
+            servico=self.consulta,
+            data_hora=momento(SEGUNDA, '08:00'),
+            expira_em=timezone.now() - timedelta(minutes=1),
+        )
+        self.assertEqual(proximos_horarios(SEGUNDA, 1, cliente_id=self.outro_cliente.pk)[0]['horario'], '08:00')
+
+    def test_continua_na_janela_seguinte(self):
+        # Segunda a sexta têm 16 horários e o sábado 8: a primeira janela (7 dias) rende 88
+        horarios = proximos_horarios(SEGUNDA, 100)
+        self.assertEqual(len(horarios), 100)
+        self.assertEqual(horarios[88], {'data': '2030-03-11', 'horario': '08:00'})
+
+    def test_agenda_do_profissional(self):
+        profissional = Usuario.objects.create(username='vet', tipo='profissional')
+        DisponibilidadeProfissional.objects.create(
+            profissional=profissional,
+            dia_semana=1,
+            hora_inicio=datetime.strptime('14:00', '%H:%M').time(),
+            hora_fim=datetime.strptime('15:00', '%H:%M').time(),
+        )
+        self.assertEqual(proximos_horarios(SEGUNDA, 3, profissional_id=profissional.pk), [
+            {'data': '2030-03-05', 'horario': '14:00'},
+            {'data': '2030-03-05', 'horario': '14:30'},
+            {'data': '2030-03-12', 'horario': '14:00'},
+        ])
+
+    def test_profissional_sem_expediente(self):
+        profissional = Usuario.objects.create(username='vet', tipo='profissional')
+        self.assertEqual(proximos_horarios(SEGUNDA, 1, profissional_id=profissional.pk), [])
+
+
+class VerificarConflitosTests(AgendaTestCase):
+    """
+    Varredura de conflitos de vários candidatos contra os agendamentos existentes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.profissional = Usuario.objects.create(username='vet', tipo='profissional')
+
+    def candidato(self, inicio, fim, profissional=None):
+        return (momento(SEGUNDA, inicio), momento(SEGUNDA, fim), profissional)
+
+    def test_sem_candidatos(self):
+        self.assertEqual(verificar_conflitos([]), [])
+
+    def test_intervalos_semiabertos(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'))
+        self.assertEqual(verificar_conflitos([
+            self.candidato('09:30', '10:00'),
+            self.candidato('10:15', '10:45'),
+            self.candidato('10:30', '11:00'),
+            self.candidato('09:00', '11:00'),
+        ]), [None, agendamento.pk, None, agendamento.pk])
+
+    def test_preserva_a_ordem_dos_candidatos(self):
+        cedo = self.agendar(momento(SEGUNDA, '08:00'))
+        tarde = self.agendar(momento(SEGUNDA, '15:00'))
+        self.assertEqual(verificar_conflitos([
+            self.candidato('15:00', '15:30'),
+            self.candidato('12:00', '12:30'),
+            self.candidato('08:00', '08:30'),
+        ]), [tarde.pk, None, cedo.pk])
+
+    def test_agendamento_longo_bloqueia_candidatos_seguintes(self):
+        cirurgia = self.agendar(momento(SEGUNDA, '08:00'), self.cirurgia)
+        self.assertEqual(verificar_conflitos([
+            self.candidato('08:00', '08:30'),
+            self.candidato('08:30', '09:00'),
+            self.candidato('09:00', '09:30'),
+            self.candidato('09:30', '10:00'),
+        ]), [cirurgia.pk, cirurgia.pk, cirurgia.pk, None])
+
+    def test_retorna_o_bloqueio_que_comeca_primeiro(self):
+        cirurgia = self.agendar(momento(SEGUNDA, '08:00'), self.cirurgia)
+        consulta = self.agendar(momento(SEGUNDA, '09:30'))
+        self.assertEqual(verificar_conflitos([
+            self.candidato('09:00', '10:00'),
+            self.candidato('09:30', '10:30'),
+        ]), [cirurgia.pk, consulta.pk])
+
+    def test_cancelado_nao_conflita(self):
+        self.agendar(momento(SEGUNDA, '10:00'), status='cancelado')
+        self.assertEqual(verificar_conflitos([self.candidato('10:00', '10:30')]), [None])
+
+    def test_conflito_legado_sem_periodo(self):
+        legado = self.agendar(momento(SEGUNDA, '10:00'), self.cirurgia)
+        Agendamento.objects.filter(pk=legado.pk).update(periodo=None)
+        self.assertEqual(verificar_conflitos([
+            self.candidato('09:00', '10:00'),
+            self.candidato('11:00', '11:30'),
+            self.candidato('11:30', '12:00'),
+        ]), [None, legado.pk, None])
+
+    def test_agendas_separadas_por_profissional(self):
+        sem_profissional = self.agendar(momento(SEGUNDA, '10:00'))
+        do_profissional = self.agendar(momento(SEGUNDA, '11:00'), profissional=self.profissional)
+        self.assertEqual(verificar_conflitos([
+            self.candidato('10:00', '10:30', self.profissional.pk),
+            self.candidato('11:00', '11:30'),
+            self.candidato('10:00', '10:30'),
+            self.candidato('11:00', '11:30', self.profissional.pk),
+        ]), [None, None, sem_profissional.pk, do_profissional.pk])
+
+
+class ReservasTests(AgendaTestCase):
+    """
+    Reservas temporárias de horário: criação, consumo, liberação e vencimento
+    """
+
+    def reservar(self, horario='10:00', cliente=None):
+        return reservas.criar_reserva(cliente or self.cliente, self.consulta, momento(SEGUNDA, horario))
+
+    def vencer(self, reserva):
+        ReservaHorario.objects.filter(pk=reserva.pk).update(expira_em=timezone.now() - timedelta(seconds=1))
+
+    def criar(self, **dados):
+        cliente = self.api(self.cliente)
+        dados = {
+            'empresa': self.empresa.pk,
+            'cliente': self.cliente.pk,
+            'animal': self.animal.pk,
+            'servico': self.consulta.pk,
+            'data_hora': momento(SEGUNDA, '15:00').isoformat(),
+            **dados
+        }
+        return cliente.post('/api/agendamentos/agendamentos/', dados, format='json')
+
+    def test_reserva_fecha_o_horario_para_os_outros(self):
+        reserva = self.reservar()
+        self.assertAlmostEqual(reserva.expira_em, timezone.now() + reservas.tempo_reserva(), delta=timedelta(seconds=5))
+        with self.assertRaises(disponibilidade.HorarioIndisponivel):
+            self.reservar(cliente=self.outro_cliente)
+        self.assertEqual(self.reservar('10:30', self.outro_cliente).cliente, self.outro_cliente)
+
+    def test_nova_reserva_substitui_a_anterior(self):
+        anterior = self.reservar()
+        atual = self.reservar('11:00')
+        self.assertEqual(list(ReservaHorario.objects.filter(cliente=self.cliente)), [atual])
+        self.assertFalse(ReservaHorario.objects.filter(pk=anterior.pk).exists())
+
+    def test_reserva_vencida_libera_o_horario(self):
+        self.vencer(self.reservar())
+        reserva = self.reservar(cliente=self.outro_cliente)
+        self.assertEqual(list(ReservaHorario.objects.all()), [reserva])
+
+    def test_consumir(self):
+        reserva = self.reservar()
+        self.assertEqual(reservas.consumir_reserva(str(reserva.token), self.cliente).token, reserva.token)
+        self.assertFalse(ReservaHorario.objects.exists())
+        with self.assertRaises(reservas.ReservaInvalida):
+            reservas.consumir_reserva(reserva.token, self.cliente)
+
+    def test_consumir_reserva_invalida(self):
+        reserva = self.reservar()
+        for token, cliente in [('nao-e-uuid', self.cliente), (reserva.token, self.outro_cliente)]:
+            with self.assertRaises(reservas.ReservaInvalida):
+                reservas.consumir_reserva(token, cliente)
+        self.vencer(reserva)
+        with self.assertRaises(reservas.ReservaInvalida):
+            reservas.consumir_reserva(reserva.token, self.cliente)
+
+    def test_liberar(self):
+        reserva = self.reservar()
+        self.assertFalse(reservas.liberar_reserva(reserva.token, self.outro_cliente))
+        self.assertFalse(reservas.liberar_reserva('nao-e-uuid', self.cliente))
+        self.assertTrue(reservas.liberar_reserva(reserva.token, self.cliente))
+        self.assertFalse(ReservaHorario.objects.exists())
+
+    def test_criar_agendamento_consome_a_reserva(self):
+        reserva = self.reservar()
+        resposta = self.criar(reserva=str(reserva.token))
+        self.assertEqual(resposta.status_code, 201)
+        agendamento = Agendamento.objects.get(pk=resposta.data['id'])
+        self.assertEqual(agendamento.data_hora, reserva.data_hora)
+        self.assertFalse(ReservaHorario.objects.exists())
+
+    def test_criar_agendamento_com_reserva_vencida(self):
+        reserva = self.reservar()
+        self.vencer(reserva)
+        self.assertEqual(self.criar(reserva=str(reserva.token)).status_code, 409)
+        self.assertFalse(Agendamento.objects.exists())
+
+    def test_criar_agendamento_sem_token_libera_a_propria_reserva(self):
+        self.reservar('15:00')
+        self.assertEqual(self.criar().status_code, 201)
+        self.assertFalse(ReservaHorario.objects.exists())
+
+    def test_reserva_de_outro_cliente_bloqueia_a_criacao(self):
+        self.reservar('15:00', self.outro_cliente)
+        self.assertEqual(self.criar().status_code, 409)
+
+    def test_oferta_da_lista_de_espera_confirmada_ao_agendar(self):
+        pedido = ListaEspera.objects.create(
+            empresa=self.empresa, cliente=self.cliente, animal=self.animal, servico=self.consulta,
+            data_inicio=SEGUNDA, data_fim=SEGUNDA, agendar_automaticamente=False,
+        )
+        cancelado = self.agendar(momento(SEGUNDA, '15:00'), status='cancelado')
+        lista_espera.preencher_vaga(cancelado)
+        pedido.refresh_from_db()
+        resposta = self.criar(reserva=str(pedido.reserva_token))
+        self.assertEqual(resposta.status_code, 201)
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, 'agendado')
+        self.assertEqual(pedido.agendamento_id, resposta.data['id'])
+
+
+class ListaEsperaTests(AgendaTestCase):
+    """
+    Encaixe de pedidos da lista de espera no horário liberado por um cancelamento
+    """
+
+    def pedido(self, inicio=SEGUNDA, fim=SEGUNDA, **campos):
+        campos.setdefault('cliente', self.outro_cliente)
+        campos.setdefault('servico', self.consulta)
+        return ListaEspera.objects.create(
+            empresa=self.empresa,
+            animal=self.animal,
+            data_inicio=inicio,
+            data_fim=fim,
+            **campos
+        )
+
+    def cancelar(self, inicio=None, servico=None):
+        agendamento = self.agendar(inicio or momento(SEGUNDA, '10:00'), servico)
+        agendamento.status = 'cancelado'
+        agendamento.save()
+        return agendamento
+
+    def test_janela_contem_o_dia(self):
+        dentro = self.pedido(SEGUNDA - timedelta(days=3), SEGUNDA + timedelta(days=3))
+        limites = self.pedido(SEGUNDA, SEGUNDA)
+        self.pedido(SEGUNDA + timedelta(days=1), SEGUNDA + timedelta(days=5))
+        self.pedido(SEGUNDA - timedelta(days=5), SEGUNDA - timedelta(days=1))
+        self.pedido(servico=self.cirurgia)
+        self.pedido(status='agendado')
+        compativeis = lista_espera.pedidos_compativeis(self.cancelar())
+        self.assertEqual(list(compativeis), [dentro, limites])
+
+    def test_profissional_do_horario_tem_prioridade(self):
+        profissional = Usuario.objects.create(username='vet', tipo='profissional')
+        outro = Usuario.objects.create(username='vet-2', tipo='profissional')
+        qualquer = self.pedido()
+        do_profissional = self.pedido(profissional=profissional)
+        self.pedido(profissional=outro)
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'), profissional=profissional, status='cancelado')
+        self.assertEqual(list(lista_espera.pedidos_compativeis(agendamento)), [do_profissional, qualquer])
+
+    def test_oferta_vencida_volta_para_a_fila(self):
+        vencida = self.pedido(status='oferecido', oferta_expira_em=timezone.now() - timedelta(minutes=1))
+        self.pedido(status='oferecido', oferta_expira_em=timezone.now() + timedelta(minutes=10))
+        self.assertEqual(list(lista_espera.pedidos_compativeis(self.cancelar())), [vencida])
+
+    def test_agenda_automaticamente(self):
+        pedido = self.pedido()
+        cancelado = self.cancelar()
+        self.assertEqual(lista_espera.preencher_vaga(cancelado), pedido)
+        pedido.refresh_from_db()
+        self.assertEqual(pedido.status, 'agendado')
+        self.assertEqual(pedido.agendamento.data_hora, cancelado.data_hora)
+        self.assertEqual(pedido.agendamento.cliente, self.outro_cliente)
+
+    def test_oferece_reserva_do_horario(self):
+        pedido = self.pedido(agendar_automaticamente=False)
+        lista_espera.preencher_vaga(self.cancelar())
+        pedido.refresh_from_db()
+        reserva = ReservaHorario.objects.get(token=pedido.reserva_token)
+        self.assertEqual(pedido.status, 'oferecido')
+        self.assertEqual(reserva.cliente, self.outro_cliente)
+        self.assertEqual(pedido.oferta_expira_em, reserva.expira_em)
+
+    def test_conflito_desfaz_apenas_a_tentativa(self):
+        # A reserva válida de outro cliente impede a oferta do primeiro pedido, mas não o agendamento do segundo
+        ReservaHorario.objects.create(
+            cliente=self.cliente,
+            servico=self.consulta,
+            data_hora=momento(SEGUNDA, '10:00'),
+            expira_em=timezone.now() + timedelta(minutes=10),
+        )
+        primeiro = self.pedido(agendar_automaticamente=False)
+        segundo = self.pedido()
+        cancelado = self.cancelar()
+        with transaction.atomic():
+            self.assertEqual(lista_espera.preencher_vaga(cancelado), segundo)
+        primeiro.refresh_from_db()
+        cancelado.refresh_from_db()
+        self.assertEqual(primeiro.status, 'aguardando')
+        self.assertIsNone(primeiro.reserva_token)
+        self.assertEqual(cancelado.status, 'cancelado')
+
+    def test_reserva_vencida_no_horario_e_removida(self):
+        vencida = ReservaHorario.objects.create(
+            cliente=self.cliente,
+            servico=self.consulta,
+            data_hora=momento(SEGUNDA, '10:00'),
+            expira_em=timezone.now() - timedelta(minutes=1),
+        )
+        pedido = self.pedido(agendar_automaticamente=False)
+        self.assertEqual(lista_espera.preencher_vaga(self.cancelar()), pedido)
+        self.assertFalse(ReservaHorario.objects.filter(pk=vencida.pk).exists())
+
+    def test_horario_passado_nao_e_oferecido(self):
+        self.pedido(timezone.localdate() - timedelta(days=1), timezone.localdate())
+        agendamento = self.agendar(timezone.now() - timedelta(hours=1), status='cancelado')
+        self.assertIsNone(lista_espera.preencher_vaga(agendamento))
+
+
+class ListaEsperaConcorrenciaTests(TransactionTestCase):
+    """
+    Pedidos travados por outra transação são pulados em vez de esperar
+    """
+
+    def setUp(self):
+        disponibilidade.invalidar_expedientes()
+        empresa = Empresa.objects.create(nome='Clínica Teste')
+        self.cliente = Usuario.objects.create(username='cliente', tipo='cliente')
+        animal = Animal.objects.create(nome='Rex', especie='Cão', dono=self.cliente, empresa=empresa)
+        consulta = Servico.objects.create(nome='Consulta', preco=80, duracao=30, empresa=empresa)
+        self.pedidos = [
+            ListaEspera.objects.create(
+                empresa=empresa, cliente=self.cliente, animal=animal, servico=consulta,
+                data_inicio=SEGUNDA, data_fim=SEGUNDA,
+            )
+            for _ in range(2)
+        ]
+        self.agendamento = Agendamento.objects.create(
+            empresa=empresa, cliente=self.cliente, animal=animal, servico=consulta,
+            data_hora=momento(SEGUNDA, '10:00'), status='cancelado',
+        )
+
+    def test_pula_pedido_travado(self):
+        travado, liberado = threading.Event(), threading.Event()
+
+        def travar():
+            try:
+                with transaction.atomic():
+                    ListaEspera.objects.select_for_update().get(pk=self.pedidos[0].pk)
+                    travado.set()
+                    liberado.wait(10)
+            finally:
+                connection.close()
+
+        concorrente = threading.Thread(target=travar)
+        concorrente.start()
+        try:
+            self.assertTrue(travado.wait(10))
+            with transaction.atomic():
+                self.assertEqual(lista_espera.preencher_vaga(self.agendamento), self.pedidos[1])
+        finally:
+            liberado.set()
+            concorrente.join()
+
+
+class AlteracaoAgendamentoTests(AgendaTestCase):
+    """
+    Alterações de horário passam pela mesma validação de disponibilidade da criação
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.admin = cls.funcionario('update')
+
+    def alterar(self, agendamento, **dados):
+        return self.api(self.cliente).patch(f'/api/agendamentos/agendamentos/{agendamento.pk}/', dados, format='json')
+
+    def alterar_admin(self, agendamento, **dados):
+        return self.api(self.admin).put(f'/api/admin/agendamentos/{agendamento.pk}/', dados, format='json')
+
+    def test_fora_do_expediente(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'))
+        destino = momento(SEGUNDA, '20:00').isoformat()
+        self.assertEqual(self.alterar(agendamento, data_hora=destino).status_code, 409)
+        self.assertEqual(self.alterar_admin(agendamento, data_hora=destino).status_code, 409)
+        agendamento.refresh_from_db()
+        self.assertEqual(agendamento.data_hora, momento(SEGUNDA, '10:00'))
+
+    def test_reserva_de_outro_cliente_bloqueia(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'))
+        ReservaHorario.objects.create(
+            cliente=self.outro_cliente,
+            servico=self.consulta,
+            data_hora=momento(SEGUNDA, '11:00'),
+            expira_em=timezone.now() + timedelta(minutes=10),
+        )
+        destino = momento(SEGUNDA, '11:00').isoformat()
+        self.assertEqual(self.alterar(agendamento, data_hora=destino).status_code, 409)
+        self.assertEqual(self.alterar_admin(agendamento, data_hora=destino).status_code, 409)
+
+    def test_o_proprio_agendamento_nao_bloqueia(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'), self.cirurgia)
+        self.assertEqual(self.alterar(agendamento, data_hora=momento(SEGUNDA, '10:30').isoformat()).status_code, 200)
+        self.assertEqual(self.alterar_admin(agendamento, data_hora=momento(SEGUNDA, '09:30').isoformat()).status_code, 200)
+        agendamento.refresh_from_db()
+        self.assertEqual(agendamento.data_hora, momento(SEGUNDA, '09:30'))
+
+    def test_troca_de_servico_valida_a_nova_duracao(self):
+        agendamento = self.agendar(momento(SEGUNDA, '11:00'))
+        self.assertEqual(self.alterar_admin(agendamento, servico_id=self.cirurgia.pk).status_code, 409)
+        self.assertEqual(self.alterar(agendamento, servico=self.cirurgia.pk).status_code, 409)
+
+    def test_alteracao_sem_mudar_o_horario_nao_revalida(self):
+        # Agendamento gravado fora do expediente continua editável
+        agendamento = self.agendar(momento(SEGUNDA, '20:00'))
+        self.assertEqual(self.alterar(agendamento, observacoes='Trazer exames').status_code, 200)
+        self.assertEqual(self.alterar_admin(agendamento, status='realizado').status_code, 200)
+
+    def test_reativar_cancelado_revalida(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'), status='cancelado')
+        self.agendar(momento(SEGUNDA, '10:00'))
+        self.assertEqual(self.alterar_admin(agendamento, status='confirmado').status_code, 409)
+
+
+class CursorTests(SimpleTestCase):
+    """
+    Codificação do cursor opaco da paginação
+    """
+
+    def test_ida_e_volta(self):
+        agendamento = Agendamento(id=42, data_hora=momento(SEGUNDA, '10:00'))
+        token = paginacao.codificar_cursor(agendamento)
+        self.assertNotIn('=', token)
+        self.assertEqual(paginacao.decodificar_cursor(token), (agendamento.data_hora, 42))
+
+    def test_cursor_adulterado(self):
+        for token in ['???', 'bmFv', base64.urlsafe_b64encode(b'["2030-03-04T10:00:00", "1"]').decode()]:
+            with self.assertRaises(paginacao.CursorInvalido):
+                paginacao.decodificar_cursor(token)
+
+
+class PaginacaoTests(AgendaTestCase):
+    """
+    Paginação por (data_hora, id) decrescentes, estável com empates
+    """
+
+    def setUp(self):
+        super().setUp()
+        # Três agendamentos no mesmo instante: os cancelados não entram na constraint
+        self.agendar(momento(SEGUNDA, '10:00'), status='cancelado')
+        self.agendar(momento(SEGUNDA, '10:00'), status='cancelado')
+        self.agendar(momento(SEGUNDA, '10:00'))
+        self.agendar(momento(SEGUNDA, '11:00'))
+        self.agendar(momento(SEGUNDA, '09:00'))
+        self.ordem = list(Agendamento.objects.order_by('-data_hora', '-id').values_list('id', flat=True))
+
+    def pagina(self, cursor='', limite=2):
+        return paginacao.paginar(Agendamento.objects.all(), RequestFactory().get('/', {'cursor': cursor, 'limite': limite}))
+
+    def percorrer(self, limite):
+        ids, cursor, paginas = [], '', 0
+        while cursor is not None:
+            pagina, cursor = self.pagina(cursor, limite)
+            ids.extend(agendamento.id for agendamento in pagina)
+            paginas += 1
+        return ids, paginas
+
+    def test_percorre_todos_sem_repetir(self):
+        for limite in (1, 2, 3, 5):
+            ids, paginas = self.percorrer(limite)
+            self.assertEqual(ids, self.ordem)
+            self.assertEqual(paginas, -(-len(self.ordem) // limite))
+
+    def test_cursor_no_meio_de_um_empate(self):
+        pagina, cursor = self.pagina(limite=2)
+        self.assertEqual([a.id for a in pagina], self.ordem[:2])
+        pagina, _ = self.pagina(cursor, 2)
+        self.assertEqual([a.id for a in pagina], self.ordem[2:4])
+
+    def test_novos_agendamentos_nao_deslocam_as_paginas(self):
+        _, cursor = self.pagina(limite=2)
+        self.agendar(momento(SEGUNDA, '14:00'))
+        pagina, _ = self.pagina(cursor, 2)
+        self.assertEqual([a.id for a in pagina], self.ordem[2:4])
+
+    def test_limite_invalido(self):
+        for limite in (0, paginacao.TAMANHO_MAXIMO + 1, 'x'):
+            with self.assertRaises(paginacao.CursorInvalido):
+                self.pagina(limite=limite)
+
+    def test_api(self):
+        cliente = self.api(self.cliente)
+        resposta = cliente.get('/api/agendamentos/listar-cliente/', {'limite': 4})
+        self.assertEqual([a['id'] for a in resposta.data['resultados']], self.ordem[:4])
+        resposta = cliente.get('/api/agendamentos/listar-cliente/', {'cursor': resposta.data['proximo_cursor']})
+        self.assertEqual([a['id'] for a in resposta.data['resultados']], self.ordem[4:])
+        self.assertIsNone(resposta.data['proximo_cursor'])
+        self.assertEqual(cliente.get('/api/agendamentos/listar-cliente/', {'cursor': 'x'}).status_code, 400)
+        # Sem cursor nem limite a resposta continua sendo a lista completa
+        self.assertEqual(len(cliente.get('/api/agendamentos/listar-cliente/').data), len(self.ordem))
+
+
+class RetomadaEventosTests(SimpleTestCase):
+    """
+    Reenvio dos eventos perdidos quando o navegador reconecta com Last-Event-ID
+    """
+
+    def setUp(self):
+        self.ouvinte = eventos.Ouvinte()
+        self.ouvinte.cobertura = 10
+        self.ouvinte.posicao = 13
+        for seq, dia in ((11, SEGUNDA), (12, SEGUNDA + timedelta(days=10)), (13, SEGUNDA)):
+            self.ouvinte.historico.append({
+                'seq': seq, 'tipo': 'criado', 'id': seq, 'data_hora': momento(dia, '10:00').isoformat(), 'status': 'pendente'
+            })
+        self.assinatura = eventos.Assinatura(momento(SEGUNDA, '00:00'), momento(SEGUNDA + timedelta(days=7), '00:00'))
+
+    def retomada(self, ultimo_id):
+        return self.ouvinte._retomada(self.assinatura, ultimo_id)
+
+    def test_sem_last_event_id_envia_apenas_a_posicao(self):
+        self.assertEqual(self.retomada(None), ['id: 13\n\n'])
+
+    def test_reenvia_os_eventos_perdidos_da_janela(self):
+        mensagens = self.retomada(10)
+        self.assertEqual([m.split('\n')[0] for m in mensagens], ['id: 11', 'id: 13', 'id: 13'])
+        self.assertIn('event: criado', mensagens[0])
+        self.assertEqual(self.retomada(13), ['id: 13\n\n'])
+
+    def test_intervalo_nao_coberto_pede_recarga(self):
+        self.assertEqual(self.retomada(9), ['id: 13\nevent: recarregar\ndata: {}\n\n'])
+
+    def test_historico_cheio_pede_recarga_do_que_foi_descartado(self):
+        # O evento 10 já saiu do histórico, embora o processo o tenha recebido
+        self.ouvinte.cobertura = 5
+        self.ouvinte.historico = eventos.deque(self.ouvinte.historico, maxlen=3)
+        self.assertIn('event: recarregar', self.retomada(9)[0])
+        self.assertEqual(self.retomada(10)[0].split('\n')[0], 'id: 11')
+
+    def test_fila_atrasada_e_sinalizada(self):
+        assinatura = eventos.Assinatura()
+        for n in range(eventos.TAMANHO_FILA):
+            self.assertTrue(assinatura.entregar({'seq': n}))
+        self.assertFalse(assinatura.entregar({'seq': eventos.TAMANHO_FILA}))
+        self.assertEqual(assinatura.fila.qsize(), 1)
+        self.assertIsNone(assinatura.fila.get_nowait())
+
+    def test_fluxo_envia_a_retomada_antes_dos_eventos(self):
+        async def primeiras():
+            assinatura = eventos.Assinatura()
+            assinatura.entregar(None)
+            return [mensagem async for mensagem in eventos.fluxo(assinatura, ['id: 13\n\n'])]
+
+        self.assertEqual(asyncio.run(primeiras()), [
+            f'retry: {eventos.RECONEXAO}\n\n', 'id: 13\n\n', 'event: recarregar\ndata: {}\n\n'
+        ])
+
+
+class PublicacaoEventosTests(TransactionTestCase):
+    """
+    Os avisos do feed só saem com pg_notify depois do commit
+    """
+
+    def setUp(self):
+        disponibilidade.invalidar_expedientes()
+        self.empresa = Empresa.objects.create(nome='Clínica Teste')
+        self.cliente = Usuario.objects.create(username='cliente', tipo='cliente')
+        self.animal = Animal.objects.create(nome='Rex', especie='Cão', dono=self.cliente, empresa=self.empresa)
+        self.consulta = Servico.objects.create(nome='Consulta', preco=80, duracao=30, empresa=self.empresa)
+        self.escuta = psycopg2.connect(**connections['default'].get_connection_params())
+        self.escuta.set_session(autocommit=True)
+        with self.escuta.cursor() as cursor:
+            cursor.execute(f'LISTEN {eventos.CANAL}')
+
+    def tearDown(self):
+        self.escuta.close()
+
+    def recebidos(self, espera=0.5):
+        select.select([self.escuta], [], [], espera)
+        self.escuta.poll()
+        avisos = [json.loads(aviso.payload) for aviso in self.escuta.notifies]
+        self.escuta.notifies.clear()
+        return avisos
+
+    def agendar(self, horario='10:00'):
+        return Agendamento.objects.create(
+            empresa=self.empresa, cliente=self.cliente, animal=self.animal, servico=self.consulta,
+            data_hora=momento(SEGUNDA, horario),
+        )
+
+    def test_publica_apenas_no_commit(self):
+        with transaction.atomic():
+            agendamento = self.agendar()
+            self.assertEqual(self.recebidos(0.1), [])
+        [evento] = self.recebidos()
+        self.assertEqual(
+            (evento['tipo'], evento['id'], evento['data_hora']),
+            ('criado', agendamento.pk, momento(SEGUNDA, '10:00').isoformat())
+        )
+        self.assertIsInstance(evento['seq'], int)
+
+    def test_rollback_nao_publica(self):
+        with transaction.atomic():
+            self.agendar()
+            transaction.set_rollback(True)
+        self.assertEqual(self.recebidos(0.2), [])
+
+    def test_tipos_e_numeracao_crescente(self):
+        agendamento = self.agendar()
+        agendamento.data_hora = momento(SEGUNDA, '11:00')
+        agendamento.save()
+        agendamento.status = 'cancelado'
+        agendamento.save()
+        agendamento.delete()
+        recebidos = self.recebidos()
+        while len(recebidos) < 4:
+            novos = self.recebidos()
+            if not novos:
+                break
+            recebidos += novos
+        self.assertEqual([e['tipo'] for e in recebidos], ['criado', 'atualizado', 'cancelado', 'excluido'])
+        self.assertEqual(eventos.datas_evento(recebidos[1]), [momento(SEGUNDA, '11:00'), momento(SEGUNDA, '10:00')])
+        seqs = [e['seq'] for e in recebidos]
+        self.assertEqual(seqs, sorted(set(seqs)))
+
+
+class ExportacaoBlocosTests(SimpleTestCase):
+    """
+    Montagem dos blocos e compressão da exportação
+    """
+
+    def test_blocos_de_tamanho_aproximado(self):
+        blocos = list(exportacao.em_blocos(['abc'] * 10, tamanho=7))
+        self.assertEqual(blocos, [b'abcabcabc'] * 3 + [b'abc'])
+
+    def test_gzip_por_blocos(self):
+        blocos = [os.urandom(1000) for _ in range(5)]
+        self.assertEqual(gzip.decompress(b''.join(exportacao.comprimir_gzip(iter(blocos)))), b''.join(blocos))
+
+    def test_csv_escapa_os_valores(self):
+        linhas = list(exportacao.linhas_csv([
+            (1, momento(SEGUNDA, '10:00'), 'confirmado', 'Ana, "Aninha"', 'Rex', 'Cão', 'Consulta',
+             Decimal('80.00'), None, 'linha 1\nlinha 2'),
+        ]))
+        registros = list(csv.reader(io.StringIO(''.join(linhas))))
+        self.assertEqual(registros[0], [nome for nome, _ in exportacao.COLUNAS])
+        self.assertEqual(registros[1][3], 'Ana, "Aninha"')
+        self.assertEqual(registros[1][7], '80.00')
+        self.assertEqual(registros[1][9], 'linha 1\nlinha 2')
+
+
+class ExportacaoTests(AgendaTestCase):
+    """
+    Exportação em streaming pela API e pelo comando de gerenciamento
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.leitor = cls.funcionario('read')
+
+    def setUp(self):
+        super().setUp()
+        self.primeiro = self.agendar(momento(SEGUNDA, '10:00'), observacoes='Jejum, 8h')
+        self.segundo = self.agendar(momento(SEGUNDA + timedelta(days=1), '10:00'), self.cirurgia)
+        self.cancelado = self.agendar(momento(SEGUNDA + timedelta(days=2), '10:00'), status='cancelado')
+
+    def exportar(self, **parametros):
+        resposta = self.api(self.leitor).get('/api/admin/agendamentos/exportar/', parametros)
+        self.assertTrue(resposta.streaming)
+        return resposta, b''.join(resposta.streaming_content)
+
+    def test_filtros(self):
+        def ids(*args):
+            return [linha[0] for linha in exportacao.filtrar_agendamentos(*args)]
+        self.assertEqual(ids(), [self.primeiro.pk, self.segundo.pk, self.cancelado.pk])
+        self.assertEqual(ids(SEGUNDA + timedelta(days=1), SEGUNDA + timedelta(days=1)), [self.segundo.pk])
+        self.assertEqual(ids(None, None, 'cancelado'), [self.cancelado.pk])
+        self.assertEqual(ids(None, None, None, self.cirurgia.pk), [self.segundo.pk])
+
+    def test_csv(self):
+        resposta, corpo = self.exportar(data_fim=(SEGUNDA + timedelta(days=1)).isoformat())
+        self.assertEqual(resposta['Content-Type'], 'text/csv; charset=utf-8')
+        self.assertIn('agendamentos.csv', resposta['Content-Disposition'])
+        registros = list(csv.DictReader(io.StringIO(corpo.decode())))
+        self.assertEqual([int(r['id']) for r in registros], [self.primeiro.pk, self.segundo.pk])
+        self.assertEqual(registros[0]['observacoes'], 'Jejum, 8h')
+        self.assertEqual(registros[1]['preco'], '500.00')
+        self.assertEqual(registros[0]['data_hora'], momento(SEGUNDA, '10:00').isoformat())
+
+    def test_ndjson_gzip(self):
+        resposta, corpo = self.exportar(formato='ndjson', gzip='true', status='cancelado')
+        self.assertEqual(resposta['Content-Type'], 'application/gzip')
+        self.assertIn('agendamentos.ndjson.gz', resposta['Content-Disposition'])
+        linhas = [json.loads(linha) for linha in gzip.decompress(corpo).decode().splitlines()]
+        self.assertEqual([(l['id'], l['status'], l['pet']) for l in linhas], [(self.cancelado.pk, 'cancelado', 'Rex')])
+
+    def test_parametros_invalidos(self):
+        cliente = self.api(self.leitor)
+        for parametros in [{'formato': 'xml'}, {'data_inicio': '04/03/2030'}, {'servico_id': 'x'}]:
+            self.assertEqual(cliente.get('/api/admin/agendamentos/exportar/', parametros).status_code, 400)
+
+    def test_exige_permissao(self):
+        self.assertEqual(self.api(self.cliente).get('/api/admin/agendamentos/exportar/').status_code, 403)
+
+    def test_comando_gzip(self):
+        with tempfile.TemporaryDirectory() as pasta:
+            saida = os.path.join(pasta, 'agendamentos.csv.gz')
+            call_command(
+                'exportar_agendamentos', '--gzip', '--saida', saida, '--status', 'confirmado', stderr=io.StringIO()
+            )
+            with gzip.open(saida, 'rt') as arquivo:
+                registros = list(csv.DictReader(arquivo))
+        self.assertEqual([int(r['id']) for r in registros], [self.primeiro.pk, self.segundo.pk])
+
+
+class SeriesTests(AgendaTestCase):
+    """
+    Geração e materialização em lote das ocorrências de séries recorrentes
+    """
+
+    def serie(self, **campos):
+        campos.setdefault('inicio', momento(SEGUNDA, '10:00'))
+        campos.setdefault('quantidade', 4)
+        return SerieAgendamento.objects.create(
+            empresa=self.empresa,
+            cliente=self.cliente,
+            animal=self.animal,
+            servico=self.consulta,
+            **campos
+        )
+
+    def test_ocorrencias_semanais(self):
+        serie = self.serie(intervalo=2)
+        self.assertEqual(list(serie.ocorrencias()), [
+            momento(SEGUNDA + timedelta(weeks=n), '10:00') for n in (0, 2, 4, 6)
+        ])
+
+    def test_ocorrencias_mensais_no_fim_do_mes(self):
+        serie = self.serie(inicio=momento(date(2030, 1, 31), '10:00'), frequencia='mensal')
+        dias = [timezone.localtime(data_hora).date() for data_hora in serie.ocorrencias()]
+        self.assertEqual(dias, [date(2030, 1, 31), date(2030, 2, 28), date(2030, 3, 31), date(2030, 4, 30)])
+
+    def test_ate_encerra_a_serie(self):
+        serie = self.serie(frequencia='diaria', quantidade=None, ate=SEGUNDA + timedelta(days=2))
+        self.assertEqual(len(list(serie.ocorrencias())), 3)
+
+    def test_materializa_em_um_unico_insert(self):
+        serie = self.serie()
+        tabela = Agendamento._meta.db_table
+        with self.captureOnCommitCallbacks() as avisos, CaptureQueriesContext(connection) as consultas:
+            criados, conflitos = series.materializar_serie(serie, 4)
+        inserts = [q for q in consultas.captured_queries if q['sql'].startswith(f'INSERT INTO "{tabela}"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(conflitos, [])
+        self.assertEqual([a.data_hora for a in criados], list(serie.ocorrencias()))
+        self.assertTrue(all(a.periodo is not None and a.serie_id == serie.pk for a in criados))
+        # Um aviso do feed por agendamento, mesmo sem save()
+        self.assertGreaterEqual(len(avisos), 4)
+        self.assertEqual(
+            AgendamentoDiario.objects.filter(servico=self.consulta).aggregate(total=Sum('quantidade'))['total'], 4
+        )
+
+    def test_continua_apos_a_ultima_ocorrencia(self):
+        serie = self.serie()
+        series.materializar_serie(serie, 2)
+        criados, _ = series.materializar_serie(serie, 5)
+        self.assertEqual([a.data_hora for a in criados], list(serie.ocorrencias())[2:])
+
+    def test_conflito_e_tudo_ou_nada(self):
+        serie = self.serie()
+        self.agendar(momento(SEGUNDA + timedelta(weeks=1), '10:00'), cliente=self.outro_cliente)
+        self.agendar(momento(SEGUNDA + timedelta(weeks=3), '09:30'), self.cirurgia, cliente=self.outro_cliente)
+        with self.assertRaises(series.ConflitoSerie) as erro:
+            series.materializar_serie(serie, 4)
+        self.assertEqual(erro.exception.conflitos, [
+            momento(SEGUNDA + timedelta(weeks=1), '10:00'),
+            momento(SEGUNDA + timedelta(weeks=3), '10:00'),
+        ])
+        self.assertFalse(serie.agendamentos.exists())
+
+    def test_ignorar_conflitos_grava_as_livres(self):
+        serie = self.serie()
+        self.agendar(momento(SEGUNDA + timedelta(weeks=1), '10:00'), cliente=self.outro_cliente)
+        criados, conflitos = series.materializar_serie(serie, 4, ignorar_conflitos=True)
+        self.assertEqual(conflitos, [momento(SEGUNDA + timedelta(weeks=1), '10:00')])
+        self.assertEqual(len(criados), 3)
+        self.assertEqual(serie.agendamentos.count(), 3)
+
+    def test_ocorrencia_fora_do_expediente(self):
+        serie = self.serie(inicio=momento(SEGUNDA, '17:30'), quantidade=2)
+        serie.servico = self.cirurgia
+        self.assertEqual(
+            series.verificar_ocorrencias(serie, list(serie.ocorrencias())),
+            list(serie.ocorrencias())
+        )
+
+    def test_api_responde_os_conflitos(self):
+        # A view grava as séries na empresa padrão (id 1)
+        Empresa.objects.get_or_create(id=1, defaults={'nome': 'AgendaVet'})
+        self.agendar(momento(SEGUNDA + timedelta(weeks=1), '10:00'), cliente=self.outro_cliente)
+        cliente = self.api(self.cliente)
+        resposta = cliente.post('/api/agendamentos/series/', {
+            'animal': self.animal.pk,
+            'servico': self.consulta.pk,
+            'inicio': momento(SEGUNDA, '10:00').isoformat(),
+            'quantidade': 3,
+        }, format='json')
+        self.assertEqual(resposta.status_code, 409)
+        self.assertEqual(len(resposta.data['conflitos']), 1)
+        self.assertFalse(SerieAgendamento.objects.exists())
+
+
+class AgendamentosSemProfissionalTests(AgendaTestCase):
+    """
+    Agendamentos sem profissional depois que os profissionais têm disponibilidade cadastrada
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.vet_a = Usuario.objects.create(username='vet-a', tipo='profissional')
+        cls.vet_b = Usuario.objects.create(username='vet-b', tipo='profissional')
+        for profissional in (cls.vet_a, cls.vet_b):
+            DisponibilidadeProfissional.objects.create(
+                profissional=profissional,
+                dia_semana=0,
+                hora_inicio=datetime.strptime('08:00', '%H:%M').time(),
+                hora_fim=datetime.strptime('09:00', '%H:%M').time(),
+            )
+
+    def horarios(self):
+        return disponibilidade.horarios_disponiveis_dia(SEGUNDA)
+
+    def test_ocupa_uma_das_agendas(self):
+        self.agendar(momento(SEGUNDA, '08:00'))
+        self.assertEqual(self.horarios(), ['08:00', '08:30'])
+        self.agendar(momento(SEGUNDA, '08:00'), profissional=self.vet_b)
+        self.assertEqual(self.horarios(), ['08:30'])
+
+    def test_escolhe_a_agenda_mais_livre(self):
+        self.agendar(momento(SEGUNDA, '08:00'), profissional=self.vet_a)
+        self.agendar(momento(SEGUNDA, '08:00'))
+        self.assertEqual(self.horarios(), ['08:30'])
+
+    def test_escolher_profissional_desvia_do_agendamento_sem_profissional(self):
+        self.agendar(momento(SEGUNDA, '08:00'))
+        self.assertIn(
+            disponibilidade.escolher_profissional(momento(SEGUNDA, '08:00'), 30),
+            (self.vet_a.pk, self.vet_b.pk),
+        )
+        self.agendar(momento(SEGUNDA, '08:00'), profissional=self.vet_a)
+        with self.assertRaises(disponibilidade.HorarioIndisponivel):
+            disponibilidade.escolher_profissional(momento(SEGUNDA, '08:00'), 30)
+
+    def test_serie_sem_profissional_usa_a_clinica(self):
+        serie = SerieAgendamento.objects.create(
+            empresa=self.empresa,
+            cliente=self.cliente,
+            animal=self.animal,
+            servico=self.consulta,
+            inicio=momento(SEGUNDA, '08:00'),
+            quantidade=3,
+        )
+        self.agendar(momento(SEGUNDA + timedelta(days=7), '08:00'), profissional=self.vet_a)
+        self.agendar(momento(SEGUNDA + timedelta(days=14), '08:00'), profissional=self.vet_a)
+        self.agendar(momento(SEGUNDA + timedelta(days=14), '08:00'), profissional=self.vet_b)
+        ocorrencias = series.proximas_ocorrencias(serie, 3)
+        self.assertEqual(series.verificar_ocorrencias(serie, ocorrencias), [ocorrencias[2]])
+
+
+class ResumoDiarioTests(AgendaTestCase):
+    """
+    Deltas aplicados ao resumo diário pelos signals de gravação e exclusão
+    """
+
+    def resumo(self):
+        """
+        Retorna {(data, serviço, status): (quantidade, receita)} das linhas do resumo
+        """
+        return {
+            (data, servico_id, status): (quantidade, receita)
+            for data, servico_id, status, quantidade, receita in AgendamentoDiario.objects.values_list(
+                'data', 'servico_id', 'status', 'quantidade', 'receita'
+            )
+        }
+
+    def test_criacao(self):
+        self.agendar(momento(SEGUNDA, '10:00'), status='pendente')
+        self.agendar(momento(SEGUNDA, '11:00'), status='pendente')
+        self.assertEqual(self.resumo(), {
+            (SEGUNDA, self.consulta.pk, 'pendente'): (2, Decimal('160.00')),
+        })
+
+    def test_dia_local(self):
+        # 22:30 em São Paulo já é o dia seguinte em UTC
+        self.agendar(momento(SEGUNDA, '22:30'))
+        self.assertEqual(list(self.resumo()), [(SEGUNDA, self.consulta.pk, 'confirmado')])
+
+    def test_troca_de_status(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'), status='pendente')
+        agendamento.status = 'confirmado'
+        agendamento.save(update_fields=['status'])
+        self.assertEqual(self.resumo(), {
+            (SEGUNDA, self.consulta.pk, 'pendente'): (0, Decimal('0.00')),
+            (SEGUNDA, self.consulta.pk, 'confirmado'): (1, Decimal('80.00')),
+        })
+
+    def test_remarcacao_e_troca_de_servico(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'))
+        terca = SEGUNDA + timedelta(days=1)
+        agendamento.data_hora = momento(terca, '10:00')
+        agendamento.servico = self.cirurgia
+        agendamento.save()
+        self.assertEqual(self.resumo(), {
+            (SEGUNDA, self.consulta.pk, 'confirmado'): (0, Decimal('0.00')),
+            (terca, self.cirurgia.pk, 'confirmado'): (1, Decimal('500.00')),
+        })
+
+    def test_gravacao_sem_campos_do_resumo(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'))
+        agendamento.observacoes = 'Trazer exames'
+        agendamento.save(update_fields=['observacoes'])
+        agendamento.save()
+        self.assertEqual(self.resumo(), {
+            (SEGUNDA, self.consulta.pk, 'confirmado'): (1, Decimal('80.00')),
+        })
+
+    def test_exclusao(self):
+        agendamento = self.agendar(momento(SEGUNDA, '10:00'))
+        self.agendar(momento(SEGUNDA, '11:00'))
+        agendamento.delete()
+        self.assertEqual(self.resumo(), {
+            (SEGUNDA, self.consulta.pk, 'confirmado'): (1, Decimal('80.00')),
+        })
+        Agendamento.objects.all().delete()
+        self.assertEqual(self.resumo(), {
+            (SEGUNDA, self.consulta.pk, 'confirmado'): (0, Decimal('0.00')),
+        })
+
+    def test_exclusao_do_servico_remove_as_linhas(self):
+        self.agendar(momento(SEGUNDA, '10:00'), self.cirurgia)
+        self.agendar(momento(SEGUNDA, '14:00'))
+        self.cirurgia.delete()
+        self.assertEqual(self.resumo(), {
+            (SEGUNDA, self.consulta.pk, 'confirmado'): (1, Decimal('80.00')),
+        })
+
+    def test_novo_preco_recalcula_a_receita(self):
+        self.agendar(momento(SEGUNDA, '10:00'))
+        self.agendar(momento(SEGUNDA, '11:00'))
+        self.consulta.preco = Decimal('95.50')
+        self.consulta.save()
+        self.assertEqual(self.resumo(), {
+            (SEGUNDA, self.consulta.pk, 'confirmado'): (2, Decimal('191.00')),
+        })
+
+    def test_alteracao_sem_mudar_o_preco_nao_regrava_o_resumo(self):
+        self.agendar(momento(SEGUNDA, '10:00'))
+        self.consulta.nome = 'Consulta geral'
+        self.consulta.preco = '80.00'
+        with CaptureQueriesContext(connection) as consultas:
+            self.consulta.save()
+        tabela = AgendamentoDiario._meta.db_table
+        self.assertFalse([q for q in consultas.captured_queries if tabela in q['sql']])
+        with CaptureQueriesContext(connection) as consultas:
+            self.consulta.save(update_fields=['nome'])
+        self.assertEqual(len(consultas.captured_queries), 1)
+
+
+class RelatoriosTests(AgendaTestCase):
+    """
+    Agrupamento, períodos sem movimento e comparação dos relatórios sobre o resumo diário
+    """
+
+    def setUp(self):
+        super().setUp()
+        quarta = SEGUNDA + timedelta(days=2)
+        self.agendar(momento(SEGUNDA, '10:00'))
+        self.agendar(momento(SEGUNDA, '11:00'), self.cirurgia, status='realizado')
+        self.agendar(momento(SEGUNDA, '14:00'), status='cancelado')
+        self.agendar(momento(quarta, '10:00'), status='realizado')
+        # Semana anterior e mesma semana do ano anterior, para as comparações
+        self.agendar(momento(SEGUNDA - timedelta(days=7), '10:00'))
+        self.agendar(momento(date(2029, 3, 5), '10:00'), self.cirurgia, status='realizado')
+
+    def chaves(self, resultado):
+        return [grupo['chave'] for grupo in resultado['grupos']]
+
+    def test_agrupado_por_dia_completa_os_dias_sem_movimento(self):
+        resultado = relatorios.gerar('agendamentos', SEGUNDA, SEGUNDA + timedelta(days=4))
+        self.assertEqual(self.chaves(resultado), [SEGUNDA + timedelta(days=dias) for dias in range(5)])
+        segunda, terca = resultado['grupos'][:2]
+        self.assertEqual(segunda, {
+            'chave': SEGUNDA, 'total': 3, 'pendente': 0, 'confirmado': 1, 'realizado': 1, 'cancelado': 1,
+        })
+        self.assertEqual(terca, {
+            'chave': SEGUNDA + timedelta(days=1), 'total': 0, 'pendente': 0, 'confirmado': 0, 'realizado': 0,
+            'cancelado': 0,
+        })
+        self.assertEqual(resultado['totais']['total'], 4)
+
+    def test_agrupado_por_semana_e_mes(self):
+        # O período começa numa sexta: a primeira semana é a da segunda anterior, mas só conta o que está no período
+        semanas = relatorios.gerar('agendamentos', date(2030, 3, 1), date(2030, 3, 14), agrupar_por='semana')
+        self.assertEqual(self.chaves(semanas), [date(2030, 2, 25), SEGUNDA, date(2030, 3, 11)])
+        self.assertEqual([grupo['total'] for grupo in semanas['grupos']], [0, 4, 0])
+
+        meses = relatorios.gerar('agendamentos', date(2030, 1, 1), date(2030, 3, 31), agrupar_por='mes')
+        self.assertEqual(self.chaves(meses), [date(2030, 1, 1), date(2030, 2, 1), date(2030, 3, 1)])
+        self.assertEqual([grupo['total'] for grupo in meses['grupos']], [0, 1, 4])
+
+    def test_agrupado_por_servico_e_status(self):
+        fim = SEGUNDA + timedelta(days=6)
+        servicos = relatorios.gerar('agendamentos', SEGUNDA, fim, agrupar_por='servico')
+        self.assertEqual(
+            [(grupo['chave'], grupo['rotulo'], grupo['total']) for grupo in servicos['grupos']],
+            [(self.consulta.pk, 'Consulta', 3), (self.cirurgia.pk, 'Cirurgia', 1)],
+        )
+
+        # Todos os status aparecem, mesmo sem agendamentos
+        por_status = relatorios.gerar('agendamentos', SEGUNDA, fim, agrupar_por='status')
+        self.assertEqual(self.chaves(por_status), relatorios.STATUS)
+        self.assertEqual([grupo['total'] for grupo in por_status['grupos']], [0, 1, 2, 1])
+
+    def test_financeiro(self):
+        resultado = relatorios.gerar('financeiro', SEGUNDA, SEGUNDA + timedelta(days=6))
+        self.assertEqual(resultado['totais'], {
+            'agendamentos': 3,
+            'receita_prevista': 660.0,
+            'receita_realizada': 580.0,
+            'receita_cancelada': 80.0,
+            'ticket_medio': 220.0,
+        })
+        self.assertEqual(resultado['grupos'][1]['ticket_medio'], 0)
+
+    def test_filtros(self):
+        resultado = relatorios.gerar(
+            'agendamentos', SEGUNDA, SEGUNDA + timedelta(days=6), servico_id=self.consulta.pk, status='realizado'
+        )
+        self.assertEqual(resultado['totais']['total'], 1)
+        self.assertEqual(resultado['totais']['realizado'], 1)
+
+    def test_comparacao_com_periodo_anterior(self):
+        resultado = relatorios.gerar(
+            'agendamentos', SEGUNDA, SEGUNDA + timedelta(days=6), comparar='periodo_anterior'
+        )
+        comparacao = resultado['comparacao']
+        self.assertEqual((comparacao['data_inicio'], comparacao['data_fim']), (date(2030, 2, 25), date(2030, 3, 3)))
+        self.assertEqual(len(comparacao['grupos']), 7)
+        self.assertEqual(comparacao['totais']['total'], 1)
+        self.assertEqual(comparacao['variacao']['total'], 300.0)
+        self.assertEqual(comparacao['variacao']['confirmado'], 0.0)
+        # Sem base de comparação não há variação percentual
+        self.assertIsNone(comparacao['variacao']['realizado'])
+
+    def test_comparacao_com_ano_anterior(self):
+        resultado = relatorios.gerar(
+            'financeiro', SEGUNDA, SEGUNDA + timedelta(days=6), agrupar_por='semana', comparar='ano_anterior'
+        )
+        comparacao = resultado['comparacao']
+        self.assertEqual((comparacao['data_inicio'], comparacao['data_fim']), (date(2029, 3, 4), date(2029, 3, 10)))
+        self.assertEqual(comparacao['totais']['receita_realizada'], 500.0)
+        self.assertEqual(comparacao['variacao']['receita_realizada'], 16.0)
+
+    def test_periodo_comparacao_em_29_de_fevereiro(self):
+        self.assertEqual(
+            relatorios.periodo_comparacao(date(2032, 2, 1), date(2032, 2, 29), 'ano_anterior'),
+            (date(2031, 2, 1), date(2031, 2, 28)),
+        )
+
+    def test_parametros_invalidos(self):
+        for argumentos in (
+            {'data_inicio': SEGUNDA, 'data_fim': SEGUNDA - timedelta(days=1)},
+            {'data_inicio': SEGUNDA, 'data_fim': SEGUNDA + timedelta(days=relatorios.LIMITE_DIAS)},
+            {'data_inicio': SEGUNDA, 'data_fim': SEGUNDA, 'agrupar_por': 'hora'},
+            {'data_inicio': SEGUNDA, 'data_fim': SEGUNDA, 'comparar': 'semestre'},
+        ):
+            with self.subTest(**argumentos), self.assertRaises(relatorios.ParametroInvalido):
+                relatorios.gerar('agendamentos', **argumentos)
+
+    def test_endpoint(self):
+        usuario = Usuario.objects.create(username='gerente', tipo='profissional')
+        role = Role.objects.create(name='gerencia', display_name='Gerência')
+        permissao, _ = Permission.objects.get_or_create(resource='relatorios', action='read')
+        RolePermission.objects.create(role=role, permission=permissao)
+        UserRole.objects.create(user=usuario, role=role)
+        cliente = self.api(usuario)
+
+        resposta = cliente.get('/api/admin/relatorios/financeiro/', {
+            'data_inicio': '2030-03-04', 'data_fim': '2030-03-10', 'agrupar_por': 'semana',
+        })
+        self.assertEqual(resposta.status_code, 200)
+        self.assertEqual(resposta.data['totais']['receita_prevista'], 660.0)
+
+        resposta = cliente.get('/api/admin/relatorios/agendamentos/', {'agrupar_por': 'hora'})
+        self.assertEqual(resposta.status_code, 400)
+        resposta = cliente.get('/api/admin/relatorios/agendamentos/', {'data_inicio': '04/03/2030'})
+        self.assertEqual(resposta.status_code, 400)
+
+        resposta = self.api(self.cliente).get('/api/admin/relatorios/agendamentos/')
+        self.assertEqual(resposta.status_code, 403)
+
+
+class BenchmarkIndicesTests(TestCase):
+
+    @override_settings(DEBUG=False)
+    def test_recusa_rodar_sem_debug_ou_force(self):
+        with self.assertRaisesMessage(CommandError, 'ACCESS EXCLUSIVE'):
+            call_command('benchmark_indices', agendamentos=10, clientes=2, repeticoes=1)
+        self.assertFalse(Agendamento.objects.exists())
 
-# Create your tests here.
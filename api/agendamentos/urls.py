@@ -12,7 +12,16 @@ urlpatterns = [
     path('listar/', views.listar_todos_agendamentos, name='listar_todos_agendamentos'),
     path('listar-cliente/', views.listar_agendamentos_cliente, name='listar_agendamentos_cliente'),
     path('criar/', views.criar_agendamento, name='criar_agendamento'),
+    path('reservas/', views.reservar_horario, name='reservar_horario'),
+    path('reservas/<uuid:token>/', views.liberar_reserva, name='liberar_reserva'),
+    path('series/', views.series_agendamento, name='series_agendamento'),
+    path('lista-espera/', views.lista_espera_cliente, name='lista_espera_cliente'),
+    path('lista-espera/<int:pedido_id>/', views.sair_lista_espera, name='sair_lista_espera'),
+    path('series/<int:serie_id>/materializar/', views.materializar_serie, name='materializar_serie'),
+    path('series/<int:serie_id>/ocorrencias/', views.ocorrencias_serie, name='ocorrencias_serie'),
     path('horarios-disponiveis/', views.horarios_disponiveis, name='horarios_disponiveis'),
+    path('horarios-disponiveis/periodo/', views.horarios_disponiveis_periodo, name='horarios_disponiveis_periodo'),
+    path('proximos-horarios/', views.proximos_horarios, name='proximos_horarios'),
     path('<int:agendamento_id>/confirmar/', views.confirmar_agendamento, name='confirmar_agendamento'),
     path('<int:agendamento_id>/cancelar/', views.cancelar_agendamento, name='cancelar_agendamento'),
     path('recentes/', views.agendamentos_recentes, name='agendamentos_recentes'),
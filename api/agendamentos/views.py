@@ -1,16 +1,151 @@
 from django.shortcuts import render
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse, StreamingHttpResponse
 from rest_framework import viewsets, status, permissions
 from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from datetime import datetime, timedelta
+from django.db import IntegrityError, transaction
 from django.db.models import Sum, Count
-from .models import Agendamento
-from .serializers import AgendamentoSerializer
+from .models import Agendamento, ListaEspera, SerieAgendamento, CONSTRAINT_SOBREPOSICAO, inicio_do_dia
+from .serializers import AgendamentoSerializer, ListaEsperaSerializer, SerieAgendamentoSerializer
+from . import disponibilidade, eventos, exportacao, lista_espera, paginacao, relatorios, reservas, series
 from usuarios.models import Usuario
 from animais.models import Animal
 from servicos.models import Servico
+from core import metricas, rbac
 from core.permissions import PermissionChecker, require_permission
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
+
+def _is_conflito_horario(erro):
+    """
+    Verifica se o IntegrityError veio da constraint de sobreposição de horários
+    """
+    return CONSTRAINT_SOBREPOSICAO in str(erro)
+
+
+def _conflito_response():
+    """
+    Resposta padrão para tentativa de agendar um horário já ocupado
+    """
+    return Response({
+        'error': 'Horário não disponível'
+    }, status=status.HTTP_409_CONFLICT)
+
+
+def _listar(request, agendamentos, serializar):
+    """
+    Responde a listagem completa ou, se solicitada, uma página por cursor
+    
+    Sem paginação a resposta continua sendo a lista; com ela, vira
+    {'resultados': [...], 'proximo_cursor': token ou None}.
+    """
+    if not paginacao.paginacao_solicitada(request):
+        return Response(serializar(agendamentos))
+    
+    try:
+        pagina, proximo = paginacao.paginar(agendamentos, request)
+    except paginacao.CursorInvalido as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    return Response({
+        'resultados': serializar(pagina),
+        'proximo_cursor': proximo
+    })
+
+
+def _serializar_agendamentos(agendamentos):
+    return AgendamentoSerializer(agendamentos, many=True).data
+
+
+def _salvar_status(agendamento):
+    """
+    Grava apenas o status do agendamento
+
+    Agendamentos legados que já se sobrepunham a outro ficaram sem período
+    (ver migração 0005); regravar o período ao mudar só o status faria a
+    exclusion constraint recusar a alteração.
+    """
+    agendamento.save(update_fields=['status'])
+
+
+def _parse_data_hora(valor):
+    """
+    Converte a data/hora recebida (string ISO ou datetime) em um datetime com fuso, ou None se inválida
+    """
+    data_hora = parse_datetime(valor) if isinstance(valor, str) else valor
+    if data_hora is not None and timezone.is_naive(data_hora):
+        data_hora = timezone.make_aware(data_hora)
+    return data_hora
+
+
+def _salvar_agendamento(serializer, cliente, token=None):
+    """
+    Grava o agendamento validado pelo serializer em nome do cliente e retorna-o
+
+    Com o token de uma reserva do cliente, o horário, o serviço e o
+    profissional vêm da reserva, que é consumida. Sem ele, o profissional
+    disponível menos ocupado é atribuído e as reservas do cliente no mesmo
+    horário são liberadas. Deve ser chamada dentro da transação da criação;
+    levanta ReservaInvalida ou HorarioIndisponivel.
+    """
+    if token:
+        # A reserva só é consumida se o agendamento for gravado
+        reserva = reservas.consumir_reserva(token, cliente)
+        agendamento = serializer.save(
+            data_hora=reserva.data_hora,
+            servico=reserva.servico,
+            profissional_id=reserva.profissional_id
+        )
+        lista_espera.confirmar_oferta(reserva.token, agendamento)
+        return agendamento
+
+    # Sem profissional escolhido, atribuir o profissional disponível menos ocupado
+    profissional = serializer.validated_data.get('profissional')
+    profissional_id = disponibilidade.escolher_profissional(
+        serializer.validated_data['data_hora'],
+        serializer.validated_data['servico'].duracao,
+        profissional.id if profissional else None,
+        cliente.id
+    )
+    agendamento = serializer.save(profissional_id=profissional_id)
+    # Reserva do próprio cliente para o horário, feita antes de agendar sem enviá-la
+    for token in reservas.liberar_reservas_do_agendamento(cliente, agendamento):
+        lista_espera.confirmar_oferta(token, agendamento)
+    return agendamento
+
+
+def _reserva_invalida_response():
+    """
+    Resposta para a criação com uma reserva vencida, de outro cliente ou inexistente
+    """
+    return Response({
+        'error': 'Reserva expirada ou inválida'
+    }, status=status.HTTP_409_CONFLICT)
+
+
+def _profissional_da_alteracao(agendamento, data_hora, servico, profissional_id, status):
+    """
+    Repete na alteração a validação de disponibilidade da criação e retorna o profissional do agendamento
+
+    Só valida quando o horário, o serviço ou o profissional mudam, ou quando
+    um agendamento cancelado é reativado. O próprio agendamento não bloqueia
+    o novo horário. Levanta HorarioIndisponivel como na criação.
+    """
+    inalterado = (
+        agendamento.status != 'cancelado'
+        and (data_hora, servico.id, profissional_id)
+        == (agendamento.data_hora, agendamento.servico_id, agendamento.profissional_id)
+    )
+    if status == 'cancelado' or inalterado:
+        return profissional_id
+    return disponibilidade.escolher_profissional(
+        data_hora, servico.duracao, profissional_id, agendamento.cliente_id, agendamento.pk
+    )
+
 
 class AgendamentoViewSet(viewsets.ModelViewSet):
     queryset = Agendamento.objects.all()
@@ -32,21 +167,53 @@ class AgendamentoViewSet(viewsets.ModelViewSet):
     
     def create(self, request, *args, **kwargs):
         # Qualquer usuário autenticado pode criar agendamento
-        return super().create(request, *args, **kwargs)
+        try:
+            with transaction.atomic():
+                return super().create(request, *args, **kwargs)
+        except reservas.ReservaInvalida:
+            return _reserva_invalida_response()
+        except disponibilidade.HorarioIndisponivel:
+            return _conflito_response()
+        except IntegrityError as e:
+            if _is_conflito_horario(e):
+                return _conflito_response()
+            raise
+    
+    def perform_create(self, serializer):
+        _salvar_agendamento(serializer, self.request.user, self.request.data.get('reserva'))
     
     def update(self, request, *args, **kwargs):
         agendamento = self.get_object()
         
         # Cliente pode editar apenas seus próprios agendamentos
-        if agendamento.cliente == request.user:
-            return super().update(request, *args, **kwargs)
-        
         # Admins podem editar qualquer agendamento
-        if PermissionChecker.check_permission(request.user, 'agendamentos', 'update'):
-            return super().update(request, *args, **kwargs)
+        if (agendamento.cliente == request.user or
+                PermissionChecker.check_permission(request.user, 'agendamentos', 'update')):
+            try:
+                with transaction.atomic():
+                    return super().update(request, *args, **kwargs)
+            except disponibilidade.HorarioIndisponivel:
+                return _conflito_response()
+            except IntegrityError as e:
+                if _is_conflito_horario(e):
+                    return _conflito_response()
+                raise
         
         return PermissionChecker.get_permission_response('Você não tem permissão para editar este agendamento')
     
+    def perform_update(self, serializer):
+        agendamento = serializer.instance
+        dados = serializer.validated_data
+        profissional = dados.get('profissional', agendamento.profissional)
+        profissional_id = _profissional_da_alteracao(
+            agendamento,
+            dados.get('data_hora', agendamento.data_hora),
+            dados.get('servico', agendamento.servico),
+            profissional.id if profissional else None,
+            dados.get('status', agendamento.status)
+        )
+        serializer.save(profissional_id=profissional_id)
+    
     def destroy(self, request, *args, **kwargs):
         agendamento = self.get_object()
         
@@ -67,9 +234,10 @@ def listar_agendamentos_cliente(request):
     Lista agendamentos do cliente logado
     """
     try:
-        agendamentos = Agendamento.objects.filter(cliente=request.user).order_by('-data_hora')
-        serializer = AgendamentoSerializer(agendamentos, many=True)
-        return Response(serializer.data)
+        agendamentos = Agendamento.objects.filter(cliente=request.user).select_related(
+            'servico', 'animal', 'cliente', 'profissional'
+        ).order_by('-data_hora')
+        return _listar(request, agendamentos, _serializar_agendamentos)
     except Exception as e:
         return Response({
             'error': 'Erro ao buscar agendamentos',
@@ -84,11 +252,10 @@ def listar_todos_agendamentos(request):
     """
     try:
         agendamentos = Agendamento.objects.select_related(
-            'servico', 'animal', 'cliente'
+            'servico', 'animal', 'cliente', 'profissional'
         ).order_by('-data_hora')
         
-        serializer = AgendamentoSerializer(agendamentos, many=True)
-        return Response(serializer.data)
+        return _listar(request, agendamentos, _serializar_agendamentos)
     except Exception as e:
         return Response({
             'error': 'Erro ao buscar agendamentos',
@@ -125,31 +292,292 @@ def criar_agendamento(request):
         data['cliente'] = request.user.id
         data['empresa'] = 1  # Usar empresa padrão (ID 1 - AgendaVet)
         
-        # Verificar se a data/hora está disponível
-        data_hora = datetime.fromisoformat(data['data_hora'].replace('Z', '+00:00'))
+        serializer = AgendamentoSerializer(data=data)
+        if serializer.is_valid():
+            # A disponibilidade do horário é garantida pela constraint do banco
+            try:
+                with transaction.atomic():
+                    agendamento = _salvar_agendamento(serializer, request.user, data.get('reserva'))
+            except reservas.ReservaInvalida:
+                return _reserva_invalida_response()
+            except disponibilidade.HorarioIndisponivel:
+                return _conflito_response()
+            except IntegrityError as e:
+                if _is_conflito_horario(e):
+                    return _conflito_response()
+                raise
+            return Response(AgendamentoSerializer(agendamento).data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
-        # Verificar se já existe agendamento no mesmo horário
-        agendamento_existente = Agendamento.objects.filter(
-            data_hora=data_hora
-        ).exists()
+    except Exception as e:
+        return Response({
+            'error': 'Erro ao criar agendamento',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def reservar_horario(request):
+    """
+    Reserva temporariamente um horário enquanto o cliente conclui o agendamento
+    """
+    try:
+        data_hora = request.data.get('data_hora')
+        servico_id = request.data.get('servico')
         
-        if agendamento_existente:
+        if not data_hora or not servico_id:
             return Response({
-                'error': 'Horário não disponível'
+                'error': 'data_hora e servico são obrigatórios'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        serializer = AgendamentoSerializer(data=data)
+        data_hora = _parse_data_hora(data_hora)
+        if data_hora is None:
+            return Response({'error': 'data_hora inválida'}, status=status.HTTP_400_BAD_REQUEST)
+        
+        servico = Servico.objects.get(id=servico_id)
+        profissional_id = request.data.get('profissional') or None
+        
+        reserva = reservas.criar_reserva(request.user, servico, data_hora, profissional_id)
+        return Response({
+            'reserva': str(reserva.token),
+            'data_hora': reserva.data_hora,
+            'servico': reserva.servico_id,
+            'profissional_id': reserva.profissional_id,
+            'expira_em': reserva.expira_em
+        }, status=status.HTTP_201_CREATED)
+        
+    except Servico.DoesNotExist:
+        return Response({'error': 'Serviço não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    except disponibilidade.HorarioIndisponivel:
+        return _conflito_response()
+    except Exception as e:
+        return Response({
+            'error': 'Erro ao reservar horário',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def liberar_reserva(request, token):
+    """
+    Libera a reserva do cliente antes do vencimento
+    """
+    if not reservas.liberar_reserva(token, request.user):
+        return Response({'error': 'Reserva não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+def _get_quantidade_lote(valor, padrao):
+    """
+    Lê a quantidade de ocorrências a materializar, limitada a series.MAX_OCORRENCIAS_LOTE
+    """
+    quantidade = int(valor) if valor not in (None, '') else padrao
+    if not 1 <= quantidade <= series.MAX_OCORRENCIAS_LOTE:
+        raise ValueError(f'Quantidade deve estar entre 1 e {series.MAX_OCORRENCIAS_LOTE}')
+    return quantidade
+
+
+def _conflito_serie_response(erro):
+    """
+    Resposta para séries com ocorrências que não cabem na agenda
+    """
+    return Response({
+        'error': 'Horário não disponível',
+        'conflitos': erro.conflitos
+    }, status=status.HTTP_409_CONFLICT)
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def series_agendamento(request):
+    """
+    Lista as séries recorrentes do cliente logado ou cria uma nova série
+
+    Na criação, as primeiras ocorrências (`materializar`, por padrão toda a
+    série ou series.LOTE_PADRAO) são agendadas na mesma transação.
+    """
+    try:
+        if request.method == 'GET':
+            queryset = SerieAgendamento.objects.filter(cliente=request.user).select_related(
+                'servico', 'animal', 'profissional'
+            ).order_by('-inicio')
+            return Response(SerieAgendamentoSerializer(queryset, many=True).data)
+        
+        data = request.data.copy()
+        data['cliente'] = request.user.id
+        data['empresa'] = 1  # Usar empresa padrão (ID 1 - AgendaVet)
+        
+        serializer = SerieAgendamentoSerializer(data=data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        
+        try:
+            quantidade = _get_quantidade_lote(
+                data.get('materializar'),
+                min(serializer.validated_data.get('quantidade') or series.LOTE_PADRAO, series.MAX_OCORRENCIAS_LOTE)
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        ignorar_conflitos = str(data.get('ignorar_conflitos', 'false')).lower() == 'true'
+        
+        try:
+            with transaction.atomic():
+                # A série inteira fica com o profissional escolhido para a primeira ocorrência
+                profissional = serializer.validated_data.get('profissional')
+                profissional_id = disponibilidade.escolher_profissional(
+                    serializer.validated_data['inicio'],
+                    serializer.validated_data['servico'].duracao,
+                    profissional.id if profissional else None,
+                    request.user.id
+                )
+                serie = serializer.save(profissional_id=profissional_id)
+                criados, conflitos = series.materializar_serie(serie, quantidade, ignorar_conflitos)
+        except series.ConflitoSerie as e:
+            return _conflito_serie_response(e)
+        except disponibilidade.HorarioIndisponivel:
+            return _conflito_response()
+        except IntegrityError as e:
+            if _is_conflito_horario(e):
+                return _conflito_response()
+            raise
+        
+        return Response({
+            'serie': SerieAgendamentoSerializer(serie).data,
+            'agendamentos': AgendamentoSerializer(criados, many=True).data,
+            'conflitos': conflitos
+        }, status=status.HTTP_201_CREATED)
+        
+    except Exception as e:
+        return Response({
+            'error': 'Erro ao processar série de agendamentos',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+def materializar_serie(request, serie_id):
+    """
+    Agenda as próximas ocorrências de uma série recorrente
+    """
+    try:
+        serie = SerieAgendamento.objects.select_related('servico', 'animal', 'cliente', 'profissional').get(id=serie_id)
+        
+        if (serie.cliente != request.user and
+                not PermissionChecker.check_permission(request.user, 'agendamentos', 'update')):
+            return PermissionChecker.get_permission_response('Você não tem permissão para alterar esta série')
+        
+        try:
+            quantidade = _get_quantidade_lote(request.data.get('quantidade'), series.LOTE_PADRAO)
+        except ValueError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        ignorar_conflitos = str(request.data.get('ignorar_conflitos', 'false')).lower() == 'true'
+        
+        try:
+            criados, conflitos = series.materializar_serie(serie, quantidade, ignorar_conflitos)
+        except series.ConflitoSerie as e:
+            return _conflito_serie_response(e)
+        except IntegrityError as e:
+            if _is_conflito_horario(e):
+                return _conflito_response()
+            raise
+        
+        return Response({
+            'agendamentos': AgendamentoSerializer(criados, many=True).data,
+            'conflitos': conflitos
+        }, status=status.HTTP_201_CREATED)
+        
+    except SerieAgendamento.DoesNotExist:
+        return Response({'error': 'Série não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'error': 'Erro ao materializar série',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def ocorrencias_serie(request, serie_id):
+    """
+    Expande as ocorrências de uma série no período inicio/fim, indicando as já agendadas
+    """
+    try:
+        inicio, fim = _parse_periodo(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        serie = SerieAgendamento.objects.get(id=serie_id)
+        
+        if (serie.cliente != request.user and
+                not PermissionChecker.check_permission(request.user, 'agendamentos', 'read')):
+            return PermissionChecker.get_permission_response('Você não tem permissão para ver esta série')
+        
+        janela_inicio = inicio_do_dia(inicio)
+        janela_fim = inicio_do_dia(fim + timedelta(days=1))
+        agendados = {
+            data_hora: (agendamento_id, status_agendamento)
+            for agendamento_id, data_hora, status_agendamento in serie.agendamentos.no_intervalo(
+                inicio, fim
+            ).values_list('id', 'data_hora', 'status')
+        }
+        
+        ocorrencias = []
+        for data_hora in serie.ocorrencias(janela_inicio, janela_fim):
+            agendamento_id, status_agendamento = agendados.get(data_hora, (None, None))
+            ocorrencias.append({
+                'data_hora': data_hora,
+                'agendamento_id': agendamento_id,
+                'status': status_agendamento
+            })
+        return Response(ocorrencias)
+        
+    except SerieAgendamento.DoesNotExist:
+        return Response({'error': 'Série não encontrada'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'error': 'Erro ao buscar ocorrências da série',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+@api_view(['GET', 'POST'])
+@permission_classes([permissions.IsAuthenticated])
+def lista_espera_cliente(request):
+    """
+    Lista os pedidos de lista de espera do cliente logado ou cria um novo pedido
+    """
+    try:
+        if request.method == 'GET':
+            pedidos = ListaEspera.objects.filter(cliente=request.user).select_related(
+                'servico', 'animal', 'agendamento'
+            ).order_by('-criado_em')
+            return Response(ListaEsperaSerializer(pedidos, many=True).data)
+        
+        data = request.data.copy()
+        data['cliente'] = request.user.id
+        data['empresa'] = 1  # Usar empresa padrão (ID 1 - AgendaVet)
+        
+        serializer = ListaEsperaSerializer(data=data)
         if serializer.is_valid():
-            agendamento = serializer.save()
-            return Response(AgendamentoSerializer(agendamento).data, status=status.HTTP_201_CREATED)
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
         
     except Exception as e:
         return Response({
-            'error': 'Erro ao criar agendamento',
+            'error': 'Erro ao processar lista de espera',
             'detail': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
+@api_view(['DELETE'])
+@permission_classes([permissions.IsAuthenticated])
+def sair_lista_espera(request, pedido_id):
+    """
+    Remove um pedido da lista de espera do cliente logado
+    """
+    removidos, _ = ListaEspera.objects.filter(id=pedido_id, cliente=request.user).delete()
+    if not removidos:
+        return Response({'error': 'Pedido não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
 @api_view(['PATCH'])
 @permission_classes([permissions.IsAuthenticated])
 def confirmar_agendamento(request, agendamento_id):
@@ -159,13 +587,20 @@ def confirmar_agendamento(request, agendamento_id):
     try:
         agendamento = Agendamento.objects.get(id=agendamento_id)
         
-        # Atualizar status para confirmado
+        # Atualizar status para confirmado (sem regravar o período, ver _salvar_status)
         agendamento.status = 'confirmado'
-        agendamento.save()
+        _salvar_status(agendamento)
         
         # Retornar dados do agendamento usando o serializer
         serializer = AgendamentoSerializer(agendamento)
         return Response(serializer.data)
+    except IntegrityError as e:
+        if _is_conflito_horario(e):
+            return _conflito_response()
+        return Response({
+            'error': 'Erro ao confirmar agendamento',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     except Agendamento.DoesNotExist:
         return Response({
             'error': 'Agendamento não encontrado'
@@ -191,13 +626,24 @@ def cancelar_agendamento(request, agendamento_id):
                 'error': 'Sem permissão para cancelar este agendamento'
             }, status=status.HTTP_403_FORBIDDEN)
         
-        # Marcar como cancelado em vez de deletar
-        agendamento.status = 'cancelado'
-        agendamento.save()
+        # Marcar como cancelado em vez de deletar e oferecer o horário à lista de espera
+        with transaction.atomic():
+            vaga_ativa = agendamento.status != 'cancelado'
+            agendamento.status = 'cancelado'
+            _salvar_status(agendamento)
+            if vaga_ativa:
+                lista_espera.preencher_vaga(agendamento)
         
         # Retornar dados do agendamento usando o serializer
         serializer = AgendamentoSerializer(agendamento)
         return Response(serializer.data)
+    except IntegrityError as e:
+        if _is_conflito_horario(e):
+            return _conflito_response()
+        return Response({
+            'error': 'Erro ao cancelar agendamento',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     except Agendamento.DoesNotExist:
         return Response({
             'error': 'Agendamento não encontrado'
@@ -211,6 +657,26 @@ def cancelar_agendamento(request, agendamento_id):
 
 # ===== VIEWS PARA ADMIN =====
 
+def _serializar_agendamentos_admin(agendamentos):
+    data = []
+    for agendamento in agendamentos:
+        data.append({
+            'id': agendamento.id,
+            'cliente_id': agendamento.cliente.id,
+            'cliente_nome': agendamento.cliente.nome,
+            'animal_id': agendamento.animal.id,
+            'animal_nome': agendamento.animal.nome,
+            'servico_id': agendamento.servico.id,
+            'servico_nome': agendamento.servico.nome,
+            'profissional_id': agendamento.profissional_id,
+            'profissional_nome': agendamento.profissional.nome if agendamento.profissional else None,
+            'data_hora': agendamento.data_hora,
+            'observacoes': agendamento.observacoes,
+            'status': agendamento.status
+        })
+    return data
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 @require_permission('agendamentos', 'read')
@@ -218,24 +684,10 @@ def get_agendamentos_admin(request):
     """Listar todos os agendamentos para admin"""
     try:
         agendamentos = Agendamento.objects.select_related(
-            'cliente', 'animal', 'servico'
+            'cliente', 'animal', 'servico', 'profissional'
         ).order_by('-data_hora')
         
-        data = []
-        for agendamento in agendamentos:
-            data.append({
-                'id': agendamento.id,
-                'cliente_id': agendamento.cliente.id,
-                'cliente_nome': agendamento.cliente.nome,
-                'animal_id': agendamento.animal.id,
-                'animal_nome': agendamento.animal.nome,
-                'servico_id': agendamento.servico.id,
-                'servico_nome': agendamento.servico.nome,
-                'data_hora': agendamento.data_hora,
-                'observacoes': agendamento.observacoes,
-                'status': agendamento.status
-            })
-        return Response(data)
+        return _listar(request, agendamentos, _serializar_agendamentos_admin)
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
@@ -257,20 +709,34 @@ def create_agendamento_admin(request):
         animal = Animal.objects.get(id=data['animal_id'])
         servico = Servico.objects.get(id=data['servico_id'])
         
-        # Criar agendamento
-        agendamento = Agendamento.objects.create(
-            empresa=empresa,
-            cliente=cliente,
-            animal=animal,
-            servico=servico,
-            data_hora=data['data_hora'],
-            observacoes=data.get('observacoes', '')
+        # Sem profissional escolhido, atribuir o profissional disponível menos ocupado
+        data_hora = _parse_data_hora(data['data_hora'])
+        profissional_id = disponibilidade.escolher_profissional(
+            data_hora, servico.duracao, data.get('profissional_id') or None
         )
         
+        # Criar agendamento
+        with transaction.atomic():
+            agendamento = Agendamento.objects.create(
+                empresa=empresa,
+                cliente=cliente,
+                animal=animal,
+                servico=servico,
+                profissional_id=profissional_id,
+                data_hora=data_hora,
+                observacoes=data.get('observacoes', '')
+            )
+        
         return Response({
             'id': agendamento.id,
             'message': 'Agendamento criado com sucesso'
         })
+    except disponibilidade.HorarioIndisponivel:
+        return _conflito_response()
+    except IntegrityError as e:
+        if _is_conflito_horario(e):
+            return _conflito_response()
+        return Response({'error': str(e)}, status=400)
     except Empresa.DoesNotExist:
         return Response({'error': 'Empresa não encontrada'}, status=404)
     except Usuario.DoesNotExist:
@@ -283,19 +749,180 @@ def create_agendamento_admin(request):
         return Response({'error': str(e)}, status=400)
 
 
+# Maior número de candidatos aceitos em uma verificação de conflitos
+MAX_CANDIDATOS_CONFLITO = 200
+
+
+@api_view(['POST'])
+@permission_classes([permissions.IsAuthenticated])
+@require_permission('agendamentos', 'read')
+def verificar_conflitos_admin(request):
+    """Verificar conflitos de vários horários candidatos de uma só vez"""
+    try:
+        candidatos = request.data.get('candidatos')
+        
+        if not isinstance(candidatos, list) or not candidatos:
+            return Response({'error': 'Informe a lista de candidatos'}, status=400)
+        if len(candidatos) > MAX_CANDIDATOS_CONFLITO:
+            return Response({'error': f'Máximo de {MAX_CANDIDATOS_CONFLITO} candidatos por verificação'}, status=400)
+        
+        # Durações de todos os serviços envolvidos em uma única consulta
+        servico_ids = {candidato.get('servico_id') for candidato in candidatos}
+        duracoes = dict(Servico.objects.filter(id__in=servico_ids).values_list('id', 'duracao'))
+        
+        intervalos = []
+        for indice, candidato in enumerate(candidatos):
+            data_hora = _parse_data_hora(candidato.get('data_hora'))
+            duracao = duracoes.get(candidato.get('servico_id'))
+            if data_hora is None or duracao is None:
+                return Response({'error': f'Candidato {indice} inválido: informe data_hora e servico_id válidos'}, status=400)
+            
+            profissional_id = candidato.get('profissional_id') or None
+            intervalos.append((
+                data_hora,
+                data_hora + timedelta(minutes=duracao),
+                int(profissional_id) if profissional_id else None
+            ))
+        
+        conflitos = disponibilidade.verificar_conflitos(intervalos)
+        
+        data = []
+        for candidato, (inicio, fim, profissional_id), conflito in zip(candidatos, intervalos, conflitos):
+            data.append({
+                'data_hora': inicio,
+                'fim': fim,
+                'servico_id': candidato.get('servico_id'),
+                'profissional_id': profissional_id,
+                'livre': conflito is None,
+                'conflito_id': conflito
+            })
+        return Response(data)
+    except Exception as e:
+        return Response({'error': str(e)}, status=400)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@require_permission('agendamentos', 'read')
+def exportar_agendamentos_admin(request):
+    """Exportar agendamentos em CSV ou NDJSON, em streaming"""
+    try:
+        formato = request.GET.get('formato', 'csv')
+        if formato not in exportacao.FORMATOS:
+            return Response({'error': 'Formato deve ser csv ou ndjson'}, status=400)
+        
+        data_inicio = request.GET.get('data_inicio')
+        data_fim = request.GET.get('data_fim')
+        data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else None
+        data_fim = datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else None
+    except ValueError:
+        return Response({'error': 'Formato de data inválido. Use YYYY-MM-DD'}, status=400)
+    
+    servico_id = request.GET.get('servico_id')
+    if servico_id and not servico_id.isdigit():
+        return Response({'error': 'servico_id inválido'}, status=400)
+    
+    agendamentos = exportacao.filtrar_agendamentos(data_inicio, data_fim, request.GET.get('status'), servico_id)
+    
+    gzip = request.GET.get('gzip', '').lower() in ('1', 'true')
+    nome = f'agendamentos.{formato}' + ('.gz' if gzip else '')
+    
+    # As linhas são geradas enquanto a resposta é enviada, sem carregar o resultado em memória
+    blocos = exportacao.exportar(agendamentos, formato, gzip)
+    if isinstance(request._request, ASGIRequest):
+        # Sob ASGI um iterador síncrono seria convertido em lista antes do envio
+        blocos = exportacao.percorrer_async(blocos)
+    response = StreamingHttpResponse(
+        blocos,
+        content_type='application/gzip' if gzip else f'{exportacao.FORMATOS[formato]}; charset=utf-8'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{nome}"'
+    return response
+
+
+def _autenticar_eventos(request):
+    """
+    Retorna o usuário do token JWT da conexão SSE, ou None se inválido
+    
+    O token só é aceito no cabeçalho Authorization: na URL ele ficaria nos
+    logs de acesso do servidor e dos proxies. Por isso o frontend lê o feed
+    com fetch em vez de EventSource, que não envia cabeçalhos.
+    """
+    autenticacao = JWTAuthentication()
+    header = autenticacao.get_header(request)
+    token = autenticacao.get_raw_token(header) if header else None
+    if not token:
+        return None
+    try:
+        token = autenticacao.get_validated_token(token)
+        usuario = autenticacao.get_user(token)
+    except (InvalidToken, TokenError):
+        return None
+    rbac.aplicar_claims(usuario, token)
+    return usuario
+
+
+async def eventos_agendamentos_admin(request):
+    """Feed SSE das alterações de agendamentos entre inicio e fim (YYYY-MM-DD, opcionais)"""
+    if request.method != 'GET':
+        return JsonResponse({'error': 'Método não permitido'}, status=405)
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({'error': 'O feed de eventos requer o servidor ASGI'}, status=501)
+    
+    usuario = await sync_to_async(_autenticar_eventos)(request)
+    if usuario is None:
+        return JsonResponse({'error': 'Token inválido ou ausente'}, status=401)
+    if not await sync_to_async(PermissionChecker.check_permission)(usuario, 'agendamentos', 'read'):
+        return JsonResponse({'error': 'Permissão negada'}, status=403)
+    
+    try:
+        inicio = request.GET.get('inicio')
+        fim = request.GET.get('fim')
+        inicio = inicio_do_dia(datetime.strptime(inicio, '%Y-%m-%d').date()) if inicio else None
+        fim = inicio_do_dia(datetime.strptime(fim, '%Y-%m-%d').date() + timedelta(days=1)) if fim else None
+    except ValueError:
+        return JsonResponse({'error': 'Formato de data inválido. Use YYYY-MM-DD'}, status=400)
+    
+    # Reconexão do navegador: id do último evento recebido, para reenviar os perdidos
+    ultimo_id = request.headers.get('Last-Event-ID', '')
+    ultimo_id = int(ultimo_id) if ultimo_id.isdigit() else None
+    
+    assinatura, iniciais = await eventos.ouvinte.assinar(inicio, fim, ultimo_id)
+    response = StreamingHttpResponse(eventos.fluxo(assinatura, iniciais), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Impede que proxies (nginx) acumulem os eventos antes de enviar
+    response['X-Accel-Buffering'] = 'no'
+    return response
+
+
 @api_view(['PUT'])
 @permission_classes([permissions.IsAuthenticated])
 @require_permission('agendamentos', 'update')
 def update_agendamento_admin(request, agendamento_id):
     """Atualizar agendamento para admin"""
     try:
-        agendamento = Agendamento.objects.get(id=agendamento_id)
+        agendamento = Agendamento.objects.select_related('servico').get(id=agendamento_id)
         data = request.data
         
+        # Novos horário, serviço, profissional e status, validados como na criação
+        data_hora = _parse_data_hora(data['data_hora']) if 'data_hora' in data else agendamento.data_hora
+        if data_hora is None:
+            return Response({'error': 'data_hora inválida'}, status=400)
+        servico = Servico.objects.get(id=data['servico_id']) if 'servico_id' in data else agendamento.servico
+        profissional_id = agendamento.profissional_id
+        if 'profissional_id' in data:
+            profissional_id = None
+            if data['profissional_id']:
+                profissional_id = Usuario.objects.get(id=data['profissional_id'], tipo='profissional').id
+        status_novo = data.get('status', agendamento.status)
+        profissional_id = _profissional_da_alteracao(agendamento, data_hora, servico, profissional_id, status_novo)
+        
         # Atualizar campos básicos
-        agendamento.data_hora = data.get('data_hora', agendamento.data_hora)
+        agendamento.data_hora = data_hora
         agendamento.observacoes = data.get('observacoes', agendamento.observacoes)
-        agendamento.status = data.get('status', agendamento.status)
+        agendamento.status = status_novo
+        agendamento.servico = servico
+        agendamento.profissional_id = profissional_id
         
         # Atualizar relacionamentos se fornecidos
         if 'cliente_id' in data:
@@ -306,13 +933,16 @@ def update_agendamento_admin(request, agendamento_id):
             animal = Animal.objects.get(id=data['animal_id'])
             agendamento.animal = animal
         
-        if 'servico_id' in data:
-            servico = Servico.objects.get(id=data['servico_id'])
-            agendamento.servico = servico
-        
-        agendamento.save()
+        with transaction.atomic():
+            agendamento.save()
         
         return Response({'message': 'Agendamento atualizado com sucesso'})
+    except disponibilidade.HorarioIndisponivel:
+        return _conflito_response()
+    except IntegrityError as e:
+        if _is_conflito_horario(e):
+            return _conflito_response()
+        return Response({'error': str(e)}, status=400)
     except Agendamento.DoesNotExist:
         return Response({'error': 'Agendamento não encontrado'}, status=404)
     except Usuario.DoesNotExist:
@@ -335,13 +965,21 @@ def update_agendamento_status_admin(request, agendamento_id):
         data = request.data
         
         status = data.get('status', 'confirmado')
+        cancelando = status == 'cancelado' and agendamento.status != 'cancelado'
         agendamento.status = status
-        agendamento.save()
+        with transaction.atomic():
+            _salvar_status(agendamento)
+            if cancelando:
+                lista_espera.preencher_vaga(agendamento)
         
         return Response({
             'message': f'Status do agendamento atualizado para {status}',
             'status': status
         })
+    except IntegrityError as e:
+        if _is_conflito_horario(e):
+            return _conflito_response()
+        return Response({'error': str(e)}, status=400)
     except Agendamento.DoesNotExist:
         return Response({'error': 'Agendamento não encontrado'}, status=404)
     except Exception as e:
@@ -355,7 +993,10 @@ def delete_agendamento_admin(request, agendamento_id):
     """Excluir agendamento para admin"""
     try:
         agendamento = Agendamento.objects.get(id=agendamento_id)
-        agendamento.delete()
+        with transaction.atomic():
+            agendamento.delete()
+            if agendamento.status != 'cancelado':
+                lista_espera.preencher_vaga(agendamento)
         
         return Response({'message': 'Agendamento excluído com sucesso'})
     except Agendamento.DoesNotExist:
@@ -370,43 +1011,73 @@ def delete_agendamento_admin(request, agendamento_id):
 def get_agendamento_stats_admin(request):
     """Buscar estatísticas de agendamentos para admin"""
     try:
-        total_agendamentos = Agendamento.objects.count()
-        
-        # Agendamentos de hoje
-        hoje = timezone.now()
-        hoje_inicio = hoje.replace(hour=0, minute=0, second=0, microsecond=0)
-        hoje_fim = hoje.replace(hour=23, minute=59, second=59, microsecond=999999)
-        agendamentos_hoje = Agendamento.objects.filter(
-            data_hora__gte=hoje_inicio,
-            data_hora__lte=hoje_fim
-        ).count()
-        
-        # Agendamentos da semana
-        inicio_semana = hoje - timedelta(days=hoje.weekday())
-        fim_semana = inicio_semana + timedelta(days=6)
-        agendamentos_semana = Agendamento.objects.filter(
-            data_hora__gte=inicio_semana,
-            data_hora__lte=fim_semana
-        ).count()
-        
-        # Agendamentos do mês
-        inicio_mes = hoje.replace(day=1)
-        fim_mes = (inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
-        agendamentos_mes = Agendamento.objects.filter(
-            data_hora__gte=inicio_mes,
-            data_hora__lte=fim_mes
-        ).count()
+        # Total, hoje, semana (segunda a domingo) e mês em uma única leitura da tabela
+        dados = metricas.calcular_em_cache([
+            'agendamentos_total',
+            'agendamentos_hoje',
+            'agendamentos_semana',
+            'agendamentos_mes',
+        ])
         
         return Response({
-            'totalAgendamentos': total_agendamentos,
-            'agendamentosHoje': agendamentos_hoje,
-            'agendamentosSemana': agendamentos_semana,
-            'agendamentosMes': agendamentos_mes
+            'totalAgendamentos': dados['agendamentos_total'],
+            'agendamentosHoje': dados['agendamentos_hoje'],
+            'agendamentosSemana': dados['agendamentos_semana'],
+            'agendamentosMes': dados['agendamentos_mes']
         })
     except Exception as e:
         return Response({'error': str(e)}, status=400)
 
 
+def _relatorio_admin(request, relatorio):
+    """
+    Lê os parâmetros comuns dos relatórios e gera o relatório pedido
+    """
+    try:
+        hoje = timezone.localdate()
+        data_inicio = request.GET.get('data_inicio')
+        data_fim = request.GET.get('data_fim')
+        data_inicio = datetime.strptime(data_inicio, '%Y-%m-%d').date() if data_inicio else hoje.replace(day=1)
+        data_fim = datetime.strptime(data_fim, '%Y-%m-%d').date() if data_fim else hoje
+    except ValueError:
+        return Response({'error': 'Formato de data inválido. Use YYYY-MM-DD'}, status=400)
+    
+    servico_id = request.GET.get('servico_id')
+    if servico_id and not servico_id.isdigit():
+        return Response({'error': 'servico_id inválido'}, status=400)
+    
+    try:
+        return Response(relatorios.gerar(
+            relatorio,
+            data_inicio,
+            data_fim,
+            agrupar_por=request.GET.get('agrupar_por', 'dia'),
+            comparar=request.GET.get('comparar'),
+            servico_id=servico_id,
+            status=request.GET.get('status'),
+        ))
+    except relatorios.ParametroInvalido as e:
+        return Response({'error': str(e)}, status=400)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@require_permission('relatorios', 'read')
+def relatorio_agendamentos_admin(request):
+    """Relatório de agendamentos por período, com quantidades por status"""
+    return _relatorio_admin(request, 'agendamentos')
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@require_permission('relatorios', 'read')
+def relatorio_financeiro_admin(request):
+    """Relatório financeiro por período, com receita prevista, realizada e cancelada"""
+    return _relatorio_admin(request, 'financeiro')
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 @require_permission('servicos', 'read')
@@ -427,6 +1098,50 @@ def get_servicos_admin(request):
     except Exception as e:
         return Response({'error': str(e)}, status=500)
 
+def _parse_periodo(request):
+    """
+    Lê e valida os parâmetros inicio/fim de uma consulta de disponibilidade
+    """
+    inicio = request.GET.get('inicio')
+    fim = request.GET.get('fim')
+    
+    if not inicio or not fim:
+        raise ValueError('Parâmetros inicio e fim são obrigatórios')
+    
+    inicio = datetime.strptime(inicio, '%Y-%m-%d').date()
+    fim = datetime.strptime(fim, '%Y-%m-%d').date()
+    
+    if fim < inicio:
+        raise ValueError('Data de fim deve ser maior ou igual à data de início')
+    if (fim - inicio).days >= disponibilidade.MAX_DIAS_PERIODO:
+        raise ValueError(f'Período máximo de {disponibilidade.MAX_DIAS_PERIODO} dias')
+    
+    return inicio, fim
+
+
+def _get_duracao(request):
+    """
+    Retorna a duração (em minutos) do serviço informado em servico_id, ou um horário simples
+    """
+    servico_id = request.GET.get('servico_id')
+    if not servico_id:
+        return disponibilidade.INTERVALO_SLOT
+    return Servico.objects.values_list('duracao', flat=True).get(id=servico_id)
+
+
+def _get_profissional_id(request):
+    """
+    Retorna o profissional_id informado na consulta, ou None para a agenda da clínica
+    """
+    profissional_id = request.GET.get('profissional_id')
+    if not profissional_id:
+        return None
+    try:
+        return int(profissional_id)
+    except ValueError:
+        raise ValueError('profissional_id inválido')
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 def horarios_disponiveis(request):
@@ -441,43 +1156,45 @@ def horarios_disponiveis(request):
                 'error': 'Data é obrigatória'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Converter data
         data_obj = datetime.strptime(data, '%Y-%m-%d').date()
+        profissional_id = _get_profissional_id(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        duracao = _get_duracao(request)
+        return Response(disponibilidade.horarios_disponiveis_dia(
+            data_obj, duracao, profissional_id, request.user.id
+        ))
         
-        # Verificar se é fim de semana
-        weekday = data_obj.weekday()
-        if weekday == 6:  # Domingo
-            return Response([])  # Domingo fechado
-        
-        # Horários padrão disponíveis
-        if weekday == 5:  # Sábado
-            horarios_padrao = [
-                '08:00', '08:30', '09:00', '09:30', '10:00', '10:30', '11:00', '11:30'
-            ]
-        else:  # Segunda a Sexta
-            horarios_padrao = [
-                '08:00', '08:30', '09:00', '09:30', '10:00', '10:30', '11:00', '11:30', 
-                '14:00', '14:30', '15:00', '15:30', '16:00', '16:30', '17:00', '17:30'
-            ]
-        
-        # Buscar agendamentos existentes para excluir horários ocupados
-        agendamentos = Agendamento.objects.filter(
-            data_hora__date=data_obj
-        )
-        
-        # Converter horários ocupados para formato string
-        horarios_ocupados = [
-            a.data_hora.strftime('%H:%M') for a in agendamentos
-        ]
-        
-        # Filtrar horários disponíveis
-        horarios_disponiveis = [
-            horario for horario in horarios_padrao 
-            if horario not in horarios_ocupados
-        ]
-        
-        return Response(horarios_disponiveis)
-        
+    except Servico.DoesNotExist:
+        return Response({'error': 'Serviço não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'error': 'Erro ao buscar horários disponíveis',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def horarios_disponiveis_periodo(request):
+    """
+    Busca horários disponíveis de vários dias, agrupados por data
+    """
+    try:
+        inicio, fim = _parse_periodo(request)
+        profissional_id = _get_profissional_id(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        duracao = _get_duracao(request)
+        return Response(disponibilidade.horarios_disponiveis_periodo(
+            inicio, fim, duracao, profissional_id, request.user.id
+        ))
+    except Servico.DoesNotExist:
+        return Response({'error': 'Serviço não encontrado'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({
             'error': 'Erro ao buscar horários disponíveis',
@@ -485,6 +1202,40 @@ def horarios_disponiveis(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def proximos_horarios(request):
+    """
+    Busca os próximos horários livres (por padrão a partir de amanhã) para um serviço
+    """
+    try:
+        inicio = request.GET.get('inicio')
+        if inicio:
+            inicio = datetime.strptime(inicio, '%Y-%m-%d').date()
+        else:
+            inicio = timezone.localdate() + timedelta(days=1)
+        
+        quantidade = int(request.GET.get('quantidade', 5))
+        if not 1 <= quantidade <= 50:
+            raise ValueError('Quantidade deve estar entre 1 e 50')
+        profissional_id = _get_profissional_id(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        duracao = _get_duracao(request)
+        return Response(disponibilidade.proximos_horarios(
+            inicio, quantidade, duracao, profissional_id, request.user.id
+        ))
+    except Servico.DoesNotExist:
+        return Response({'error': 'Serviço não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({
+            'error': 'Erro ao buscar próximos horários',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 @require_permission('agendamentos', 'read')
@@ -498,45 +1249,41 @@ def get_horarios_disponiveis_admin(request):
                 'error': 'Data é obrigatória'
             }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Converter data
         data_obj = datetime.strptime(data, '%Y-%m-%d').date()
+        profissional_id = _get_profissional_id(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        duracao = _get_duracao(request)
+        return Response(disponibilidade.horarios_disponiveis_dia(data_obj, duracao, profissional_id))
         
-        # Verificar se é fim de semana
-        weekday = data_obj.weekday()
-        if weekday == 6:  # Domingo
-            return Response([])  # Domingo fechado
-        
-        # Horários padrão disponíveis
-        if weekday == 5:  # Sábado
-            horarios_padrao = [
-                '08:00', '08:30', '09:00', '09:30', '10:00', '10:30', '11:00', '11:30'
-            ]
-        else:  # Segunda a Sexta
-            horarios_padrao = [
-                '08:00', '08:30', '09:00', '09:30', '10:00', '10:30', '11:00', '11:30', 
-                '14:00', '14:30', '15:00', '15:30', '16:00', '16:30', '17:00', '17:30'
-            ]
-        
-        # Buscar agendamentos existentes para excluir horários ocupados
-        agendamentos = Agendamento.objects.filter(
-            data_hora__date=data_obj
-        )
-        
-        # Converter horários ocupados para formato string
-        horarios_ocupados = [
-            a.data_hora.strftime('%H:%M') for a in agendamentos
-        ]
-        
-        # Filtrar horários disponíveis
-        horarios_disponiveis = [
-            horario for horario in horarios_padrao 
-            if horario not in horarios_ocupados
-        ]
-        
-        return Response(horarios_disponiveis)
-        
+    except Servico.DoesNotExist:
+        return Response({'error': 'Serviço não encontrado'}, status=status.HTTP_404_NOT_FOUND)
     except Exception as e:
         return Response({
             'error': 'Erro ao buscar horários disponíveis',
             'detail': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+@require_permission('agendamentos', 'read')
+def get_horarios_disponiveis_periodo_admin(request):
+    """Buscar horários disponíveis de vários dias para admin"""
+    try:
+        inicio, fim = _parse_periodo(request)
+        profissional_id = _get_profissional_id(request)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    
+    try:
+        duracao = _get_duracao(request)
+        return Response(disponibilidade.horarios_disponiveis_periodo(
+            inicio, fim, duracao, profissional_id
+        ))
+    except Servico.DoesNotExist:
+        return Response({'error': 'Serviço não encontrado'}, status=status.HTTP_404_NOT_FOUND)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
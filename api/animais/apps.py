@@ -4,3 +4,6 @@ from django.apps import AppConfig
 class AnimaisConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'animais'
+
+    def ready(self):
+        from . import signals  # Registrar os receivers de signals
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('animais', '0003_animal_observacoes_animal_peso'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='animal',
+            name='atualizado_em',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        migrations.AddIndex(
+            model_name='animal',
+            index=models.Index(fields=['dono', 'atualizado_em'], name='animal_dono_sync_idx'),
+        ),
+        # O índice simples de dono fica redundante com o composto acima
+        migrations.AlterField(
+            model_name='animal',
+            name='dono',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='animais', to=settings.AUTH_USER_MODEL),
+        ),
+    ]
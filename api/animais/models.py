@@ -2,7 +2,8 @@ from django.db import models
 from django.conf import settings
 
 class Animal(models.Model):
-  dono = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='animais')
+  # dono é indexado pelo índice composto com atualizado_em (ver Meta)
+  dono = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='animais', db_index=False)
   empresa = models.ForeignKey('core.Empresa', on_delete=models.CASCADE, related_name='animais')
   nome = models.CharField(max_length=100)
   especie = models.CharField(max_length=100)
@@ -10,6 +11,13 @@ class Animal(models.Model):
   data_nascimento = models.DateField(blank=True, null=True)
   peso = models.DecimalField(max_digits=5, decimal_places=2, blank=True, null=True, help_text='Peso em kg')
   observacoes = models.TextField(blank=True, null=True)
+  atualizado_em = models.DateTimeField(auto_now=True)
+
+  class Meta:
+    indexes = [
+      # Sincronização incremental dos animais do dono
+      models.Index(fields=['dono', 'atualizado_em'], name='animal_dono_sync_idx'),
+    ]
 
   def __str__(self):
     return self.nome
\ No newline at end of file
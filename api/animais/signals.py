@@ -0,0 +1,33 @@
+from django.db.models.signals import pre_save, post_save, post_delete
+from django.dispatch import receiver
+from core import sincronizacao
+from .models import Animal
+
+
+@receiver(pre_save, sender=Animal)
+def guardar_dono_anterior(sender, instance, update_fields=None, **kwargs):
+    """
+    Guarda o dono anterior do animal alterado
+    """
+    instance._dono_anterior_id = None
+    if instance.pk and (update_fields is None or 'dono' in update_fields):
+        instance._dono_anterior_id = Animal.objects.filter(pk=instance.pk).values_list('dono_id', flat=True).first()
+
+
+@receiver(post_save, sender=Animal)
+def registrar_troca_dono(sender, instance, **kwargs):
+    """
+    Marca a exclusão para o dono anterior quando o animal passa para outro cliente
+    """
+    anterior = getattr(instance, '_dono_anterior_id', None)
+    if anterior and anterior != instance.dono_id:
+        sincronizacao.registrar_exclusao('animal', instance.pk, anterior)
+
+
+@receiver(post_delete, sender=Animal)
+def registrar_exclusao_animal(sender, instance, origin=None, **kwargs):
+    """
+    Marca a exclusão do animal para a sincronização do dono
+    """
+    if not sincronizacao.excluido_com_usuario(origin):
+        sincronizacao.registrar_exclusao('animal', instance.pk, instance.dono_id)
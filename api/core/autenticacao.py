@@ -0,0 +1,21 @@
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from . import rbac
+
+
+class JWTRBACAuthentication(JWTAuthentication):
+    """
+    Autenticação JWT que aproveita os roles e permissões embutidos no token de acesso
+
+    A versão do RBAC do token é comparada com a versão atual guardada no
+    processo (ver rbac.vigente), sem consulta. Com ela ainda atual, as
+    verificações de core.permissions na requisição não consultam os roles
+    nem o cache de permissões; caso contrário, o usuário carrega as
+    permissões normalmente.
+    """
+
+    def authenticate(self, request):
+        resultado = super().authenticate(request)
+        if resultado is not None:
+            usuario, token = resultado
+            rbac.aplicar_claims(usuario, token)
+        return resultado
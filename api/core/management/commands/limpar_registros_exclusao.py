@@ -0,0 +1,10 @@
+from django.core.management.base import BaseCommand
+from core import sincronizacao
+
+
+class Command(BaseCommand):
+    help = 'Remove as marcas de exclusão da sincronização incremental mais antigas que a retenção configurada'
+
+    def handle(self, *args, **options):
+        removidas = sincronizacao.limpar_exclusoes_antigas()
+        self.stdout.write(self.style.SUCCESS(f'{removidas} marcas de exclusão removidas'))
@@ -97,6 +97,9 @@ class Command(BaseCommand):
             ('brand', 'update', 'Editar configurações de marca'),
             ('brand', 'delete', 'Excluir configurações de marca'),
             ('brand', 'manage', 'Gerenciar marca e identidade visual'),
+            
+            # Todos os recursos (manage implica todas as ações)
+            ('*', 'manage', 'Acesso total a todos os recursos'),
         ]
 
         for resource, action, description in permissions_data:
@@ -151,21 +154,21 @@ class Command(BaseCommand):
         """Atribuir permissões aos roles"""
         self.stdout.write('Atribuindo permissões aos roles...')
 
-        # Administrador - todas as permissões
+        # Administrador - todas as permissões, por meio de manage sobre todos os recursos
         admin_role = Role.objects.get(name='admin')
-        all_permissions = Permission.objects.all()
-        for permission in all_permissions:
-            RolePermission.objects.get_or_create(
-                role=admin_role,
-                permission=permission
-            )
-        self.stdout.write(f'  ✓ Admin: {all_permissions.count()} permissões')
+        admin_permission = Permission.objects.get(resource='*', action='manage')
+        RolePermission.objects.get_or_create(
+            role=admin_role,
+            permission=admin_permission
+        )
+        self.stdout.write('  ✓ Admin: todas as permissões (manage em todos os recursos)')
 
-        # Veterinário - permissões de gestão clínica
+        # Veterinário - permissões de gestão clínica, com ações explícitas
+        # (manage implicaria também excluir agendamentos, animais e serviços)
         vet_role = Role.objects.get(name='veterinario')
         vet_permissions = Permission.objects.filter(
             resource__in=['agendamentos', 'animais', 'servicos'],
-            action__in=['create', 'read', 'update', 'list', 'manage']
+            action__in=['create', 'read', 'update', 'list']
         )
         for permission in vet_permissions:
             RolePermission.objects.get_or_create(
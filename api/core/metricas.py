@@ -0,0 +1,235 @@
+"""
+Métricas dos dashboards calculadas em uma única consulta
+
+Cada métrica é declarada uma vez em METRICAS como uma agregação
+condicional (Count/Sum com filter=Q(...)) sobre a tabela de origem. As
+contagens e a receita por período vêm do resumo diário
+(AgendamentoDiario), cujo tamanho cresce com os dias, não com os
+agendamentos.
+
+calcular() agrupa as métricas pedidas por tabela, compila cada grupo em
+uma agregação sem GROUP BY (uma única leitura da tabela, com uma coluna
+por métrica) e junta os grupos com CROSS JOIN, de modo que o dashboard
+inteiro sai em uma consulta em vez de uma contagem por número exibido.
+
+calcular_em_cache() guarda o resultado no cache do Django. A chave inclui
+a instalação (banco), o conjunto de métricas, o dia e a versão de cada
+fonte de dados usada (agendamentos, usuários, animais, roles, serviços); os signals
+(ver signals.py) trocam a versão da fonte a cada gravação confirmada,
+então um resultado só é reaproveitado enquanto nada do que ele lê mudou.
+O tempo de expiração curto cobre o que não dispara signals (por exemplo,
+agendamentos que deixam de ser futuros com a passagem do tempo) e os
+demais processos quando o cache não é compartilhado entre eles.
+
+As agregações só podem seguir relações para um (FK), que não multiplicam
+as linhas da tabela de origem.
+"""
+import operator
+import uuid
+from datetime import timedelta
+from functools import reduce
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum, Value
+from django.utils import timezone
+from agendamentos.models import Agendamento, AgendamentoDiario
+from animais.models import Animal
+from servicos.models import Servico
+from usuarios.models import Usuario
+from .models import Permission, Role, UserRole
+
+# Janela, em dias, em que um cliente com agendamento é considerado ativo
+DIAS_CLIENTE_ATIVO = 30
+
+# Validade padrão, em segundos, dos resultados guardados no cache
+CACHE_TTL_PADRAO = 60
+
+# Fonte de dados de cada modelo lido pelas métricas, usada na invalidação do cache
+FONTES = {
+    Agendamento: 'agendamentos',
+    AgendamentoDiario: 'agendamentos',
+    Usuario: 'usuarios',
+    Animal: 'animais',
+    Role: 'roles',
+    Permission: 'roles',
+    UserRole: 'roles',
+    Servico: 'servicos',
+}
+
+
+class Periodos:
+    """
+    Instantes e janelas de datas usados nas métricas, calculados uma vez por requisição
+    """
+    def __init__(self, hoje=None):
+        self.agora = timezone.now()
+        self.hoje = hoje or timezone.localdate()
+        self.inicio_semana = self.hoje - timedelta(days=self.hoje.weekday())
+        self.fim_semana = self.inicio_semana + timedelta(days=6)
+        self.inicio_mes = self.hoje.replace(day=1)
+        self.fim_mes = (self.inicio_mes + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+
+    def dia(self):
+        return Q(data=self.hoje)
+
+    def semana(self):
+        return Q(data__range=(self.inicio_semana, self.fim_semana))
+
+    def mes(self):
+        return Q(data__range=(self.inicio_mes, self.fim_mes))
+
+    def desde_inicio_mes(self):
+        # Do dia 1 em diante, incluindo os agendamentos já marcados para os meses seguintes
+        return Q(data__gte=self.inicio_mes)
+
+
+class Metrica:
+    """
+    Agregação sobre um modelo; `expressao` recebe os Periodos e retorna a expressão de agregação
+    """
+    def __init__(self, modelo, expressao, padrao=0):
+        self.modelo = modelo
+        self.expressao = expressao
+        self.padrao = padrao
+
+
+METRICAS = {
+    # Resumo diário de agendamentos
+    'agendamentos_total': Metrica(AgendamentoDiario, lambda p: Sum('quantidade')),
+    'agendamentos_hoje': Metrica(AgendamentoDiario, lambda p: Sum('quantidade', filter=p.dia())),
+    'agendamentos_semana': Metrica(AgendamentoDiario, lambda p: Sum('quantidade', filter=p.semana())),
+    'agendamentos_mes': Metrica(AgendamentoDiario, lambda p: Sum('quantidade', filter=p.mes())),
+    # Os dashboards de clientes, animais e faturamento contam a partir do dia 1, sem limite final
+    'agendamentos_desde_inicio_mes': Metrica(
+        AgendamentoDiario, lambda p: Sum('quantidade', filter=p.desde_inicio_mes())
+    ),
+    'faturamento_mes': Metrica(AgendamentoDiario, lambda p: Sum('receita', filter=p.desde_inicio_mes())),
+    # Agendamentos (precisam da hora exata)
+    'agendamentos_futuros': Metrica(Agendamento, lambda p: Count('id', filter=Q(data_hora__gt=p.agora))),
+    'clientes_com_agendamento_recente': Metrica(Agendamento, lambda p: Count(
+        'cliente',
+        distinct=True,
+        filter=Q(data_hora__gte=p.agora - timedelta(days=DIAS_CLIENTE_ATIVO), cliente__tipo='cliente')
+    )),
+    # Usuários
+    'usuarios_ativos': Metrica(Usuario, lambda p: Count('id', filter=Q(is_active=True))),
+    'clientes_total': Metrica(Usuario, lambda p: Count('id', filter=Q(tipo='cliente'))),
+    'clientes_ativos': Metrica(Usuario, lambda p: Count('id', filter=Q(tipo='cliente', is_active=True))),
+    # Animais
+    'animais_total': Metrica(Animal, lambda p: Count('id')),
+    # Roles e permissões
+    'roles_ativos': Metrica(Role, lambda p: Count('id', filter=Q(is_active=True))),
+    'permissoes_total': Metrica(Permission, lambda p: Count('id')),
+    'atribuicoes_ativas': Metrica(UserRole, lambda p: Count('id', filter=Q(is_active=True))),
+}
+
+
+def _compilar_grupo(modelo, expressoes):
+    """
+    Retorna o SQL e os parâmetros da agregação de uma tabela, com uma coluna por métrica
+    """
+    # values() sobre uma constante não gera GROUP BY: o resultado é uma única linha
+    # (order_by() remove a ordenação padrão do Meta, que exigiria agrupar pela coluna)
+    queryset = modelo._default_manager.order_by().annotate(_grupo=Value(1)).values('_grupo').annotate(
+        **expressoes
+    ).values(*expressoes)
+
+    filtros = [expressao.filter for expressao in expressoes.values()]
+    if all(filtro is not None for filtro in filtros):
+        # Todas as métricas do grupo são filtradas: ler só as linhas de alguma delas, pelos índices
+        queryset = queryset.filter(reduce(operator.or_, filtros))
+    return queryset.query.sql_with_params()
+
+
+def calcular(nomes, periodos=None):
+    """
+    Calcula as métricas pedidas em uma única consulta e retorna {nome: valor}
+    """
+    periodos = periodos or Periodos()
+
+    grupos = {}
+    for nome in nomes:
+        metrica = METRICAS[nome]
+        grupos.setdefault(metrica.modelo, {})[nome] = metrica.expressao(periodos)
+
+    partes = []
+    parametros = []
+    colunas = []
+    for indice, (modelo, expressoes) in enumerate(grupos.items()):
+        sql, params = _compilar_grupo(modelo, expressoes)
+        partes.append(f'({sql}) AS m{indice}')
+        parametros.extend(params)
+        colunas.extend(expressoes)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"SELECT * FROM {' CROSS JOIN '.join(partes)}", parametros)
+        linha = cursor.fetchone()
+
+    resultado = {}
+    for nome, valor in zip(colunas, linha):
+        resultado[nome] = METRICAS[nome].padrao if valor is None else valor
+    return resultado
+
+
+def cache_ttl():
+    return getattr(settings, 'DASHBOARD_CACHE_TTL', CACHE_TTL_PADRAO)
+
+
+def _prefixo():
+    # A instalação (banco de dados) é o tenant: as métricas não são filtradas por empresa
+    return f"metricas:{connection.settings_dict['NAME'] or ''}"
+
+
+def _chave_versao(fonte):
+    return f'{_prefixo()}:versao:{fonte}'
+
+
+def invalidar(*fontes):
+    """
+    Troca a versão das fontes quando a transação atual for confirmada, descartando os resultados que as leram
+
+    Invalidar antes do commit deixaria outra requisição recalcular com os
+    dados antigos e guardá-los sob a versão nova.
+    """
+    transaction.on_commit(lambda: cache.set_many({_chave_versao(fonte): uuid.uuid4().hex for fonte in fontes}, None))
+
+
+def _versoes(fontes):
+    """
+    Retorna a versão atual de cada fonte, criando as que ainda não existem
+    """
+    chaves = [_chave_versao(fonte) for fonte in fontes]
+    versoes = cache.get_many(chaves)
+    for chave in chaves:
+        if chave not in versoes:
+            cache.add(chave, uuid.uuid4().hex, None)
+            versoes[chave] = cache.get(chave)
+    return [versoes[chave] for chave in chaves]
+
+
+def em_cache(nome, fontes, funcao):
+    """
+    Retorna o resultado de funcao() guardado no cache, recalculando-o quando alguma das fontes muda
+    """
+    fontes = sorted(set(fontes))
+    chave = ':'.join([
+        _prefixo(),
+        nome,
+        timezone.localdate().isoformat(),
+        *_versoes(fontes),
+    ])
+    resultado = cache.get(chave)
+    if resultado is None:
+        resultado = funcao()
+        cache.set(chave, resultado, cache_ttl())
+    return resultado
+
+
+def calcular_em_cache(nomes):
+    """
+    Versão de calcular() que reaproveita o resultado enquanto as fontes das métricas não mudam
+    """
+    nomes = sorted(nomes)
+    fontes = [FONTES[METRICAS[nome].modelo] for nome in nomes]
+    return em_cache(','.join(nomes), fontes, lambda: calcular(nomes))
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.11 on 2026-10-18 13:49
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0006_add_brand_colors'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RegistroExclusao',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modelo', models.CharField(choices=[('agendamento', 'Agendamento'), ('animal', 'Animal')], max_length=20)),
+                ('objeto_id', models.BigIntegerField()),
+                ('excluido_em', models.DateTimeField(auto_now_add=True)),
+                ('usuario', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='registros_exclusao', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Registro de Exclusão',
+                'verbose_name_plural': 'Registros de Exclusão',
+                'indexes': [models.Index(fields=['usuario', 'excluido_em'], name='registro_exclusao_sync_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:05
+
+from django.db import migrations, models
+
+
+def compilar_mascaras(apps, schema_editor):
+    """
+    Calcula a máscara de permissões dos roles existentes
+    """
+    Permission = apps.get_model('core', 'Permission')
+    Role = apps.get_model('core', 'Role')
+    RolePermission = apps.get_model('core', 'RolePermission')
+    recursos = [valor for valor, _ in Permission._meta.get_field('resource').choices]
+    acoes = [valor for valor, _ in Permission._meta.get_field('action').choices]
+
+    mascaras = {}
+    for role_id, resource, action in RolePermission.objects.values_list(
+        'role_id', 'permission__resource', 'permission__action'
+    ):
+        if resource in recursos and action in acoes:
+            bit = 1 << (recursos.index(resource) * 8 + acoes.index(action))
+            mascaras[role_id] = mascaras.get(role_id, 0) | bit
+    for role_id, mascara in mascaras.items():
+        Role.objects.filter(pk=role_id).update(permission_mask=mascara)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_registroexclusao'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='role',
+            name='permission_mask',
+            field=models.BigIntegerField(default=0, editable=False, help_text='Permissões do role compiladas em bits (ver Permission.bit), mantidas pelos signals de RolePermission'),
+        ),
+        migrations.RunPython(compilar_mascaras, migrations.RunPython.noop),
+    ]
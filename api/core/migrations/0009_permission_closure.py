@@ -0,0 +1,46 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:07
+
+from django.db import migrations, models
+
+
+def recompilar_mascaras(apps, schema_editor):
+    """
+    Recalcula a máscara dos roles aplicando as permissões implícitas (manage e recurso *)
+    """
+    Permission = apps.get_model('core', 'Permission')
+    Role = apps.get_model('core', 'Role')
+    RolePermission = apps.get_model('core', 'RolePermission')
+    recursos = [valor for valor, _ in Permission._meta.get_field('resource').choices if valor != '*']
+    acoes = [valor for valor, _ in Permission._meta.get_field('action').choices]
+
+    def implicadas(resource, action):
+        mascara = 0
+        for r in (recursos if resource == '*' else [resource]):
+            for a in (acoes if action == 'manage' else [action]):
+                if r in recursos and a in acoes:
+                    mascara |= 1 << (recursos.index(r) * 8 + acoes.index(a))
+        return mascara
+
+    mascaras = {role_id: 0 for role_id in Role.objects.values_list('id', flat=True)}
+    for role_id, resource, action in RolePermission.objects.values_list(
+        'role_id', 'permission__resource', 'permission__action'
+    ):
+        mascaras[role_id] |= implicadas(resource, action)
+    for role_id, mascara in mascaras.items():
+        Role.objects.filter(pk=role_id).update(permission_mask=mascara)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_role_permission_mask'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='permission',
+            name='resource',
+            field=models.CharField(choices=[('usuarios', 'Usuários'), ('agendamentos', 'Agendamentos'), ('animais', 'Animais'), ('servicos', 'Serviços'), ('configuracoes', 'Configurações'), ('relatorios', 'Relatórios'), ('brand', 'Marca/Branding'), ('*', 'Todos os recursos')], help_text='Recurso sobre o qual a permissão se aplica', max_length=50),
+        ),
+        migrations.RunPython(recompilar_mascaras, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,37 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:40
+
+import time
+from django.db import migrations, models
+
+
+def criar_versao(apps, schema_editor):
+    """
+    Cria a linha da versão do RBAC
+
+    O valor inicial vem do relógio para não repetir versões de uma
+    instalação anterior cujas entradas ainda estejam no cache compartilhado.
+    """
+    VersaoRBAC = apps.get_model('core', 'VersaoRBAC')
+    VersaoRBAC.objects.get_or_create(pk=1, defaults={'versao': time.time_ns() // 1000})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0009_permission_closure'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersaoRBAC',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('versao', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Versão do RBAC',
+                'verbose_name_plural': 'Versão do RBAC',
+            },
+        ),
+        migrations.RunPython(criar_versao, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,63 @@
+# Generated by Django 4.2.11 on 2026-10-18 14:55
+
+from django.db import migrations
+from django.db.models import F
+
+RECURSOS_VETERINARIO = ['agendamentos', 'animais', 'servicos']
+
+ACOES_VETERINARIO = ['create', 'read', 'update', 'list']
+
+
+def trocar_manage_por_acoes(apps, schema_editor):
+    """
+    Substitui o manage do role veterinário pelas ações que ele já tinha
+
+    Com o fecho da 0009, o manage que o setup_roles concedia ao veterinário
+    passou a implicar também delete. Nenhuma verificação usava o manage
+    desses recursos, então trocá-lo pelas ações explícitas mantém as
+    permissões efetivas de antes da 0009.
+    """
+    Permission = apps.get_model('core', 'Permission')
+    Role = apps.get_model('core', 'Role')
+    RolePermission = apps.get_model('core', 'RolePermission')
+    VersaoRBAC = apps.get_model('core', 'VersaoRBAC')
+
+    role = Role.objects.filter(name='veterinario').first()
+    if role is None:
+        return
+    apagadas, _ = RolePermission.objects.filter(
+        role=role,
+        permission__resource__in=RECURSOS_VETERINARIO,
+        permission__action='manage'
+    ).delete()
+    if not apagadas:
+        return
+    for permission in Permission.objects.filter(resource__in=RECURSOS_VETERINARIO, action__in=ACOES_VETERINARIO):
+        RolePermission.objects.get_or_create(role=role, permission=permission)
+
+    # Recompilar a máscara do role, com as permissões implícitas, como na 0009
+    recursos = [valor for valor, _ in Permission._meta.get_field('resource').choices if valor != '*']
+    acoes = [valor for valor, _ in Permission._meta.get_field('action').choices]
+    mascara = 0
+    for resource, action in RolePermission.objects.filter(role=role).values_list(
+        'permission__resource', 'permission__action'
+    ):
+        for r in (recursos if resource == '*' else [resource]):
+            for a in (acoes if action == 'manage' else [action]):
+                if r in recursos and a in acoes:
+                    mascara |= 1 << (recursos.index(r) * 8 + acoes.index(a))
+    Role.objects.filter(pk=role.pk).update(permission_mask=mascara)
+
+    # As permissões em cache e nos tokens emitidos ficam obsoletas
+    VersaoRBAC.objects.filter(pk=1).update(versao=F('versao') + 1)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_versaorbac'),
+    ]
+
+    operations = [
+        migrations.RunPython(trocar_manage_por_acoes, migrations.RunPython.noop),
+    ]
@@ -158,6 +158,11 @@ class Role(models.Model):
         default=True,
         help_text='Se este role está ativo e pode ser atribuído'
     )
+    permission_mask = models.BigIntegerField(
+        default=0,
+        editable=False,
+        help_text='Permissões do role compiladas em bits (ver Permission.bit), mantidas pelos signals de RolePermission'
+    )
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -169,6 +174,21 @@ class Role(models.Model):
     def __str__(self):
         return self.display_name
 
+    def has_permission(self, resource, action):
+        return bool(self.permission_mask & Permission.bit(resource, action))
+
+    def includes(self, other):
+        """Verifica se este role concede todas as permissões do outro"""
+        return self.permission_mask & other.permission_mask == other.permission_mask
+
+    @classmethod
+    def atualizar_mascara_permissoes(cls, role_id):
+        """Recalcula a máscara de permissões do role a partir das suas RolePermission"""
+        pares = Permission.objects.filter(roles__role_id=role_id).values_list('resource', 'action')
+        mascara = Permission.mascara(pares)
+        cls.objects.filter(pk=role_id).update(permission_mask=mascara)
+        return mascara
+
 
 class Permission(models.Model):
     """
@@ -182,6 +202,7 @@ class Permission(models.Model):
         ('configuracoes', 'Configurações'),
         ('relatorios', 'Relatórios'),
         ('brand', 'Marca/Branding'),
+        ('*', 'Todos os recursos'),
     ]
     
     ACTION_CHOICES = [
@@ -223,6 +244,94 @@ class Permission(models.Model):
         """Retorna um código único para a permissão"""
         return f"{self.action}_{self.resource}"
 
+    @property
+    def mask(self):
+        """Bits concedidos pela permissão, incluindo os implícitos"""
+        return FECHO_PERMISSAO.get((self.resource, self.action), 0)
+
+    @classmethod
+    def bit(cls, resource, action):
+        """Retorna o bit da permissão na grade recursos × ações (0 se o par não existir)"""
+        return BITS_PERMISSAO.get((resource, action), 0)
+
+    @classmethod
+    def mascara(cls, pares):
+        """Compila pares (resource, action) em uma máscara de bits, incluindo as permissões implícitas"""
+        mascara = 0
+        for resource, action in pares:
+            mascara |= FECHO_PERMISSAO.get((resource, action), 0)
+        return mascara
+
+    @classmethod
+    def pares(cls, mascara):
+        """Retorna os pares (resource, action) presentes na máscara"""
+        return frozenset(par for par, bit in BITS_PERMISSAO.items() if mascara & bit)
+
+    @classmethod
+    def da_mascara(cls, mascara):
+        """
+        Retorna as permissões presentes na máscara, incluindo as implícitas, em ordem de recurso e ação
+
+        Pares concedidos apenas por implicação (manage ou recurso *) podem
+        não ter linha no banco; para eles a instância retornada não é salva.
+        """
+        pares = cls.pares(mascara)
+        existentes = {
+            (permissao.resource, permissao.action): permissao
+            for permissao in cls.objects.filter(
+                resource__in={resource for resource, _ in pares},
+                action__in={action for _, action in pares}
+            )
+        }
+        permissoes = []
+        for resource, action in sorted(pares):
+            permissao = existentes.get((resource, action))
+            if permissao is None:
+                permissao = cls(resource=resource, action=action)
+                permissao.description = str(permissao)
+            permissoes.append(permissao)
+        return permissoes
+
+
+# Ação que implica todas as outras sobre o mesmo recurso
+ACAO_TOTAL = 'manage'
+
+# Recurso curinga: a permissão vale para todos os recursos
+RECURSO_TODOS = '*'
+
+RECURSOS = [resource for resource, _ in Permission.RESOURCE_CHOICES if resource != RECURSO_TODOS]
+
+ACOES = [action for action, _ in Permission.ACTION_CHOICES]
+
+# Bits reservados para as ações de cada recurso na máscara (ações e recursos novos entram no fim das
+# choices, sem mudar os bits existentes; até 7 recursos × 8 ações cabem nos 63 bits de um BigIntegerField)
+ACOES_POR_RECURSO = 8
+
+# Bit de cada par (resource, action) concreto da grade recursos × ações
+BITS_PERMISSAO = {
+    (resource, action): 1 << (indice_recurso * ACOES_POR_RECURSO + indice_acao)
+    for indice_recurso, resource in enumerate(RECURSOS)
+    for indice_acao, action in enumerate(ACOES)
+}
+
+
+def _implicadas(resource, action):
+    recursos = RECURSOS if resource == RECURSO_TODOS else [resource]
+    acoes = ACOES if action == ACAO_TOTAL else [action]
+    mascara = 0
+    for par in ((r, a) for r in recursos for a in acoes):
+        mascara |= BITS_PERMISSAO.get(par, 0)
+    return mascara
+
+
+# Fecho das permissões: bits que cada par concede (manage ⇒ todas as ações; * ⇒ todos os recursos).
+# É aplicado ao compilar a máscara dos roles, então a verificação continua sendo um único AND
+FECHO_PERMISSAO = {
+    (resource, action): _implicadas(resource, action)
+    for resource in RECURSOS + [RECURSO_TODOS]
+    for action in ACOES
+}
+
 
 class RolePermission(models.Model):
     """
@@ -290,4 +399,56 @@ class UserRole(models.Model):
         unique_together = ['user', 'role']
 
     def __str__(self):
-        return f"{self.user.nome} - {self.role.display_name}"
\ No newline at end of file
+        return f"{self.user.nome} - {self.role.display_name}"
+
+class RegistroExclusao(models.Model):
+    """
+    Marca (tombstone) de um registro que deixou de pertencer a um usuário
+
+    Gravada quando um agendamento ou animal é excluído ou passa para outro
+    cliente, para que a sincronização incremental avise o app do usuário
+    que ele deve remover o registro.
+    """
+    MODELO_CHOICES = [
+        ('agendamento', 'Agendamento'),
+        ('animal', 'Animal'),
+    ]
+
+    modelo = models.CharField(max_length=20, choices=MODELO_CHOICES)
+    objeto_id = models.BigIntegerField()
+    # Indexado pelo índice composto com excluido_em (ver Meta)
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.CASCADE,
+        related_name='registros_exclusao',
+        db_index=False
+    )
+    excluido_em = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Registro de Exclusão'
+        verbose_name_plural = 'Registros de Exclusão'
+        indexes = [
+            models.Index(fields=['usuario', 'excluido_em'], name='registro_exclusao_sync_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.modelo} {self.objeto_id} - {self.usuario_id}"
+
+
+class VersaoRBAC(models.Model):
+    """
+    Versão global do RBAC (linha única), incrementada a cada alteração de roles, permissões ou atribuições
+
+    É a fonte da versão: incrementada na própria transação da alteração,
+    fica visível junto com ela e só então é publicada no cache, de onde os
+    processos a leem (ver rbac.py).
+    """
+    versao = models.BigIntegerField(default=0)
+
+    class Meta:
+        verbose_name = 'Versão do RBAC'
+        verbose_name_plural = 'Versão do RBAC'
+
+    def __str__(self):
+        return str(self.versao)
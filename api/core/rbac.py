@@ -0,0 +1,265 @@
+"""
+Cache entre requisições dos roles e permissões compilados de cada usuário
+
+Os roles de um usuário e a máscara das suas permissões (OR das máscaras
+de bits dos roles ativos, ver Permission.bit) são guardados em dois
+níveis: um dicionário do processo e o cache do Django (compartilhado entre
+processos quando configurado com Redis/Memcached). As chaves levam uma
+versão global do RBAC, e trocar a versão torna obsoletas todas as
+entradas de uma vez.
+
+A versão é um contador em uma linha do banco (VersaoRBAC), incrementado
+pelos signals de Role, Permission, RolePermission e UserRole na própria
+transação de cada alteração (ver signals.py). Depois do commit, o novo
+valor é publicado no cache e no processo que fez a alteração. Os demais
+processos leem a versão do próprio processo por até VERSAO_TTL_LOCAL
+segundos e depois do cache, voltando ao banco só quando a chave falta,
+então enquanto nada muda uma verificação não faz nenhuma consulta. Com
+cache compartilhado, uma edição de role vale em todos os processos em até
+VERSAO_TTL_LOCAL segundos; com cache local (LocMem) e vários processos, em
+até VERSAO_TTL_CACHE + VERSAO_TTL_LOCAL.
+
+Dentro da transação que alterou o RBAC, as permissões são lidas direto
+do banco, sem passar pelo cache, para que a própria requisição já veja a
+alteração sem publicar no cache algo que ainda pode ser desfeito.
+
+Alterações em massa (assign_permissions, assign_user_roles) rodam dentro
+de em_lote(): cada role afetado tem a máscara recalculada uma vez e a
+versão é incrementada uma vez, no fim do bloco.
+
+O token de acesso emitido no login leva os roles, a máscara de
+permissões e a versão em que foram lidos (claim `rbac`). Enquanto a
+versão do token é a atual, a autenticação usa o que está no token e a
+verificação é só a comparação com a versão do processo, sem consulta ao
+cache nem ao banco; quando ela fica para trás, vale o caminho acima. O
+usuário também guarda a versão das permissões carregadas e as recarrega
+quando ela muda, inclusive no meio de uma requisição.
+"""
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import Exists, F, OuterRef
+from .models import Permission, Role, UserRole, VersaoRBAC
+
+# Validade, em segundos, das permissões compiladas no cache compartilhado (entradas de versões antigas expiram)
+CACHE_TTL = 24 * 60 * 60
+
+# Claim do token de acesso com os roles, as permissões e a versão do RBAC
+CLAIM = 'rbac'
+
+# Formato das entradas guardadas; incrementar quando o conteúdo ou o cálculo delas mudar, para que
+# um cache compartilhado não devolva entradas do formato anterior
+FORMATO = 2
+
+# Máximo de usuários guardados no dicionário do processo antes de esvaziá-lo
+LIMITE_LOCAL = 10000
+
+# Segundos em que o processo reutiliza a versão lida, sem consultar o cache
+VERSAO_TTL_LOCAL = 1
+
+# Validade, em segundos, da versão no cache; limita a defasagem quando o cache não é compartilhado
+VERSAO_TTL_CACHE = 5
+
+_local = {'versao': None, 'expira': 0.0, 'usuarios': {}}
+
+# Alterações adiadas pelo em_lote() em andamento
+_lote = ContextVar('rbac_lote', default=None)
+
+
+def _prefixo():
+    return f"rbac:{connection.settings_dict['NAME'] or ''}:{FORMATO}"
+
+
+def _chave_versao():
+    return f'{_prefixo()}:versao'
+
+
+def _ler_versao():
+    atual = VersaoRBAC.objects.filter(pk=1).values_list('versao', flat=True).first()
+    return 0 if atual is None else atual
+
+
+def _fixar_versao(atual, agora):
+    """
+    Guarda a versão no processo, descartando as permissões compiladas de outra versão
+    """
+    if _local['versao'] != atual:
+        _local.update(versao=atual, usuarios={})
+    _local['expira'] = agora + VERSAO_TTL_LOCAL
+
+
+def alterado_na_transacao():
+    """
+    Indica se o RBAC foi alterado na transação em andamento, ainda não confirmada
+    """
+    if not connection.in_atomic_block:
+        connection.rbac_alterado = False
+    return getattr(connection, 'rbac_alterado', False)
+
+
+def versao():
+    """
+    Retorna a versão atual do RBAC: do processo, do cache ou, na falta dela, do banco
+    """
+    if alterado_na_transacao():
+        return _ler_versao()
+
+    agora = time.monotonic()
+    if agora < _local['expira']:
+        return _local['versao']
+
+    atual = cache.get(_chave_versao())
+    if atual is None:
+        atual = _ler_versao()
+        cache.add(_chave_versao(), atual, VERSAO_TTL_CACHE)
+    _fixar_versao(atual, agora)
+    return atual
+
+
+def _publicar():
+    """
+    Publica a versão confirmada no cache e no processo
+    """
+    connection.rbac_alterado = False
+    atual = _ler_versao()
+    cache.set(_chave_versao(), atual, VERSAO_TTL_CACHE)
+    _fixar_versao(atual, time.monotonic())
+
+
+def invalidar():
+    """
+    Incrementa a versão do RBAC na transação atual, publicando-a depois do commit
+
+    Como o incremento só fica visível no commit, junto com a alteração, uma
+    requisição concorrente não guarda dados antigos sob a versão nova.
+    Dentro de em_lote(), o incremento fica para o fim do bloco.
+    """
+    lote = _lote.get()
+    if lote is not None:
+        lote['invalidar'] = True
+        return
+
+    if not VersaoRBAC.objects.filter(pk=1).update(versao=F('versao') + 1):
+        # Linha ausente (criada pela migração): partir do relógio, como na migração
+        VersaoRBAC.objects.get_or_create(pk=1, defaults={'versao': time.time_ns() // 1000})
+    if connection.in_atomic_block:
+        connection.rbac_alterado = True
+    transaction.on_commit(_publicar)
+
+
+def atualizar_mascara(role_id):
+    """
+    Recalcula a máscara de permissões do role e incrementa a versão (no fim do lote, dentro de em_lote())
+    """
+    lote = _lote.get()
+    if lote is not None:
+        lote['roles'].add(role_id)
+        return
+    Role.atualizar_mascara_permissoes(role_id)
+    invalidar()
+
+
+@contextmanager
+def em_lote():
+    """
+    Agrupa as alterações de RBAC do bloco: uma máscara recalculada por role afetado e um incremento da versão
+    """
+    lote = {'roles': set(), 'invalidar': False}
+    marcador = _lote.set(lote)
+    try:
+        yield
+    finally:
+        _lote.reset(marcador)
+    for role_id in lote['roles']:
+        Role.atualizar_mascara_permissoes(role_id)
+    if lote['roles'] or lote['invalidar']:
+        invalidar()
+
+
+def carregar(usuario_id):
+    """
+    Consulta os roles ativos do usuário, retornando os nomes (frozenset) e a máscara de permissões combinada
+    """
+    roles = set()
+    mascara = 0
+    for role, mascara_role in UserRole.objects.filter(user_id=usuario_id, is_active=True).values_list(
+        'role__name', 'role__permission_mask'
+    ):
+        roles.add(role)
+        mascara |= mascara_role
+    return frozenset(roles), mascara
+
+
+def obter(usuario_id):
+    """
+    Retorna (roles, máscara de permissões) do usuário na versão atual, consultando o banco apenas se não estiverem em cache
+    """
+    if alterado_na_transacao():
+        return carregar(usuario_id)
+
+    atual = versao()
+    usuarios = _local['usuarios']
+    compilado = usuarios.get(usuario_id)
+    if compilado is None:
+        chave = f'{_prefixo()}:{atual}:usuario:{usuario_id}'
+        compilado = cache.get(chave)
+        if compilado is None:
+            compilado = carregar(usuario_id)
+            cache.set(chave, compilado, CACHE_TTL)
+        if len(usuarios) >= LIMITE_LOCAL:
+            usuarios.clear()
+        usuarios[usuario_id] = compilado
+    return compilado
+
+
+def vigente(versao_lida):
+    """
+    Indica se dados do RBAC lidos na versão informada ainda valem
+
+    A comparação usa a versão guardada no processo (ver versao()), então
+    não faz consultas. Dentro da transação que alterou o RBAC nada é vigente.
+    """
+    return versao_lida is not None and not alterado_na_transacao() and versao_lida == versao()
+
+
+def adicionar_claims(token, usuario):
+    """
+    Embute no token de acesso os roles e permissões atuais do usuário, com a versão do RBAC
+    """
+    # A versão é lida antes das permissões: se mudar entre as duas leituras, o token só fica obsoleto
+    atual = versao()
+    roles, mascara = obter(usuario.pk)
+    token[CLAIM] = {'v': atual, 'r': sorted(roles), 'p': mascara}
+
+
+def aplicar_claims(usuario, token):
+    """
+    Usa os roles e permissões do token no usuário autenticado se a versão deles ainda for a atual
+
+    Um token de outro formato ou de uma versão anterior é ignorado, e as
+    permissões são carregadas normalmente.
+    """
+    dados = token.get(CLAIM)
+    if not isinstance(dados, dict) or not isinstance(dados.get('p'), int) or not isinstance(dados.get('v'), int):
+        return False
+    if not vigente(dados['v']):
+        return False
+    usuario._role_names = frozenset(dados['r'])
+    usuario._permission_mask = dados['p']
+    usuario._rbac_versao = dados['v']
+    return True
+
+
+def usuarios_com_permissao(resource, action):
+    """
+    Retorna os usuários com a permissão em algum role ativo, filtrando pela máscara dos roles no banco
+    """
+    from usuarios.models import Usuario  # Import local para evitar import circular
+
+    bit = Permission.bit(resource, action)
+    atribuicoes = UserRole.objects.filter(user=OuterRef('pk'), is_active=True).annotate(
+        concedida=F('role__permission_mask').bitand(bit)
+    ).exclude(concedida=0)
+    return Usuario.objects.filter(Exists(atribuicoes))
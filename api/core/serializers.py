@@ -115,7 +115,7 @@ class RoleSerializer(serializers.ModelSerializer):
     
     class Meta:
         model = Role
-        fields = ['id', 'name', 'display_name', 'description', 'is_active', 'created_at', 'updated_at', 'permissions', 'permissions_count']
+        fields = ['id', 'name', 'display_name', 'description', 'is_active', 'permission_mask', 'created_at', 'updated_at', 'permissions', 'permissions_count']
     
     def get_permissions_count(self, obj):
         return obj.permissions.count()
@@ -0,0 +1,54 @@
+from django.db.models.signals import post_save, post_delete
+from . import metricas, rbac
+from .models import Permission, Role, RolePermission, UserRole
+
+
+def invalidar_metricas(sender, **kwargs):
+    """
+    Descarta do cache os resultados de métricas que leem o modelo gravado ou removido
+    """
+    metricas.invalidar(metricas.FONTES[sender])
+
+
+# O resumo diário não é gravado por save(); ele é invalidado em agendamentos.resumo_diario
+for modelo in metricas.FONTES:
+    if modelo is not metricas.AgendamentoDiario:
+        post_save.connect(invalidar_metricas, sender=modelo, dispatch_uid=f'invalidar_metricas_{modelo.__name__}')
+        post_delete.connect(invalidar_metricas, sender=modelo, dispatch_uid=f'invalidar_metricas_{modelo.__name__}')
+
+
+def invalidar_rbac(sender, **kwargs):
+    """
+    Torna obsoletas as permissões compiladas em cache quando roles, permissões ou atribuições mudam
+    """
+    rbac.invalidar()
+
+
+for modelo in (Role, UserRole):
+    post_save.connect(invalidar_rbac, sender=modelo, dispatch_uid=f'invalidar_rbac_{modelo.__name__}')
+    post_delete.connect(invalidar_rbac, sender=modelo, dispatch_uid=f'invalidar_rbac_{modelo.__name__}')
+post_delete.connect(invalidar_rbac, sender=Permission, dispatch_uid='invalidar_rbac_Permission')
+
+
+def atualizar_mascara_role(sender, instance, **kwargs):
+    """
+    Recalcula a máscara de permissões do role quando uma permissão é concedida ou retirada
+    """
+    # A versão é incrementada só depois da máscara: fora de uma transação, uma leitura entre
+    # o incremento e a gravação da máscara guardaria a máscara antiga sob a versão nova
+    rbac.atualizar_mascara(instance.role_id)
+
+
+def atualizar_mascara_permissao(sender, instance, created, **kwargs):
+    """
+    Recalcula a máscara dos roles que têm a permissão quando o recurso ou a ação dela muda
+    """
+    if not created:
+        with rbac.em_lote():
+            for role_id in RolePermission.objects.filter(permission=instance).values_list('role_id', flat=True):
+                rbac.atualizar_mascara(role_id)
+
+
+post_save.connect(atualizar_mascara_role, sender=RolePermission)
+post_delete.connect(atualizar_mascara_role, sender=RolePermission)
+post_save.connect(atualizar_mascara_permissao, sender=Permission)
@@ -0,0 +1,128 @@
+"""
+Sincronização incremental dos dados do cliente (animais e agendamentos)
+
+Em vez de recarregar listar_pets e listar_agendamentos_cliente inteiros,
+o app guarda o token recebido na última sincronização e pede apenas o
+que mudou desde então: registros com atualizado_em posterior ao token
+(pelos índices (dono/cliente, atualizado_em)) e as marcas de exclusão
+(RegistroExclusao) dos que foram removidos ou passaram a outro cliente.
+
+O token recua alguns segundos em relação ao momento da consulta, para não
+perder gravações de transações que ainda não tinham sido confirmadas. Por
+isso um registro pode voltar em duas sincronizações seguidas; o app deve
+aplicar as alterações por id, substituindo o que já tem.
+"""
+import base64
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from agendamentos.models import Agendamento
+from agendamentos.serializers import AgendamentoSerializer
+from animais.models import Animal
+from animais.serializers import AnimalSerializer
+from usuarios.models import Usuario
+from .models import RegistroExclusao
+
+# Sobreposição, em segundos, entre uma sincronização e a seguinte
+MARGEM_PADRAO = 30
+
+# Dias que as marcas de exclusão são mantidas; tokens mais antigos recebem a carga completa
+RETENCAO_PADRAO = 90
+
+
+class TokenInvalido(ValueError):
+    """
+    O token de sincronização recebido não é válido
+    """
+
+
+def margem():
+    return timedelta(seconds=getattr(settings, 'SINCRONIZACAO_MARGEM', MARGEM_PADRAO))
+
+
+def limite_retencao():
+    """
+    Retorna o instante a partir do qual as marcas de exclusão ainda existem
+    """
+    return timezone.now() - timedelta(days=getattr(settings, 'SINCRONIZACAO_RETENCAO_DIAS', RETENCAO_PADRAO))
+
+
+def registrar_exclusao(modelo, objeto_id, usuario_id):
+    """
+    Grava a marca de que o registro não pertence mais ao usuário
+    """
+    RegistroExclusao.objects.create(modelo=modelo, objeto_id=objeto_id, usuario_id=usuario_id)
+
+
+def excluido_com_usuario(origem):
+    """
+    Verifica se a exclusão veio em cascata da exclusão do próprio usuário, que não precisa de marca
+    """
+    modelo = origem.model if isinstance(origem, QuerySet) else type(origem)
+    return issubclass(modelo, Usuario)
+
+
+def limpar_exclusoes_antigas():
+    """
+    Remove as marcas de exclusão fora do período de retenção e retorna quantas foram removidas
+    """
+    removidas, _ = RegistroExclusao.objects.filter(excluido_em__lt=limite_retencao()).delete()
+    return removidas
+
+
+def codificar_token(instante):
+    return base64.urlsafe_b64encode(instante.isoformat().encode()).decode().rstrip('=')
+
+
+def decodificar_token(token):
+    """
+    Retorna o instante do token, levantando TokenInvalido se ele foi adulterado
+    """
+    try:
+        instante = parse_datetime(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode())
+    except (ValueError, UnicodeDecodeError):
+        raise TokenInvalido('Token de sincronização inválido')
+    if instante is None or timezone.is_naive(instante):
+        raise TokenInvalido('Token de sincronização inválido')
+    return instante
+
+
+def sincronizar(usuario, token=None):
+    """
+    Retorna o que mudou para o usuário desde o token e o próximo token
+
+    Sem token, ou com um token anterior à retenção das exclusões, a resposta
+    é completa (`completo`: True) e o app deve substituir tudo o que tem.
+    """
+    # O próximo token é calculado antes das consultas para não pular nada gravado durante elas
+    proximo = codificar_token(timezone.now() - margem())
+    desde = decodificar_token(token) if token else None
+    completo = desde is None or desde < limite_retencao()
+
+    animais = Animal.objects.filter(dono=usuario)
+    agendamentos = Agendamento.objects.filter(cliente=usuario).select_related(
+        'servico', 'animal', 'cliente', 'profissional'
+    )
+    excluidos = {'animal': set(), 'agendamento': set()}
+    if not completo:
+        animais = animais.filter(atualizado_em__gte=desde)
+        agendamentos = agendamentos.filter(atualizado_em__gte=desde)
+        marcas = RegistroExclusao.objects.filter(usuario=usuario, excluido_em__gte=desde)
+        for modelo, objeto_id in marcas.values_list('modelo', 'objeto_id'):
+            excluidos[modelo].add(objeto_id)
+
+    animais = AnimalSerializer(animais.order_by('id'), many=True).data
+    agendamentos = AgendamentoSerializer(agendamentos.order_by('-data_hora'), many=True).data
+    return {
+        'token': proximo,
+        'completo': completo,
+        'animais': animais,
+        'agendamentos': agendamentos,
+        # Um registro que saiu e voltou para o usuário no período vem apenas como alterado
+        'excluidos': {
+            'animais': sorted(excluidos['animal'] - {animal['id'] for animal in animais}),
+            'agendamentos': sorted(excluidos['agendamento'] - {agendamento['id'] for agendamento in agendamentos}),
+        },
+    }
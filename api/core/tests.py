@@ -1,3 +1,667 @@
-from django.test import TestCase
+from datetime import date, datetime, time, timedelta
+from importlib import import_module
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+from agendamentos.models import Agendamento, AgendamentoDiario
+from animais.models import Animal
+from servicos.models import Servico
+from usuarios.models import Usuario
+from . import metricas, rbac, sincronizacao
+from .models import (
+    ACOES, BITS_PERMISSAO, RECURSO_TODOS, RECURSOS, Empresa, Permission, RegistroExclusao, Role, RolePermission,
+    UserRole, VersaoRBAC
+)
 
-# Create your tests here.
+
+class RBACTestCase(TestCase):
+    """
+    Base com um usuário, um role e a grade completa de permissões
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.usuario = Usuario.objects.create(username='funcionario', tipo='profissional')
+        VersaoRBAC.objects.get_or_create(pk=1)
+        cls.role = Role.objects.create(name='recepcao', display_name='Recepção')
+        cls.permissoes = {
+            (resource, action): Permission.objects.get_or_create(
+                resource=resource, action=action, defaults={'description': f'{action} {resource}'}
+            )[0]
+            for resource in RECURSOS + [RECURSO_TODOS]
+            for action in ACOES
+        }
+
+    def setUp(self):
+        # O cache e a versão guardada no processo não voltam com o rollback de cada teste
+        cache.clear()
+        rbac._local.update(versao=None, expira=0.0, usuarios={})
+        connection.rbac_alterado = False
+
+    def confirmar(self):
+        """
+        Executa as alterações do bloco como se a transação fosse confirmada no fim dele
+        """
+        return self.captureOnCommitCallbacks(execute=True)
+
+    def conceder(self, resource, action, role=None):
+        return RolePermission.objects.create(role=role or self.role, permission=self.permissoes[(resource, action)])
+
+    def atribuir(self, role=None, usuario=None):
+        return UserRole.objects.create(user=usuario or self.usuario, role=role or self.role)
+
+    def recarregar(self):
+        """
+        Retorna o usuário como a próxima requisição o carrega
+        """
+        return Usuario.objects.get(pk=self.usuario.pk)
+
+
+class PermissoesPorRequisicaoTests(RBACTestCase):
+    """
+    Roles e permissões carregados uma vez por objeto de usuário
+    """
+
+    def test_uma_consulta_por_requisicao(self):
+        with self.confirmar():
+            self.conceder('agendamentos', 'read')
+            self.atribuir()
+        usuario = self.recarregar()
+
+        with self.assertNumQueries(1):
+            self.assertTrue(usuario.has_permission('agendamentos', 'read'))
+        with self.assertNumQueries(0):
+            self.assertFalse(usuario.has_permission('agendamentos', 'delete'))
+            self.assertTrue(usuario.has_role('recepcao'))
+            self.assertEqual(usuario.get_permission_set(), {('agendamentos', 'read')})
+
+    def test_usuario_sem_roles(self):
+        usuario = self.recarregar()
+        self.assertEqual(usuario.get_role_names(), frozenset())
+        self.assertFalse(usuario.has_permission('agendamentos', 'read'))
+
+    def test_atribuicao_inativa_nao_conta(self):
+        with self.confirmar():
+            self.conceder('agendamentos', 'read')
+            atribuicao = self.atribuir()
+            atribuicao.is_active = False
+            atribuicao.save()
+        self.assertFalse(self.recarregar().has_permission('agendamentos', 'read'))
+
+
+class VersaoRBACTests(RBACTestCase):
+    """
+    Cache entre requisições invalidado pela versão do RBAC
+    """
+
+    def test_requisicao_seguinte_nao_consulta(self):
+        with self.confirmar():
+            self.conceder('agendamentos', 'read')
+            self.atribuir()
+        self.recarregar().has_permission('agendamentos', 'read')
+
+        usuario = self.recarregar()
+        with self.assertNumQueries(0):
+            self.assertTrue(usuario.has_permission('agendamentos', 'read'))
+
+    def test_versao_vem_do_processo_do_cache_e_do_banco(self):
+        with self.confirmar():
+            rbac.invalidar()
+        atual = VersaoRBAC.objects.get(pk=1).versao
+
+        with self.assertNumQueries(0):
+            self.assertEqual(rbac.versao(), atual)
+        # Outro processo: nada guardado localmente, versão publicada no cache
+        rbac._local.update(versao=None, expira=0.0, usuarios={})
+        with self.assertNumQueries(0):
+            self.assertEqual(rbac.versao(), atual)
+        # Cache vazio: a versão é lida do banco
+        rbac._local.update(versao=None, expira=0.0, usuarios={})
+        cache.clear()
+        with self.assertNumQueries(1):
+            self.assertEqual(rbac.versao(), atual)
+
+    def test_alteracoes_incrementam_a_versao(self):
+        alteracoes = [
+            lambda: self.conceder('animais', 'read'),
+            lambda: RolePermission.objects.filter(role=self.role).delete(),
+            lambda: self.atribuir(),
+            lambda: UserRole.objects.filter(user=self.usuario).delete(),
+            lambda: Role.objects.filter(pk=self.role.pk).first().save(),
+        ]
+        for alterar in alteracoes:
+            anterior = rbac.versao()
+            with self.confirmar():
+                alterar()
+            self.assertGreater(rbac.versao(), anterior)
+
+    def test_concessao_vale_na_mesma_requisicao_e_na_seguinte(self):
+        usuario = self.recarregar()
+        self.assertFalse(usuario.has_permission('servicos', 'update'))
+
+        with self.confirmar():
+            self.conceder('servicos', 'update')
+            self.atribuir()
+        self.assertTrue(usuario.has_permission('servicos', 'update'))
+        self.assertTrue(self.recarregar().has_permission('servicos', 'update'))
+
+    def test_revogacao_vale_na_mesma_requisicao_e_na_seguinte(self):
+        with self.confirmar():
+            concessao = self.conceder('servicos', 'update')
+            self.atribuir()
+        usuario = self.recarregar()
+        self.assertTrue(usuario.has_permission('servicos', 'update'))
+        self.recarregar().has_permission('servicos', 'update')  # Deixa a versão atual em cache
+
+        with self.confirmar():
+            concessao.delete()
+        self.assertFalse(usuario.has_permission('servicos', 'update'))
+        self.assertFalse(self.recarregar().has_permission('servicos', 'update'))
+
+    def test_transacao_da_alteracao_le_do_banco_sem_guardar_no_cache(self):
+        usuario = self.recarregar()
+        self.assertFalse(usuario.has_permission('servicos', 'update'))
+
+        # Ainda sem commit: a própria requisição já vê a alteração
+        self.conceder('servicos', 'update')
+        self.atribuir()
+        self.assertTrue(usuario.has_permission('servicos', 'update'))
+        # O que ainda pode ser desfeito não substitui o que está em cache
+        self.assertEqual(rbac._local['usuarios'][self.usuario.pk], (frozenset(), 0))
+
+    def test_lote_recalcula_a_mascara_e_a_versao_uma_vez(self):
+        with CaptureQueriesContext(connection) as consultas, self.confirmar():
+            with rbac.em_lote():
+                self.conceder('animais', 'read')
+                self.conceder('animais', 'update')
+                self.atribuir()
+                self.role.refresh_from_db()
+                self.assertEqual(self.role.permission_mask, 0)
+
+        atualizacoes = [consulta['sql'] for consulta in consultas if consulta['sql'].startswith('UPDATE')]
+        self.assertEqual(len([sql for sql in atualizacoes if VersaoRBAC._meta.db_table in sql]), 1)
+        self.assertEqual(len([sql for sql in atualizacoes if Role._meta.db_table in sql]), 1)
+        self.role.refresh_from_db()
+        self.assertEqual(
+            self.role.permission_mask,
+            Permission.bit('animais', 'read') | Permission.bit('animais', 'update')
+        )
+        self.assertTrue(self.recarregar().has_permission('animais', 'update'))
+
+
+class ClaimsTokenTests(RBACTestCase):
+    """
+    Roles e permissões embutidos no token de acesso
+    """
+
+    def setUp(self):
+        super().setUp()
+        with self.confirmar():
+            self.conceder('usuarios', 'read')
+            self.atribuir()
+
+    def token(self):
+        token = AccessToken.for_user(self.usuario)
+        rbac.adicionar_claims(token, self.usuario)
+        return token
+
+    def test_claims_do_token(self):
+        claims = self.token()[rbac.CLAIM]
+        self.assertEqual(claims['v'], rbac.versao())
+        self.assertEqual(claims['r'], ['recepcao'])
+        self.assertEqual(claims['p'], Permission.bit('usuarios', 'read'))
+
+    def test_token_atual_dispensa_consultas(self):
+        token = self.token()
+        usuario = self.recarregar()
+        with self.assertNumQueries(0):
+            self.assertTrue(rbac.aplicar_claims(usuario, token))
+            self.assertTrue(usuario.has_permission('usuarios', 'read'))
+            self.assertTrue(usuario.has_role('recepcao'))
+
+    def test_token_obsoleto_e_ignorado(self):
+        token = self.token()
+        with self.confirmar():
+            UserRole.objects.filter(user=self.usuario).delete()
+
+        usuario = self.recarregar()
+        self.assertFalse(rbac.aplicar_claims(usuario, token))
+        self.assertFalse(usuario.has_permission('usuarios', 'read'))
+
+    def test_claims_invalidos_sao_ignorados(self):
+        atual = rbac.versao()
+        for claims in [None, [], {'v': atual}, {'v': atual, 'p': '1'}, {'v': str(atual), 'r': [], 'p': 1}]:
+            token = AccessToken.for_user(self.usuario)
+            if claims is not None:
+                token[rbac.CLAIM] = claims
+            self.assertFalse(rbac.aplicar_claims(self.recarregar(), token))
+
+    def test_requisicao_com_token_de_permissao_revogada(self):
+        cliente = APIClient()
+        cliente.credentials(HTTP_AUTHORIZATION=f'Bearer {self.token()}')
+        self.assertEqual(cliente.get('/api/admin/users/').status_code, 200)
+
+        with self.confirmar():
+            RolePermission.objects.filter(role=self.role).delete()
+        self.assertEqual(cliente.get('/api/admin/users/').status_code, 403)
+
+
+class MascaraPermissoesTests(SimpleTestCase):
+    """
+    Grade de bits das permissões
+    """
+
+    def test_um_bit_distinto_por_par(self):
+        bits = [Permission.bit(resource, action) for resource in RECURSOS for action in ACOES]
+        self.assertEqual(len(set(bits)), len(RECURSOS) * len(ACOES))
+        for bit in bits:
+            self.assertEqual(bin(bit).count('1'), 1)
+            self.assertLess(bit, 1 << 63)
+
+    def test_par_desconhecido_nao_tem_bit(self):
+        self.assertEqual(Permission.bit('inexistente', 'read'), 0)
+        self.assertEqual(Permission.mascara([('inexistente', 'read')]), 0)
+
+    def test_mascara_e_pares(self):
+        pares = {('agendamentos', 'read'), ('animais', 'update')}
+        mascara = Permission.mascara(pares)
+        self.assertEqual(mascara, Permission.bit('agendamentos', 'read') | Permission.bit('animais', 'update'))
+        self.assertEqual(Permission.pares(mascara), pares)
+
+
+class MascaraRoleTests(RBACTestCase):
+    """
+    Máscara do role mantida pelos signals de RolePermission
+    """
+
+    def test_concessao_e_retirada_atualizam_a_mascara(self):
+        concessao = self.conceder('agendamentos', 'read')
+        self.conceder('animais', 'list')
+        self.role.refresh_from_db()
+        self.assertTrue(self.role.has_permission('agendamentos', 'read'))
+        self.assertTrue(self.role.has_permission('animais', 'list'))
+        self.assertFalse(self.role.has_permission('agendamentos', 'delete'))
+
+        concessao.delete()
+        self.role.refresh_from_db()
+        self.assertFalse(self.role.has_permission('agendamentos', 'read'))
+        self.assertTrue(self.role.has_permission('animais', 'list'))
+
+    def test_atualizar_mascara_permissoes(self):
+        self.conceder('servicos', 'update')
+        Role.objects.filter(pk=self.role.pk).update(permission_mask=0)
+
+        mascara = Role.atualizar_mascara_permissoes(self.role.pk)
+        self.role.refresh_from_db()
+        self.assertEqual(mascara, Permission.bit('servicos', 'update'))
+        self.assertEqual(self.role.permission_mask, mascara)
+
+    def test_permissao_alterada_recalcula_os_roles(self):
+        self.conceder('relatorios', 'read')
+        self.permissoes[('relatorios', 'list')].delete()
+
+        permissao = self.permissoes[('relatorios', 'read')]
+        permissao.action = 'list'
+        permissao.save()
+        self.role.refresh_from_db()
+        self.assertFalse(self.role.has_permission('relatorios', 'read'))
+        self.assertTrue(self.role.has_permission('relatorios', 'list'))
+
+    def test_includes(self):
+        outro = Role.objects.create(name='auxiliar', display_name='Auxiliar')
+        self.conceder('animais', 'read')
+        self.conceder('animais', 'update')
+        self.conceder('animais', 'read', role=outro)
+        self.role.refresh_from_db()
+        outro.refresh_from_db()
+        self.assertTrue(self.role.includes(outro))
+        self.assertFalse(outro.includes(self.role))
+
+    def test_usuario_combina_os_roles_ativos(self):
+        outro = Role.objects.create(name='auxiliar', display_name='Auxiliar')
+        self.conceder('animais', 'read')
+        self.conceder('servicos', 'read', role=outro)
+        with self.confirmar():
+            self.atribuir()
+            self.atribuir(outro)
+        usuario = self.recarregar()
+        self.assertEqual(usuario.get_permission_set(), {('animais', 'read'), ('servicos', 'read')})
+        self.assertEqual(usuario.get_role_names(), {'recepcao', 'auxiliar'})
+
+
+class FechoPermissaoTests(RBACTestCase):
+    """
+    Permissões implícitas: manage implica todas as ações e * todos os recursos
+    """
+
+    def test_manage_implica_todas_as_acoes_do_recurso(self):
+        mascara = Permission.mascara([('animais', 'manage')])
+        self.assertEqual(Permission.pares(mascara), {('animais', action) for action in ACOES})
+
+    def test_recurso_todos_implica_a_acao_em_todos_os_recursos(self):
+        mascara = Permission.mascara([(RECURSO_TODOS, 'read')])
+        self.assertEqual(Permission.pares(mascara), {(resource, 'read') for resource in RECURSOS})
+
+    def test_recurso_todos_com_manage_concede_a_grade_inteira(self):
+        self.assertEqual(Permission.pares(Permission.mascara([(RECURSO_TODOS, 'manage')])), set(BITS_PERMISSAO))
+
+    def test_usuario_com_manage(self):
+        self.conceder('agendamentos', 'manage')
+        with self.confirmar():
+            self.atribuir()
+        usuario = self.recarregar()
+        for action in ACOES:
+            self.assertTrue(usuario.has_permission('agendamentos', action))
+        self.assertFalse(usuario.has_permission('animais', 'read'))
+
+    def test_permissoes_do_usuario_incluem_as_implicitas(self):
+        self.conceder('servicos', 'manage')
+        self.permissoes[('servicos', 'delete')].delete()
+        with self.confirmar():
+            self.atribuir()
+
+        permissoes = self.recarregar().get_permissions()
+        self.assertEqual([(p.resource, p.action) for p in permissoes], sorted(('servicos', a) for a in ACOES))
+        # O par sem linha no banco volta como instância não salva
+        excluir = next(p for p in permissoes if p.action == 'delete')
+        self.assertIsNone(excluir.pk)
+        self.assertEqual(excluir.description, str(excluir))
+
+    def test_migracao_retira_o_delete_implicito_do_veterinario(self):
+        migracao = import_module('core.migrations.0011_veterinario_acoes_explicitas')
+        veterinario = Role.objects.create(name='veterinario', display_name='Veterinário')
+        for resource in migracao.RECURSOS_VETERINARIO:
+            self.conceder(resource, 'manage', role=veterinario)
+        self.conceder('relatorios', 'read', role=veterinario)
+        veterinario.refresh_from_db()
+        self.assertTrue(veterinario.has_permission('agendamentos', 'delete'))
+        anterior = VersaoRBAC.objects.get(pk=1).versao
+
+        migracao.trocar_manage_por_acoes(apps, None)
+
+        veterinario.refresh_from_db()
+        for resource in migracao.RECURSOS_VETERINARIO:
+            self.assertFalse(veterinario.has_permission(resource, 'delete'))
+            self.assertFalse(veterinario.has_permission(resource, 'manage'))
+            for action in migracao.ACOES_VETERINARIO:
+                self.assertTrue(veterinario.has_permission(resource, action))
+        self.assertTrue(veterinario.has_permission('relatorios', 'read'))
+        # A máscara gravada pela migração é a mesma que os signals calculariam
+        self.assertEqual(veterinario.permission_mask, Role.atualizar_mascara_permissoes(veterinario.pk))
+        self.assertGreater(VersaoRBAC.objects.get(pk=1).versao, anterior)
+
+
+class MetricasTests(TestCase):
+    """
+    Janelas de datas das métricas dos dashboards
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        empresa = Empresa.objects.create(nome='Clínica Teste')
+        cliente = Usuario.objects.create(username='cliente', tipo='cliente')
+        animal = Animal.objects.create(nome='Rex', especie='Cão', dono=cliente, empresa=empresa)
+        consulta = Servico.objects.create(nome='Consulta', preco=80, duracao=30, empresa=empresa)
+        for dia in (date(2030, 2, 27), date(2030, 3, 1), date(2030, 3, 31), date(2030, 4, 2)):
+            Agendamento.objects.create(
+                empresa=empresa, cliente=cliente, animal=animal, servico=consulta, status='confirmado',
+                data_hora=timezone.make_aware(datetime.combine(dia, time(10))),
+            )
+        cls.periodos = metricas.Periodos(hoje=date(2030, 3, 15))
+
+    def test_mes_calendario(self):
+        dados = metricas.calcular(['agendamentos_mes'], self.periodos)
+        self.assertEqual(dados['agendamentos_mes'], 2)
+
+    def test_desde_o_inicio_do_mes_inclui_os_meses_seguintes(self):
+        dados = metricas.calcular(['agendamentos_desde_inicio_mes', 'faturamento_mes'], self.periodos)
+        self.assertEqual(dados['agendamentos_desde_inicio_mes'], 3)
+        self.assertEqual(dados['faturamento_mes'], 240)
+
+
+class SincronizacaoTests(TestCase):
+    """
+    Sincronização incremental: token com margem, marcas de exclusão e retenção
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Clínica Teste')
+        cls.cliente = Usuario.objects.create(username='cliente', tipo='cliente')
+        cls.outro_cliente = Usuario.objects.create(username='outro', tipo='cliente')
+        cls.consulta = Servico.objects.create(nome='Consulta', preco=80, duracao=30, empresa=cls.empresa)
+
+    def setUp(self):
+        self.animal = Animal.objects.create(nome='Rex', especie='Cão', dono=self.cliente, empresa=self.empresa)
+        self.agendamento = Agendamento.objects.create(
+            empresa=self.empresa, cliente=self.cliente, animal=self.animal, servico=self.consulta,
+            status='confirmado', data_hora=timezone.make_aware(datetime(2030, 3, 4, 10)),
+        )
+
+    def envelhecer(self, *objetos, segundos=3600):
+        """
+        Recua o atualizado_em dos objetos, como se tivessem sido gravados antes
+        """
+        instante = timezone.now() - timedelta(seconds=segundos)
+        for objeto in objetos:
+            type(objeto).objects.filter(pk=objeto.pk).update(atualizado_em=instante)
+
+    def token_de(self, segundos):
+        return sincronizacao.codificar_token(timezone.now() - timedelta(seconds=segundos))
+
+    def test_sem_token_retorna_tudo(self):
+        dados = sincronizacao.sincronizar(self.cliente)
+        self.assertTrue(dados['completo'])
+        self.assertEqual([a['id'] for a in dados['animais']], [self.animal.pk])
+        self.assertEqual([a['id'] for a in dados['agendamentos']], [self.agendamento.pk])
+        self.assertEqual(dados['excluidos'], {'animais': [], 'agendamentos': []})
+
+    @override_settings(SINCRONIZACAO_MARGEM=120)
+    def test_proximo_token_recua_a_margem(self):
+        antes = timezone.now()
+        dados = sincronizacao.sincronizar(self.cliente)
+        depois = timezone.now()
+        instante = sincronizacao.decodificar_token(dados['token'])
+        self.assertGreaterEqual(instante, antes - timedelta(seconds=120))
+        self.assertLessEqual(instante, depois - timedelta(seconds=120))
+
+    def test_margem_padrao_de_trinta_segundos(self):
+        antes = timezone.now()
+        instante = sincronizacao.decodificar_token(sincronizacao.sincronizar(self.cliente)['token'])
+        self.assertLessEqual(instante, timezone.now() - timedelta(seconds=30))
+        self.assertGreaterEqual(instante, antes - timedelta(seconds=30))
+
+    def test_incremental_retorna_apenas_os_alterados(self):
+        self.envelhecer(self.agendamento)
+        dados = sincronizacao.sincronizar(self.cliente, self.token_de(600))
+        self.assertFalse(dados['completo'])
+        self.assertEqual([a['id'] for a in dados['animais']], [self.animal.pk])
+        self.assertEqual(dados['agendamentos'], [])
+
+    def test_gravacao_dentro_da_margem_volta_na_sincronizacao_seguinte(self):
+        self.envelhecer(self.animal, self.agendamento)
+        token = sincronizacao.sincronizar(self.cliente, self.token_de(600))['token']
+        # Gravada antes da sincronização anterior, mas confirmada depois que ela leu os dados
+        self.envelhecer(self.agendamento, segundos=10)
+        dados = sincronizacao.sincronizar(self.cliente, token)
+        self.assertEqual([a['id'] for a in dados['agendamentos']], [self.agendamento.pk])
+        self.assertEqual(dados['animais'], [])
+
+    def test_exclusao_gera_marca(self):
+        token = self.token_de(600)
+        agendamento_id = self.agendamento.pk
+        self.agendamento.delete()
+        dados = sincronizacao.sincronizar(self.cliente, token)
+        self.assertEqual(dados['excluidos']['agendamentos'], [agendamento_id])
+
+    def test_troca_de_cliente_gera_marca_para_o_anterior(self):
+        token = self.token_de(600)
+        self.animal.dono = self.outro_cliente
+        self.animal.save()
+        self.agendamento.cliente = self.outro_cliente
+        self.agendamento.save()
+
+        dados = sincronizacao.sincronizar(self.cliente, token)
+        self.assertEqual(dados['excluidos'], {'animais': [self.animal.pk], 'agendamentos': [self.agendamento.pk]})
+        self.assertEqual(dados['animais'], [])
+
+        novo_dono = sincronizacao.sincronizar(self.outro_cliente, token)
+        self.assertEqual([a['id'] for a in novo_dono['animais']], [self.animal.pk])
+        self.assertEqual(novo_dono['excluidos'], {'animais': [], 'agendamentos': []})
+
+    def test_registro_que_voltou_vem_apenas_como_alterado(self):
+        token = self.token_de(600)
+        self.animal.dono = self.outro_cliente
+        self.animal.save()
+        self.animal.dono = self.cliente
+        self.animal.save()
+
+        dados = sincronizacao.sincronizar(self.cliente, token)
+        self.assertEqual([a['id'] for a in dados['animais']], [self.animal.pk])
+        self.assertEqual(dados['excluidos']['animais'], [])
+
+    def test_marca_anterior_ao_token_nao_e_enviada(self):
+        self.agendamento.delete()
+        RegistroExclusao.objects.update(excluido_em=timezone.now() - timedelta(hours=1))
+        dados = sincronizacao.sincronizar(self.cliente, self.token_de(600))
+        self.assertEqual(dados['excluidos']['agendamentos'], [])
+
+    def test_exclusao_do_usuario_nao_gera_marcas(self):
+        self.cliente.delete()
+        self.assertFalse(RegistroExclusao.objects.exists())
+
+    @override_settings(SINCRONIZACAO_RETENCAO_DIAS=90)
+    def test_token_anterior_a_retencao_recebe_carga_completa(self):
+        self.envelhecer(self.animal, self.agendamento, segundos=100 * 86400)
+        self.agendamento.delete()
+        dados = sincronizacao.sincronizar(self.cliente, self.token_de(91 * 86400))
+        self.assertTrue(dados['completo'])
+        self.assertEqual([a['id'] for a in dados['animais']], [self.animal.pk])
+        self.assertEqual(dados['excluidos'], {'animais': [], 'agendamentos': []})
+
+    @override_settings(SINCRONIZACAO_RETENCAO_DIAS=90)
+    def test_limpar_exclusoes_antigas(self):
+        antiga = RegistroExclusao.objects.create(modelo='animal', objeto_id=1, usuario=self.cliente)
+        RegistroExclusao.objects.filter(pk=antiga.pk).update(excluido_em=timezone.now() - timedelta(days=91))
+        recente = RegistroExclusao.objects.create(modelo='animal', objeto_id=2, usuario=self.cliente)
+
+        self.assertEqual(sincronizacao.limpar_exclusoes_antigas(), 1)
+        self.assertEqual(list(RegistroExclusao.objects.values_list('pk', flat=True)), [recente.pk])
+
+    def test_token_invalido(self):
+        for token in ('nao-e-token', sincronizacao.codificar_token(datetime(2030, 3, 4, 10))):
+            with self.assertRaises(sincronizacao.TokenInvalido):
+                sincronizacao.decodificar_token(token)
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.cliente)
+
+        resposta = client.get('/api/sync/')
+        self.assertEqual(resposta.status_code, 200)
+        self.assertTrue(resposta.data['completo'])
+
+        resposta = client.get('/api/sync/', {'desde': resposta.data['token']})
+        self.assertEqual(resposta.status_code, 200)
+        self.assertFalse(resposta.data['completo'])
+
+        resposta = client.get('/api/sync/', {'desde': 'nao-e-token'})
+        self.assertEqual(resposta.status_code, 400)
+
+
+class CacheMetricasTests(TestCase):
+    """
+    Reaproveitamento das métricas em cache e invalidação pelas fontes ao confirmar a transação
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.empresa = Empresa.objects.create(nome='Clínica Teste')
+        cls.cliente = Usuario.objects.create(username='cliente', tipo='cliente')
+        cls.consulta = Servico.objects.create(nome='Consulta', preco=80, duracao=30, empresa=cls.empresa)
+
+    def setUp(self):
+        cache.clear()
+
+    def criar_animal(self, nome='Rex'):
+        return Animal.objects.create(nome=nome, especie='Cão', dono=self.cliente, empresa=self.empresa)
+
+    def agendar(self, dia):
+        return Agendamento.objects.create(
+            empresa=self.empresa, cliente=self.cliente, animal=self.criar_animal(), servico=self.consulta,
+            status='confirmado', data_hora=timezone.make_aware(datetime.combine(dia, time(10))),
+        )
+
+    def receita_em_cache(self):
+        return metricas.em_cache(
+            'receita', ['agendamentos'], lambda: AgendamentoDiario.objects.aggregate(total=Sum('receita'))['total']
+        )
+
+    def test_resultado_reaproveitado_sem_consultas(self):
+        self.assertEqual(metricas.calcular_em_cache(['animais_total']), {'animais_total': 0})
+        with self.assertNumQueries(0):
+            self.assertEqual(metricas.calcular_em_cache(['animais_total']), {'animais_total': 0})
+
+    def test_invalidado_quando_a_transacao_e_confirmada(self):
+        metricas.calcular_em_cache(['animais_total'])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.criar_animal()
+            # Antes do commit o resultado guardado continua valendo
+            self.assertEqual(metricas.calcular_em_cache(['animais_total']), {'animais_total': 0})
+        self.assertEqual(metricas.calcular_em_cache(['animais_total']), {'animais_total': 0})
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(metricas.calcular_em_cache(['animais_total']), {'animais_total': 1})
+
+    def test_exclusao_invalida(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            animal = self.criar_animal()
+        self.assertEqual(metricas.calcular_em_cache(['animais_total']), {'animais_total': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            animal.delete()
+        self.assertEqual(metricas.calcular_em_cache(['animais_total']), {'animais_total': 0})
+
+    def test_outra_fonte_nao_invalida(self):
+        metricas.calcular_em_cache(['animais_total'])
+        with self.captureOnCommitCallbacks(execute=True):
+            Servico.objects.create(nome='Banho', preco=50, duracao=60, empresa=self.empresa)
+            Usuario.objects.create(username='outro', tipo='cliente')
+        with self.assertNumQueries(0):
+            metricas.calcular_em_cache(['animais_total'])
+
+    def test_metricas_de_varias_fontes(self):
+        nomes = ['animais_total', 'clientes_total']
+        self.assertEqual(metricas.calcular_em_cache(nomes), {'animais_total': 0, 'clientes_total': 1})
+        with self.captureOnCommitCallbacks(execute=True):
+            Usuario.objects.create(username='outro', tipo='cliente')
+        # A ordem dos nomes não muda a chave, e a troca de qualquer fonte recalcula o conjunto
+        self.assertEqual(metricas.calcular_em_cache(nomes[::-1]), {'animais_total': 0, 'clientes_total': 2})
+
+    def test_agendamentos_e_receita(self):
+        dia = date(2030, 3, 4)
+        self.assertEqual(metricas.calcular_em_cache(['agendamentos_total']), {'agendamentos_total': 0})
+        with self.captureOnCommitCallbacks(execute=True):
+            self.agendar(dia)
+        self.assertEqual(metricas.calcular_em_cache(['agendamentos_total']), {'agendamentos_total': 1})
+
+        # A troca de preço regrava a receita do resumo diário, que é fonte das métricas de agendamentos
+        self.assertEqual(self.receita_em_cache(), 80)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.consulta.preco = 100
+            self.consulta.save()
+        self.assertEqual(self.receita_em_cache(), 100)
+
+    def test_versoes_compartilhadas_entre_chaves(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(metricas.em_cache('fixo', ['animais'], lambda: 'antigo'), 'antigo')
+            self.assertEqual(metricas.em_cache('fixo', ['animais'], lambda: 'novo'), 'antigo')
+        with self.captureOnCommitCallbacks(execute=True):
+            metricas.invalidar('animais')
+        self.assertEqual(metricas.em_cache('fixo', ['animais'], lambda: 'novo'), 'novo')
@@ -10,6 +10,7 @@ urlpatterns = [
     path('brand/<int:pk>/ativar/', views.activate_brand_config, name='activate_brand_config'),
     path('clinica/info/', views.info_clinica, name='info_clinica'),
     path('horarios-funcionamento/', views.horarios_funcionamento, name='horarios_funcionamento'),
+    path('sync/', views.sincronizar, name='sincronizar'),  # GET - alterações desde o último token
     
     # URLs para roles e permissões
     path('admin/roles/', views.get_roles, name='get_roles'),  # GET - listar roles
@@ -4,9 +4,9 @@ from rest_framework.decorators import api_view, permission_classes, action
 from rest_framework.response import Response
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.permissions import IsAuthenticated
-from django.utils import timezone
-from datetime import datetime, timedelta
-from django.db.models import Count, Sum, Q
+from datetime import datetime
+from django.db.models import Sum, Q
+from django.db.models.functions import Coalesce
 from django.db import transaction
 from .models import Empresa, ConfiguracaoBrand, Role, Permission, RolePermission, UserRole
 from agendamentos.models import Agendamento
@@ -15,6 +15,7 @@ from .serializers import (EmpresaSerializer, ConfiguracaoBrandSerializer,
                          RoleSerializer, PermissionSerializer, RolePermissionSerializer, 
                          UserRoleSerializer, AssignRoleSerializer, UserPermissionsSerializer)
 from .permissions import PermissionChecker, require_permission, HasPermission, require_role
+from . import metricas, rbac, sincronizacao
 from usuarios.models import Usuario
 from usuarios.serializers import UsuarioSerializer
 from animais.models import Animal
@@ -245,6 +246,19 @@ def horarios_funcionamento(request):
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+def _servicos_populares():
+    servicos = Servico.objects.annotate(
+        quantidade=Coalesce(Sum('agendamentos_diarios__quantidade'), 0)
+    ).order_by('-quantidade')[:5]
+    return [
+        {
+            'nome': servico.nome,
+            'quantidade': servico.quantidade
+        }
+        for servico in servicos
+    ]
+
+
 @api_view(['GET'])
 @permission_classes([permissions.IsAuthenticated])
 @require_role('admin')
@@ -253,46 +267,24 @@ def dashboard_stats(request):
     Retorna estatísticas do dashboard para admin
     """
     try:
-        hoje = timezone.now().date()
-        inicio_mes = hoje.replace(day=1)
-        
-        # Estatísticas básicas
-        total_agendamentos = Agendamento.objects.count()
-        agendamentos_hoje = Agendamento.objects.filter(data_hora__date=hoje).count()
-        agendamentos_pendentes = Agendamento.objects.filter(data_hora__gt=timezone.now()).count()
-        
-        # Faturamento do mês
-        faturamento_mes = Agendamento.objects.filter(
-            data_hora__date__gte=inicio_mes
-        ).aggregate(
-            total=Sum('servico__preco')
-        )['total'] or 0
-        
-        # Clientes ativos (que fizeram agendamento nos últimos 30 dias)
-        clientes_ativos = Usuario.objects.filter(
-            agendamentos_cliente__data_hora__gte=timezone.now() - timedelta(days=30),
-            tipo='cliente'
-        ).distinct().count()
-        
-        # Serviços mais populares
-        servicos_populares = Servico.objects.annotate(
-            quantidade=Count('agendamentos')
-        ).order_by('-quantidade')[:5]
-        
-        servicos_data = [
-            {
-                'nome': servico.nome,
-                'quantidade': servico.quantidade
-            }
-            for servico in servicos_populares
-        ]
+        # Contagens, faturamento do mês e clientes ativos (com agendamento nos últimos 30 dias) em uma consulta
+        dados = metricas.calcular_em_cache([
+            'agendamentos_total',
+            'agendamentos_hoje',
+            'agendamentos_futuros',
+            'faturamento_mes',
+            'clientes_com_agendamento_recente',
+        ])
+        
+        # Serviços mais populares, somados do resumo diário
+        servicos_data = metricas.em_cache('servicos_populares', ['agendamentos', 'servicos'], _servicos_populares)
         
         return Response({
-            'totalAgendamentos': total_agendamentos,
-            'agendamentosHoje': agendamentos_hoje,
-            'agendamentosPendentes': agendamentos_pendentes,
-            'faturamentoMes': float(faturamento_mes),
-            'clientesAtivos': clientes_ativos,
+            'totalAgendamentos': dados['agendamentos_total'],
+            'agendamentosHoje': dados['agendamentos_hoje'],
+            'agendamentosPendentes': dados['agendamentos_futuros'],
+            'faturamentoMes': float(dados['faturamento_mes']),
+            'clientesAtivos': dados['clientes_com_agendamento_recente'],
             'servicosPopulares': servicos_data
         })
         
@@ -522,12 +514,13 @@ def user_permissions(request, user_id=None):
             'id': user.id,
             'nome': user.nome,
             'email': user.email,
-            'tipo_usuario': user.tipo_usuario
+            'tipo_usuario': user.tipo
         },
-        'roles': [{'name': role.name, 'display_name': role.display_name, 'description': role.description} for role in roles],
+        'roles': [{'name': user_role.role.name, 'display_name': user_role.role.display_name, 'description': user_role.role.description} for user_role in roles],
+        # Permissões efetivas, com as implícitas de manage e do recurso *
         'permissions': [{'resource': perm.resource, 'action': perm.action, 'description': perm.description, 'codename': perm.codename} for perm in permissions],
         'total_roles': roles.count(),
-        'total_permissions': permissions.count()
+        'total_permissions': len(permissions)
     })
 
 
@@ -546,6 +539,23 @@ def can_access_admin(request):
     return Response({'can_access_admin': has_admin})
 
 
+@api_view(['GET'])
+@permission_classes([permissions.IsAuthenticated])
+def sincronizar(request):
+    """
+    Retorna os animais e agendamentos do usuário logado alterados ou excluídos desde o token `desde`
+    """
+    try:
+        return Response(sincronizacao.sincronizar(request.user, request.GET.get('desde')))
+    except sincronizacao.TokenInvalido as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        return Response({
+            'error': 'Erro ao sincronizar',
+            'detail': str(e)
+        }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 @require_permission('usuarios', 'read')
@@ -569,28 +579,31 @@ def create_role(request):
     """Criar novo role"""
     try:
         with transaction.atomic():
-            role_data = {
-                'name': request.data.get('name'),
-                'display_name': request.data.get('display_name'),
-                'description': request.data.get('description', ''),
-                'is_active': True
-            }
-            
-            role = Role.objects.create(**role_data)
-            
-            # Atribuir permissões
-            permissions = request.data.get('permissions', [])
-            for perm_id in permissions:
-                try:
-                    permission = Permission.objects.get(id=perm_id)
-                    RolePermission.objects.create(
-                        role=role,
-                        permission=permission,
-                        granted_by=request.user
-                    )
-                except Permission.DoesNotExist:
-                    continue
-            
+            with rbac.em_lote():
+                role_data = {
+                    'name': request.data.get('name'),
+                    'display_name': request.data.get('display_name'),
+                    'description': request.data.get('description', ''),
+                    'is_active': True
+                }
+
+                role = Role.objects.create(**role_data)
+
+                # Atribuir permissões
+                permissions = request.data.get('permissions', [])
+                for perm_id in permissions:
+                    try:
+                        permission = Permission.objects.get(id=perm_id)
+                        RolePermission.objects.create(
+                            role=role,
+                            permission=permission,
+                            granted_by=request.user
+                        )
+                    except Permission.DoesNotExist:
+                        continue
+
+            # A máscara de permissões é gravada no fim do lote, fora desta instância
+            role.refresh_from_db()
             serializer = RoleSerializer(role)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
             
@@ -609,7 +622,8 @@ def update_role(request, role_id):
         role.name = request.data.get('name', role.name)
         role.display_name = request.data.get('display_name', role.display_name)
         role.description = request.data.get('description', role.description)
-        role.save()
+        # Gravar só os campos editados, sem sobrescrever a máscara mantida pelos signals
+        role.save(update_fields=['name', 'display_name', 'description', 'updated_at'])
         
         serializer = RoleSerializer(role)
         return Response(serializer.data)
@@ -628,7 +642,7 @@ def delete_role(request, role_id):
     try:
         role = Role.objects.get(id=role_id)
         role.is_active = False
-        role.save()
+        role.save(update_fields=['is_active', 'updated_at'])
         return Response({'message': 'Role desativado com sucesso'})
         
     except Role.DoesNotExist:
@@ -643,7 +657,7 @@ def toggle_role_status(request, role_id):
     try:
         role = Role.objects.get(id=role_id)
         role.is_active = not role.is_active
-        role.save()
+        role.save(update_fields=['is_active', 'updated_at'])
         
         status_text = 'ativado' if role.is_active else 'desativado'
         return Response({'message': f'Role {status_text} com sucesso'})
@@ -671,7 +685,8 @@ def assign_permissions(request, role_id):
         role = Role.objects.get(id=role_id)
         permissions = request.data.get('permissions', [])
         
-        with transaction.atomic():
+        # Uma máscara recalculada e uma versão incrementada no fim, e não uma por permissão
+        with transaction.atomic(), rbac.em_lote():
             # Limpar permissões existentes
             RolePermission.objects.filter(role=role).delete()
             
@@ -726,7 +741,7 @@ def assign_user_roles(request):
         
         user = Usuario.objects.get(id=user_id)
         
-        with transaction.atomic():
+        with transaction.atomic(), rbac.em_lote():
             # Limpar roles existentes
             UserRole.objects.filter(user=user).delete()
             
@@ -756,16 +771,13 @@ def assign_user_roles(request):
 def get_role_stats(request):
     """Buscar estatísticas de roles"""
     try:
-        roles_count = Role.objects.filter(is_active=True).count()
-        permissions_count = Permission.objects.count()
-        users_count = Usuario.objects.filter(is_active=True).count()
-        assignments_count = UserRole.objects.filter(is_active=True).count()
+        dados = metricas.calcular_em_cache(['roles_ativos', 'permissoes_total', 'usuarios_ativos', 'atribuicoes_ativas'])
         
         return Response({
-            'rolesCount': roles_count,
-            'permissionsCount': permissions_count,
-            'usersCount': users_count,
-            'assignmentsCount': assignments_count
+            'rolesCount': dados['roles_ativos'],
+            'permissionsCount': dados['permissoes_total'],
+            'usersCount': dados['usuarios_ativos'],
+            'assignmentsCount': dados['atribuicoes_ativas']
         })
         
     except Exception as e:
@@ -989,23 +1001,15 @@ def toggle_cliente_status(request, cliente_id):
 def get_cliente_stats(request):
     """Buscar estatísticas de clientes"""
     try:
-        total_clientes = Usuario.objects.filter(tipo='cliente').count()
-        clientes_ativos = Usuario.objects.filter(tipo='cliente', is_active=True).count()
-        total_animais = Animal.objects.count()
-        
-        # Agendamentos do mês atual (usando 'data_hora' em vez de 'data')
-        from datetime import datetime, timedelta
-        hoje = datetime.now()
-        inicio_mes = hoje.replace(day=1)
-        agendamentos_mes = Agendamento.objects.filter(
-            data_hora__gte=inicio_mes
-        ).count()
+        dados = metricas.calcular_em_cache([
+            'clientes_total', 'clientes_ativos', 'animais_total', 'agendamentos_desde_inicio_mes'
+        ])
         
         return Response({
-            'totalClientes': total_clientes,
-            'clientesAtivos': clientes_ativos,
-            'totalAnimais': total_animais,
-            'agendamentosMes': agendamentos_mes
+            'totalClientes': dados['clientes_total'],
+            'clientesAtivos': dados['clientes_ativos'],
+            'totalAnimais': dados['animais_total'],
+            'agendamentosMes': dados['agendamentos_desde_inicio_mes']
         })
     except Exception as e:
         return Response({'error': str(e)}, status=400)
@@ -1137,24 +1141,14 @@ def update_animal(request, animal_id):
 def get_animal_stats(request):
     """Buscar estatísticas de animais"""
     try:
-        total_animais = Animal.objects.count()
-        # Como não há campo is_active, todos os animais são considerados ativos
-        animais_ativos = Animal.objects.count()
-        total_clientes = Usuario.objects.filter(tipo='cliente').count()
-        
-        # Agendamentos do mês atual (usando 'data_hora' em vez de 'data')
-        from datetime import datetime, timedelta
-        hoje = datetime.now()
-        inicio_mes = hoje.replace(day=1)
-        agendamentos_mes = Agendamento.objects.filter(
-            data_hora__gte=inicio_mes
-        ).count()
+        dados = metricas.calcular_em_cache(['animais_total', 'clientes_total', 'agendamentos_desde_inicio_mes'])
         
         return Response({
-            'totalAnimais': total_animais,
-            'animaisAtivos': animais_ativos,
-            'totalClientes': total_clientes,
-            'agendamentosMes': agendamentos_mes
+            'totalAnimais': dados['animais_total'],
+            # Como não há campo is_active, todos os animais são considerados ativos
+            'animaisAtivos': dados['animais_total'],
+            'totalClientes': dados['clientes_total'],
+            'agendamentosMes': dados['agendamentos_desde_inicio_mes']
         })
     except Exception as e:
         return Response({'error': str(e)}, status=400)
@@ -33,41 +33,74 @@ class Usuario(AbstractUser):
   def __str__(self):
     return self.nome or self.email or self.username
 
+  def _carregar_rbac(self):
+    """
+    Carrega os roles ativos do usuário e a máscara das permissões deles, se ainda não estiverem carregados na versão atual
+
+    O resultado fica guardado no objeto, que o DRF cria a cada requisição
+    ao autenticar, então todas as verificações da requisição são operações
+    de bits. Entre requisições ele vem do cache de core.rbac, sem consulta
+    ao banco enquanto nenhum role ou permissão for alterado. Uma alteração
+    feita no meio da requisição muda a versão e as permissões são
+    recarregadas na verificação seguinte.
+    """
+    from core import rbac  # Import local para evitar import circular
+    if not rbac.vigente(getattr(self, '_rbac_versao', None)):
+      self._rbac_versao = None if rbac.alterado_na_transacao() else rbac.versao()
+      self._role_names, self._permission_mask = rbac.obter(self.pk)
+
+  def get_role_names(self):
+    """
+    Retornar os nomes dos roles ativos do usuário (frozenset)
+    """
+    self._carregar_rbac()
+    return self._role_names
+
+  def get_permission_mask(self):
+    """
+    Retornar a máscara de bits das permissões do usuário (OR das máscaras dos roles ativos)
+    """
+    self._carregar_rbac()
+    return self._permission_mask
+
+  def get_permission_set(self):
+    """
+    Retornar as permissões do usuário como frozenset de (resource, action)
+    """
+    from core.models import Permission  # Import local para evitar import circular
+    return Permission.pares(self.get_permission_mask())
+
+  def clear_rbac_cache(self):
+    """
+    Descartar os roles e permissões carregados, para que a próxima verificação consulte o banco
+    """
+    self._role_names = None
+    self._permission_mask = None
+    self._rbac_versao = None
+
+  def refresh_from_db(self, *args, **kwargs):
+    super().refresh_from_db(*args, **kwargs)
+    self.clear_rbac_cache()
+
   def has_role(self, role_name):
-    from core.models import UserRole  # Import local para evitar import circular
-    return UserRole.objects.filter(user=self, role__name=role_name, is_active=True).exists()
+    return role_name in self.get_role_names()
 
   def has_permission(self, resource, action):
     """
     Verificar se o usuário tem uma permissão específica
     """
-    from core.models import UserRole, RolePermission  # Import local para evitar import circular
-    
-    # Buscar roles ativos do usuário
-    user_roles = UserRole.objects.filter(user=self, is_active=True).values_list('role_id', flat=True)
-    
-    # Buscar permissões dos roles do usuário
-    permissions = RolePermission.objects.filter(
-        role_id__in=user_roles,
-        permission__resource=resource,
-        permission__action=action
-    )
-    
-    return permissions.exists()
+    from core.models import Permission  # Import local para evitar import circular
+    return bool(self.get_permission_mask() & Permission.bit(resource, action))
 
   def get_permissions(self):
     """
-    Retornar todas as permissões do usuário
+    Retornar todas as permissões efetivas do usuário, incluindo as implícitas (manage e recurso *)
+
+    Vêm da mesma máscara usada por has_permission, então a lista sempre
+    concorda com as verificações.
     """
-    from core.models import UserRole, RolePermission  # Import local para evitar import circular
-    
-    # Buscar roles ativos do usuário
-    user_roles = UserRole.objects.filter(user=self, is_active=True).values_list('role_id', flat=True)
-    
-    # Buscar permissões dos roles do usuário
-    permissions = RolePermission.objects.filter(role_id__in=user_roles).select_related('permission')
-    
-    return [rp.permission for rp in permissions]
+    from core.models import Permission  # Import local para evitar import circular
+    return Permission.da_mascara(self.get_permission_mask())
 
   def get_roles(self):
     """
@@ -7,6 +7,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from django.contrib.auth import authenticate
 from .serializers import LoginSerializer, RegistroClienteSerializer, UsuarioSerializer
 from .models import Usuario
+from core import rbac
 from core.permissions import PermissionChecker
 
 
@@ -21,11 +22,13 @@ def login(request):
     if serializer.is_valid():
         user = serializer.validated_data['user']
         
-        # Gerar tokens JWT
+        # Gerar tokens JWT, com os roles e permissões do usuário no token de acesso
         refresh = RefreshToken.for_user(user)
+        access = refresh.access_token
+        rbac.adicionar_claims(access, user)
         
         return Response({
-            'token': str(refresh.access_token),
+            'token': str(access),
             'refresh': str(refresh),
             'usuario': UsuarioSerializer(user).data
         })
@@ -48,9 +51,11 @@ def registro_cliente(request):
             
             # Gerar tokens JWT
             refresh = RefreshToken.for_user(user)
+            access = refresh.access_token
+            rbac.adicionar_claims(access, user)
             
             return Response({
-                'token': str(refresh.access_token),
+                'token': str(access),
                 'refresh': str(refresh),
                 'usuario': UsuarioSerializer(user).data,
                 'pet': result['pet'].nome
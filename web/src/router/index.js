@@ -171,8 +171,10 @@ router.beforeEach(async (to, from, next) => {
     return next('/auth')
   }
 
-  // Bloquear acesso à área admin para quem não tem permissão
-  if (to.path.startsWith('/admin')) {
+  // Bloquear acesso à área admin para quem não tem permissão.
+  // Se o token já traz o role admin, não é preciso consultar a API a cada navegação
+  const rbac = authService.getRbacDoToken()
+  if (to.path.startsWith('/admin') && !rbac?.roles.includes('admin')) {
     try {
       const response = await fetch('/api/can-access-admin/', {
         headers: {
@@ -66,6 +66,32 @@ class AdminService {
     }
   }
 
+  // Verificar conflitos de vários horários candidatos
+  // candidatos: [{ data_hora, servico_id, profissional_id }]
+  async verificarConflitos(candidatos) {
+    try {
+      return await apiService.post('/admin/agendamentos/verificar-conflitos/', { candidatos })
+    } catch (error) {
+      console.error('Erro ao verificar conflitos:', error)
+      throw error
+    }
+  }
+
+  // Buscar um agendamento pelo id
+  async getAgendamento(id) {
+    try {
+      return await apiService.get(`/agendamentos/agendamentos/${id}/`)
+    } catch (error) {
+      console.error('Erro ao buscar agendamento:', error)
+      throw error
+    }
+  }
+
+  // Acompanhar as alterações de agendamentos entre inicio e fim (YYYY-MM-DD)
+  assinarEventosAgendamentos(params = {}) {
+    return apiService.eventSource('/admin/agendamentos/eventos/', params)
+  }
+
   // ===== SERVIÇOS =====
   
   // Listar serviços
@@ -111,11 +137,13 @@ class AdminService {
   // ===== RELATÓRIOS =====
   
   // Relatório de agendamentos por período
-  async getRelatorioAgendamentos(dataInicio, dataFim) {
+  // opcoes: agrupar_por (dia, semana, mes, servico, status), comparar (periodo_anterior, ano_anterior), servico_id, status
+  async getRelatorioAgendamentos(dataInicio, dataFim, opcoes = {}) {
     try {
-      return await apiService.get('/admin/relatorios/agendamentos', {
+      return await apiService.get('/admin/relatorios/agendamentos/', {
         data_inicio: dataInicio,
-        data_fim: dataFim
+        data_fim: dataFim,
+        ...opcoes
       })
     } catch (error) {
       console.error('Erro ao buscar relatório de agendamentos:', error)
@@ -124,11 +152,12 @@ class AdminService {
   }
 
   // Relatório financeiro
-  async getRelatorioFinanceiro(dataInicio, dataFim) {
+  async getRelatorioFinanceiro(dataInicio, dataFim, opcoes = {}) {
     try {
-      return await apiService.get('/admin/relatorios/financeiro', {
+      return await apiService.get('/admin/relatorios/financeiro/', {
         data_inicio: dataInicio,
-        data_fim: dataFim
+        data_fim: dataFim,
+        ...opcoes
       })
     } catch (error) {
       console.error('Erro ao buscar relatório financeiro:', error)
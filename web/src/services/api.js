@@ -32,6 +32,32 @@ api.interceptors.request.use(
   }
 )
 
+// Token cujos roles (claim rbac) não valem mais para a interface, depois de um 403 da API
+export const CHAVE_RBAC_DESCARTADO = 'rbacDescartado'
+
+let verificandoAcessoAdmin = false
+
+// Confirma na API se o usuário ainda pode usar a área admin, saindo dela se não puder
+async function verificarAcessoAdmin() {
+  if (verificandoAcessoAdmin) return
+  verificandoAcessoAdmin = true
+  try {
+    const response = await fetch(`${API_BASE_URL}/can-access-admin/`, {
+      headers: {
+        'Authorization': `Bearer ${localStorage.getItem('token')}`
+      }
+    })
+    const data = await response.json()
+    if (data.can_access_admin) return
+  } catch (e) {
+    // Se der erro, bloqueia por padrão
+  } finally {
+    verificandoAcessoAdmin = false
+  }
+  alert('Acesso negado: você não tem permissão para acessar o painel administrativo.')
+  window.location.href = '/cliente'
+}
+
 // Interceptor para tratar respostas
 api.interceptors.response.use(
   (response) => {
@@ -46,11 +72,116 @@ api.interceptors.response.use(
       localStorage.removeItem('user')
       window.location.href = '/auth'
     }
+
+    // Se for erro 403, os roles do token podem ter sido revogados depois do login:
+    // a interface deixa de confiar neles e a área admin verifica o acesso de novo
+    if (error.response?.status === 403) {
+      const token = localStorage.getItem('token')
+      if (token) {
+        localStorage.setItem(CHAVE_RBAC_DESCARTADO, token)
+      }
+      if (window.location.pathname.startsWith('/admin')) {
+        verificarAcessoAdmin()
+      }
+    }
     
     throw error
   }
 )
 
+// Feed de Server-Sent Events lido com fetch, com a mesma interface do EventSource
+// (addEventListener/close). O EventSource não envia cabeçalhos, e o token na URL
+// ficaria registrado nos logs de acesso; aqui ele vai no cabeçalho Authorization.
+// Como o EventSource, reconecta enviando o id do último evento (Last-Event-ID) para
+// que o servidor reenvie o que se perdeu ou peça para recarregar (evento 'recarregar').
+class FeedEventos {
+  constructor(url) {
+    this.url = url
+    this.ouvintes = {}
+    this.reconexao = 3000
+    this.ultimoId = null
+    this.controle = null
+    this.fechado = false
+    this.conectar()
+  }
+
+  addEventListener(tipo, ouvinte) {
+    (this.ouvintes[tipo] ||= []).push(ouvinte)
+  }
+
+  close() {
+    this.fechado = true
+    if (this.controle) this.controle.abort()
+  }
+
+  emitir(tipo, data) {
+    (this.ouvintes[tipo] || []).forEach(ouvinte => ouvinte({ type: tipo, data }))
+  }
+
+  // Interpreta uma mensagem SSE (linhas "campo: valor" terminadas por uma linha em branco)
+  processar(mensagem) {
+    let tipo = 'message'
+    const dados = []
+    for (const linha of mensagem.split('\n')) {
+      if (!linha || linha.startsWith(':')) continue
+      const separador = linha.indexOf(':')
+      const campo = separador === -1 ? linha : linha.slice(0, separador)
+      const valor = separador === -1 ? '' : linha.slice(separador + 1).replace(/^ /, '')
+      if (campo === 'event') tipo = valor
+      else if (campo === 'data') dados.push(valor)
+      else if (campo === 'id' && !valor.includes('\0')) this.ultimoId = valor
+      else if (campo === 'retry' && /^\d+$/.test(valor)) this.reconexao = Number(valor)
+    }
+    if (dados.length) this.emitir(tipo, dados.join('\n'))
+  }
+
+  async conectar() {
+    let reconectando = false
+    while (!this.fechado) {
+      this.controle = new AbortController()
+      if (reconectando && this.ultimoId === null) {
+        // Sem id não há como retomar: o que mudou durante a queda só vem recarregando
+        this.emitir('recarregar', '{}')
+      }
+      reconectando = true
+      try {
+        const token = localStorage.getItem('token')
+        const response = await fetch(this.url, {
+          headers: {
+            Accept: 'text/event-stream',
+            ...(token ? { Authorization: `Bearer ${token}` } : {}),
+            ...(this.ultimoId !== null ? { 'Last-Event-ID': this.ultimoId } : {})
+          },
+          signal: this.controle.signal
+        })
+        if (!response.ok) {
+          // Token inválido, sem permissão ou servidor sem suporte ao feed: não insistir
+          this.emitir('error', null)
+          return
+        }
+        const leitor = response.body.getReader()
+        const decodificador = new TextDecoder()
+        let pendente = ''
+        for (;;) {
+          const { value, done } = await leitor.read()
+          if (done) break
+          pendente += decodificador.decode(value, { stream: true }).replace(/\r\n?/g, '\n')
+          let fim
+          while ((fim = pendente.indexOf('\n\n')) !== -1) {
+            this.processar(pendente.slice(0, fim))
+            pendente = pendente.slice(fim + 2)
+          }
+        }
+      } catch (error) {
+        if (this.fechado) return
+        console.error('Feed de eventos interrompido:', error)
+      }
+      // O servidor encerra a conexão periodicamente: reconectar como o EventSource faria
+      if (!this.fechado) await new Promise(resolve => setTimeout(resolve, this.reconexao))
+    }
+  }
+}
+
 // Classe para gerenciar requisições HTTP
 class ApiService {
   // Métodos HTTP
@@ -79,6 +210,12 @@ class ApiService {
     return response.data
   }
 
+  // Abrir um feed de Server-Sent Events autenticado pelo cabeçalho Authorization
+  eventSource(endpoint, params = {}) {
+    const query = new URLSearchParams(params)
+    return new FeedEventos(`${API_BASE_URL}${endpoint}?${query}`)
+  }
+
   // Gerenciar token
   setToken(token) {
     localStorage.setItem('token', token)
@@ -1,4 +1,4 @@
-import apiService from './api.js'
+import apiService, { CHAVE_RBAC_DESCARTADO } from './api.js'
 
 class AuthService {
   // Login
@@ -80,6 +80,30 @@ class AuthService {
     return this.getAtendimentos()
   }
 
+  // Sincronizar pets e agendamentos do cliente, buscando só o que mudou desde a última vez
+  async sincronizar() {
+    const cache = JSON.parse(localStorage.getItem('sync') || 'null')
+    const params = cache ? { desde: cache.token } : {}
+    const resposta = await apiService.get('/sync/', params)
+
+    const mesclar = (atuais, alterados, excluidos) => {
+      const porId = new Map(resposta.completo ? [] : atuais.map(item => [item.id, item]))
+      excluidos.forEach(id => porId.delete(id))
+      alterados.forEach(item => porId.set(item.id, item))
+      return [...porId.values()]
+    }
+
+    const dados = {
+      token: resposta.token,
+      animais: mesclar(cache?.animais || [], resposta.animais, resposta.excluidos.animais)
+        .sort((a, b) => a.id - b.id),
+      agendamentos: mesclar(cache?.agendamentos || [], resposta.agendamentos, resposta.excluidos.agendamentos)
+        .sort((a, b) => new Date(b.data_hora) - new Date(a.data_hora))
+    }
+    localStorage.setItem('sync', JSON.stringify(dados))
+    return dados
+  }
+
   // Buscar pets do cliente
   async getPets() {
     try {
@@ -130,6 +154,20 @@ class AuthService {
     }
   }
 
+  // Buscar horários disponíveis de um período (agrupados por data)
+  async getHorariosDisponiveisPeriodo(inicio, fim, servicoId = null) {
+    try {
+      const params = new URLSearchParams({ inicio, fim })
+      if (servicoId) {
+        params.append('servico_id', servicoId)
+      }
+      return await apiService.get(`/agendamentos/horarios-disponiveis/periodo/?${params}`)
+    } catch (error) {
+      console.error('Erro ao buscar horários disponíveis do período:', error)
+      throw error
+    }
+  }
+
   // Buscar profissionais (mantido para compatibilidade, mas retorna lista vazia)
   async getProfissionais() {
     try {
@@ -160,6 +198,59 @@ class AuthService {
     }
   }
 
+  // Reservar temporariamente um horário durante o agendamento
+  async reservarHorario(dataHora, servicoId) {
+    try {
+      return await apiService.post('/agendamentos/reservas/', {
+        data_hora: dataHora,
+        servico: servicoId
+      })
+    } catch (error) {
+      console.error('Erro ao reservar horário:', error)
+      throw error
+    }
+  }
+
+  // Liberar reserva de horário
+  async liberarReserva(token) {
+    try {
+      return await apiService.delete(`/agendamentos/reservas/${token}/`)
+    } catch (error) {
+      console.error('Erro ao liberar reserva:', error)
+      throw error
+    }
+  }
+
+  // Listar pedidos de lista de espera do cliente
+  async getListaEspera() {
+    try {
+      return await apiService.get('/agendamentos/lista-espera/')
+    } catch (error) {
+      console.error('Erro ao buscar lista de espera:', error)
+      throw error
+    }
+  }
+
+  // Entrar na lista de espera de um serviço
+  async entrarListaEspera(pedidoData) {
+    try {
+      return await apiService.post('/agendamentos/lista-espera/', pedidoData)
+    } catch (error) {
+      console.error('Erro ao entrar na lista de espera:', error)
+      throw error
+    }
+  }
+
+  // Sair da lista de espera
+  async sairListaEspera(pedidoId) {
+    try {
+      return await apiService.delete(`/agendamentos/lista-espera/${pedidoId}/`)
+    } catch (error) {
+      console.error('Erro ao sair da lista de espera:', error)
+      throw error
+    }
+  }
+
   // Cancelar agendamento
   async cancelarAgendamento(agendamentoId) {
     try {
@@ -189,6 +280,8 @@ class AuthService {
   logout() {
     this.removeToken()
     this.removeCurrentUser()
+    localStorage.removeItem('sync')
+    localStorage.removeItem(CHAVE_RBAC_DESCARTADO)
   }
 
   // Gerenciar token
@@ -199,6 +292,21 @@ class AuthService {
   removeToken() {
     localStorage.removeItem('token')
   }
+
+  // Roles e permissões embutidos no token de acesso (claim rbac), ou null se ausentes ou
+  // descartados depois de um 403 (ver api.js). Servem apenas para a interface: a API
+  // continua verificando cada requisição
+  getRbacDoToken() {
+    const token = localStorage.getItem('token')
+    if (!token || localStorage.getItem(CHAVE_RBAC_DESCARTADO) === token) return null
+    try {
+      const payload = token.split('.')[1].replace(/-/g, '+').replace(/_/g, '/')
+      const claims = JSON.parse(atob(payload))
+      return claims.rbac ? { roles: claims.rbac.r, mascaraPermissoes: claims.rbac.p } : null
+    } catch (e) {
+      return null
+    }
+  }
 }
 
 export default new AuthService() 
\ No newline at end of file
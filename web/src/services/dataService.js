@@ -124,7 +124,7 @@ class DataService {
       data_fim: dataFim
     })
     
-    return await apiService.get(`/admin/relatorios/agendamentos?${params}`)
+    return await apiService.get(`/admin/relatorios/agendamentos/?${params}`)
   }
 
   // Relatório financeiro
@@ -134,7 +134,7 @@ class DataService {
       data_fim: dataFim
     })
     
-    return await apiService.get(`/admin/relatorios/financeiro?${params}`)
+    return await apiService.get(`/admin/relatorios/financeiro/?${params}`)
   }
 }
 